@@ -0,0 +1,212 @@
+"""
+Headless ExcelDiff: compares file pairs from a manifest or from two directory trees
+and writes one JSON line per pair. Only imports core (no customtkinter / win32com).
+
+    python cli.py old.xlsx new.xlsx
+    python cli.py old_dir/ new_dir/ --workers 4 -o results.jsonl
+    python cli.py --manifest pairs.json --all-sheets
+    python cli.py old_dir/ new_dir/ --report-dir reports/
+
+Manifest: JSON list of {"old": path, "new": path, "sheet_old": name, "sheet_new": name}
+(sheets optional, relative paths are relative to the manifest).
+Each line is the pair plus "status": identical, different (with "counts" and "items"),
+inserted / deleted (file only in one tree) or error. With --report-dir, a compared pair also gets
+an .xlsx report (reporting.native_report, no Excel needed) and its path as "report".
+Exit code: 0 no differences, 1 differences found, 2 a pair failed.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from core.alignment import DEFAULT_ENGINE, ENGINES
+from core.comparator import ExcelComparator
+from core.workbook_comparator import WorkbookComparator
+from core.data_types import DiffType
+from reporting.native_report import NativeReportGenerator, diff_result_tables
+
+EXTENSIONS = ('.xlsx', '.xlsm')
+
+
+def pairs_from_dirs(dir_old: str, dir_new: str):
+    """
+    Pairs files with the same relative path under both trees.
+    A file found on one side only gets None for the other side.
+    """
+    def scan(root):
+        found = set()
+        for folder, _, files in os.walk(root):
+            for name in files:
+                # "~$" files are Excel lock files
+                if name.lower().endswith(EXTENSIONS) and not name.startswith('~$'):
+                    found.add(os.path.relpath(os.path.join(folder, name), root))
+        return found
+
+    old = scan(dir_old)
+    new = scan(dir_new)
+    return [{"old": os.path.join(dir_old, rel) if rel in old else None,
+             "new": os.path.join(dir_new, rel) if rel in new else None}
+            for rel in sorted(old | new)]
+
+
+def pairs_from_manifest(path: str):
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    pairs = []
+    for entry in entries:
+        pair = dict(entry)
+        for key in ("old", "new"):
+            if key not in pair:
+                raise ValueError(f"Manifest entry without '{key}': {entry}")
+            pair[key] = os.path.join(base, pair[key])
+        pairs.append(pair)
+    return pairs
+
+
+def _item_json(item) -> dict:
+    return {
+        "sheet": item.sheet,
+        "location": item.location,
+        "type": item.item_type,
+        "diff": item.diff_type.value,
+        "old": item.old_value,
+        "new": item.new_value,
+        "details": item.details,
+    }
+
+
+def report_path(report_dir: str, pair: dict) -> str:
+    # Directory trees can hold the same file name in several folders: the pair's paths make it unique
+    stem = os.path.splitext(os.path.basename(pair["new"]))[0]
+    tag = hashlib.blake2b(f'{pair["old"]}|{pair["new"]}'.encode('utf-8', 'surrogatepass'), digest_size=4).hexdigest()
+    return os.path.join(report_dir, f"ExcelDiff_{stem}_{tag}.xlsx")
+
+
+def compare_pair(pair: dict, options: dict) -> dict:
+    """Runs one compare; the result is a JSON-ready dict. Never raises (errors are reported)."""
+    result = dict(pair)
+    if pair["old"] is None or pair["new"] is None:
+        # File only in one of the directory trees
+        result["status"] = "inserted" if pair["old"] is None else "deleted"
+        return result
+    try:
+        if options["all_sheets"]:
+            # Pairs already run in parallel: sheets of one pair in this worker
+            comparator = WorkbookComparator(pair["old"], pair["new"], streaming=options["streaming"],
+                                            backend=options["backend"], engine=options["engine"], max_workers=1,
+                                            use_cache=options["cache"])
+        else:
+            comparator = ExcelComparator(pair["old"], pair["new"], pair.get("sheet_old"), pair.get("sheet_new"),
+                                         streaming=options["streaming"], backend=options["backend"],
+                                         engine=options["engine"], use_cache=options["cache"])
+        # The comparator prints debug lines: keep stdout for the JSON results
+        with contextlib.redirect_stdout(sys.stderr):
+            diff = comparator.compare()
+        items = [i for i in diff.items if i.diff_type != DiffType.MATCH]
+        if options.get("report_dir"):
+            tables, fills_old, fills_new = diff_result_tables(diff)
+            generator = NativeReportGenerator(report_path(options["report_dir"], pair), pair["old"], pair["new"],
+                                              pair.get("sheet_old"), pair.get("sheet_new"))
+            result["report"] = generator.generate(tables, fills_old=fills_old, fills_new=fills_new)
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    counts = {}
+    for item in items:
+        key = f"{item.item_type}.{item.diff_type.value}"
+        counts[key] = counts.get(key, 0) + 1
+    result["status"] = "different" if items else "identical"
+    result["counts"] = counts
+    if not options["summary"]:
+        result["items"] = [_item_json(i) for i in items]
+    return result
+
+
+def run(pairs, options: dict, out, workers: int = None) -> int:
+    """
+    Compares the pairs on a process pool and writes each result as soon as it is done.
+    At most `workers` pairs are in flight, so memory stays bounded by the largest few pairs
+    whatever the number of pairs. Returns the exit code.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    status = set()
+
+    def emit(result):
+        status.add(result["status"])
+        out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+        out.flush()
+
+    if workers == 1:
+        for pair in pairs:
+            emit(compare_pair(pair, options))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for pair in pairs:
+                if len(pending) >= workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        emit(future.result())
+                pending.add(pool.submit(compare_pair, pair, options))
+            for future in wait(pending).done:
+                emit(future.result())
+
+    if "error" in status:
+        return 2
+    return 1 if status - {"identical"} else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare Excel files without Excel.")
+    parser.add_argument("old", nargs="?", help="Old file or directory")
+    parser.add_argument("new", nargs="?", help="New file or directory")
+    parser.add_argument("--manifest", help="JSON list of pairs instead of old/new")
+    parser.add_argument("--sheet-old", help="Sheet in the old file (single pair)")
+    parser.add_argument("--sheet-new", help="Sheet in the new file (single pair)")
+    parser.add_argument("--all-sheets", action="store_true", help="Compare every sheet (matched by name/content)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default=DEFAULT_ENGINE)
+    parser.add_argument("--backend", choices=("openpyxl", "xml"), default="xml")
+    parser.add_argument("--no-streaming", action="store_true", help="openpyxl backend: full load instead of read-only streaming")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read/write the snapshot cache (core.cache)")
+    parser.add_argument("--summary", action="store_true", help="Counts only, no item list")
+    parser.add_argument("--report-dir", help="Write an .xlsx report per compared pair into this folder")
+    parser.add_argument("-o", "--output", help="JSON Lines output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        pairs = pairs_from_manifest(args.manifest)
+    elif args.old and args.new:
+        if os.path.isdir(args.old) and os.path.isdir(args.new):
+            pairs = pairs_from_dirs(args.old, args.new)
+        else:
+            pairs = [{"old": args.old, "new": args.new, "sheet_old": args.sheet_old, "sheet_new": args.sheet_new}]
+    else:
+        parser.error("give OLD and NEW, or --manifest")
+    if args.report_dir:
+        if args.all_sheets:
+            parser.error("--report-dir reports one sheet per pair, it cannot be used with --all-sheets")
+        os.makedirs(args.report_dir, exist_ok=True)
+
+    options = {
+        "all_sheets": args.all_sheets,
+        "streaming": not args.no_streaming,
+        "backend": args.backend,
+        "engine": args.engine,
+        "cache": not args.no_cache,
+        "summary": args.summary,
+        "report_dir": args.report_dir,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            return run(pairs, options, out, args.workers)
+    return run(pairs, options, sys.stdout, args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
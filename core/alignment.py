@@ -0,0 +1,346 @@
+import difflib
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+Opcode = Tuple[str, int, int, int, int]
+
+# Histogram diff ignores elements more frequent than this as split points (same as git)
+MAX_CHAIN = 64
+
+
+def opcodes_from_pairs(pairs: List[Tuple[int, int]], len_a: int, len_b: int) -> List[Opcode]:
+    """
+    Turns matched index pairs (strictly increasing in both a and b) into
+    difflib.SequenceMatcher.get_opcodes() style opcodes.
+    """
+    opcodes = []
+    i = j = 0
+    k = 0
+    n = len(pairs)
+    while k <= n:
+        # Next equal run, or the end sentinel
+        if k < n:
+            pi, pj = pairs[k]
+        else:
+            pi, pj = len_a, len_b
+        if i < pi and j < pj:
+            opcodes.append(('replace', i, pi, j, pj))
+        elif i < pi:
+            opcodes.append(('delete', i, pi, j, j))
+        elif j < pj:
+            opcodes.append(('insert', i, i, j, pj))
+        if k == n:
+            break
+        run = 1
+        while k + run < n and pairs[k + run] == (pi + run, pj + run):
+            run += 1
+        opcodes.append(('equal', pi, pi + run, pj, pj + run))
+        i, j = pi + run, pj + run
+        k += run
+    return opcodes
+
+
+def _common_ends(a, b, a_lo, a_hi, b_lo, b_hi, pairs):
+    # Matches the common prefix into pairs, returns the remaining range and the suffix pairs
+    while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+        pairs.append((a_lo, b_lo))
+        a_lo += 1
+        b_lo += 1
+    suffix = []
+    while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+        a_hi -= 1
+        b_hi -= 1
+        suffix.append((a_hi, b_hi))
+    suffix.reverse()
+    return a_lo, a_hi, b_lo, b_hi, suffix
+
+
+class AlignmentEngine:
+    """
+    Aligns two sequences of hashable items (row fingerprints).
+    get_opcodes() has the same semantics as difflib.SequenceMatcher.get_opcodes().
+    Subclasses implement _match(a, b, a_lo, a_hi, b_lo, b_hi, pairs) which appends
+    the matched (i, j) pairs of the range in increasing order.
+    """
+    name = None
+
+    def get_opcodes(self, a: Sequence[Any], b: Sequence[Any]) -> List[Opcode]:
+        pairs = []
+        self._match(a, b, 0, len(a), 0, len(b), pairs)
+        return opcodes_from_pairs(pairs, len(a), len(b))
+
+    def _match(self, a, b, a_lo, a_hi, b_lo, b_hi, pairs):
+        raise NotImplementedError
+
+
+class DifflibEngine(AlignmentEngine):
+    """difflib.SequenceMatcher without the autojunk heuristic (blank rows are not junk)."""
+    name = "difflib"
+
+    def get_opcodes(self, a, b):
+        return difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+
+
+class MyersEngine(AlignmentEngine):
+    """
+    Myers' O(ND) difference algorithm, linear space variant: the middle snake of the
+    edit path splits the problem in two (same bisection as diff-match-patch).
+    """
+    name = "myers"
+
+    def _match(self, a, b, a_lo, a_hi, b_lo, b_hi, pairs):
+        # Explicit stack instead of recursion. Tasks are ranges, or finished pair lists
+        # (suffixes) that must be emitted after the ranges pushed before them.
+        stack = [(a_lo, a_hi, b_lo, b_hi)]
+        while stack:
+            task = stack.pop()
+            if isinstance(task, list):
+                pairs.extend(task)
+                continue
+            a_lo, a_hi, b_lo, b_hi, suffix = _common_ends(a, b, *task, pairs)
+            # Ranges without a single common item (e.g. unrelated sheets) would cost O(N*M)
+            if a_lo < a_hi and b_lo < b_hi and not set(a[a_lo:a_hi]).isdisjoint(b[b_lo:b_hi]):
+                split = self._bisect(a, b, a_lo, a_hi, b_lo, b_hi)
+                if split is not None:
+                    x, y = split
+                    stack.append(suffix)
+                    stack.append((x, a_hi, y, b_hi))
+                    stack.append((a_lo, x, b_lo, y))
+                    continue
+            pairs.extend(suffix)
+
+    def _bisect(self, a, b, a_lo, a_hi, b_lo, b_hi) -> Optional[Tuple[int, int]]:
+        n = a_hi - a_lo
+        m = b_hi - b_lo
+        max_d = (n + m + 1) // 2
+        v_offset = max_d
+        v_length = 2 * max_d + 2
+        v1 = [-1] * v_length
+        v2 = [-1] * v_length
+        v1[v_offset + 1] = 0
+        v2[v_offset + 1] = 0
+        delta = n - m
+        # If the total number of items is odd, the front path collides with the reverse path
+        front = (delta % 2 != 0)
+        # Offsets for the start and end of the k loops, to skip diagonals outside the grid
+        k1start = k1end = k2start = k2end = 0
+        for d in range(max_d):
+            # Forward path, one step
+            for k1 in range(-d + k1start, d + 1 - k1end, 2):
+                k1_offset = v_offset + k1
+                if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                    x1 = v1[k1_offset + 1]
+                else:
+                    x1 = v1[k1_offset - 1] + 1
+                y1 = x1 - k1
+                while x1 < n and y1 < m and a[a_lo + x1] == b[b_lo + y1]:
+                    x1 += 1
+                    y1 += 1
+                v1[k1_offset] = x1
+                if x1 > n:
+                    k1end += 2 # Ran off the right of the grid
+                elif y1 > m:
+                    k1start += 2 # Ran off the bottom of the grid
+                elif front:
+                    k2_offset = v_offset + delta - k1
+                    if 0 <= k2_offset < v_length and v2[k2_offset] != -1:
+                        # Mirror x2 onto the top-left coordinate system
+                        if x1 >= n - v2[k2_offset]:
+                            return a_lo + x1, b_lo + y1
+
+            # Reverse path, one step
+            for k2 in range(-d + k2start, d + 1 - k2end, 2):
+                k2_offset = v_offset + k2
+                if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                    x2 = v2[k2_offset + 1]
+                else:
+                    x2 = v2[k2_offset - 1] + 1
+                y2 = x2 - k2
+                while x2 < n and y2 < m and a[a_hi - x2 - 1] == b[b_hi - y2 - 1]:
+                    x2 += 1
+                    y2 += 1
+                v2[k2_offset] = x2
+                if x2 > n:
+                    k2end += 2
+                elif y2 > m:
+                    k2start += 2
+                elif not front:
+                    k1_offset = v_offset + delta - k2
+                    if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                        x1 = v1[k1_offset]
+                        y1 = v_offset + x1 - k1_offset
+                        if x1 >= n - x2:
+                            return a_lo + x1, b_lo + y1
+        return None # Nothing in common
+
+
+class PatienceEngine(AlignmentEngine):
+    """
+    Patience diff: items that occur exactly once on both sides are anchors, the longest
+    increasing run of anchors is kept and the gaps between anchors are aligned
+    recursively. Gaps without unique items fall back to Myers.
+    """
+    name = "patience"
+
+    def __init__(self):
+        self._fallback = MyersEngine()
+
+    def _match(self, a, b, a_lo, a_hi, b_lo, b_hi, pairs):
+        stack = [(a_lo, a_hi, b_lo, b_hi)]
+        while stack:
+            task = stack.pop()
+            if isinstance(task, list):
+                pairs.extend(task)
+                continue
+            a_lo, a_hi, b_lo, b_hi, suffix = _common_ends(a, b, *task, pairs)
+            if a_lo == a_hi or b_lo == b_hi:
+                pairs.extend(suffix)
+                continue
+
+            anchors = self._unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi)
+            if not anchors:
+                self._fallback._match(a, b, a_lo, a_hi, b_lo, b_hi, pairs)
+                pairs.extend(suffix)
+                continue
+
+            # Gaps between anchors, pushed in reverse so they are handled left to right
+            stack.append(suffix)
+            tasks = []
+            i, j = a_lo, b_lo
+            for ai, bj in anchors:
+                tasks.append((i, ai, j, bj))
+                tasks.append([(ai, bj)])
+                i, j = ai + 1, bj + 1
+            tasks.append((i, a_hi, j, b_hi))
+            stack.extend(reversed(tasks))
+
+    def _unique_anchors(self, a, b, a_lo, a_hi, b_lo, b_hi) -> List[Tuple[int, int]]:
+        counts: Dict[Any, List[int]] = {} # item -> [count in a, index in a, count in b, index in b]
+        for i in range(a_lo, a_hi):
+            entry = counts.get(a[i])
+            if entry is None:
+                counts[a[i]] = [1, i, 0, -1]
+            else:
+                entry[0] += 1
+        for j in range(b_lo, b_hi):
+            entry = counts.get(b[j])
+            if entry is not None:
+                entry[2] += 1
+                entry[3] = j
+        # Unique on both sides, in b order
+        candidates = sorted((e[3], e[1]) for e in counts.values() if e[0] == 1 and e[2] == 1)
+        if not candidates:
+            return []
+
+        # Longest increasing subsequence of a-indices (patience sorting)
+        tops = [] # a-index on top of each pile
+        top_ids = [] # candidate index on top of each pile
+        back = [-1] * len(candidates)
+        for idx, (_, ai) in enumerate(candidates):
+            p = bisect_left(tops, ai)
+            if p > 0:
+                back[idx] = top_ids[p - 1]
+            if p == len(tops):
+                tops.append(ai)
+                top_ids.append(idx)
+            else:
+                tops[p] = ai
+                top_ids[p] = idx
+        result = []
+        idx = top_ids[-1]
+        while idx != -1:
+            bj, ai = candidates[idx]
+            result.append((ai, bj))
+            idx = back[idx]
+        result.reverse()
+        return result
+
+
+class HistogramEngine(AlignmentEngine):
+    """
+    Histogram diff (as in git/JGit): split on the longest common region around the least
+    frequent item of a, ignoring items seen more than MAX_CHAIN times (e.g. blank rows),
+    then align both sides of the region. Ranges with no usable item fall back to Myers.
+    """
+    name = "histogram"
+
+    def __init__(self):
+        self._fallback = MyersEngine()
+
+    def _match(self, a, b, a_lo, a_hi, b_lo, b_hi, pairs):
+        stack = [(a_lo, a_hi, b_lo, b_hi)]
+        while stack:
+            task = stack.pop()
+            if isinstance(task, list):
+                pairs.extend(task)
+                continue
+            a_lo, a_hi, b_lo, b_hi, suffix = _common_ends(a, b, *task, pairs)
+            if a_lo == a_hi or b_lo == b_hi:
+                pairs.extend(suffix)
+                continue
+
+            region = self._best_region(a, b, a_lo, a_hi, b_lo, b_hi)
+            if region is None:
+                self._fallback._match(a, b, a_lo, a_hi, b_lo, b_hi, pairs)
+                pairs.extend(suffix)
+                continue
+
+            s_a, e_a, s_b, e_b = region
+            stack.append(suffix)
+            stack.append((e_a, a_hi, e_b, b_hi))
+            stack.append([(s_a + k, s_b + k) for k in range(e_a - s_a)])
+            stack.append((a_lo, s_a, b_lo, s_b))
+
+    def _best_region(self, a, b, a_lo, a_hi, b_lo, b_hi):
+        index: Dict[Any, List[int]] = {}
+        for i in range(a_lo, a_hi):
+            index.setdefault(a[i], []).append(i)
+
+        best = None
+        best_count = MAX_CHAIN + 1
+        best_len = 0
+        j = b_lo
+        while j < b_hi:
+            positions = index.get(b[j])
+            if positions is None or len(positions) > best_count or len(positions) > MAX_CHAIN:
+                j += 1
+                continue
+            next_j = j + 1
+            for i in positions:
+                # Grow the common region around (i, j), tracking its rarest item
+                count = len(positions)
+                s_a, s_b = i, j
+                while s_a > a_lo and s_b > b_lo and a[s_a - 1] == b[s_b - 1]:
+                    s_a -= 1
+                    s_b -= 1
+                    count = min(count, len(index[a[s_a]]))
+                e_a, e_b = i + 1, j + 1
+                while e_a < a_hi and e_b < b_hi and a[e_a] == b[e_b]:
+                    count = min(count, len(index[a[e_a]]))
+                    e_a += 1
+                    e_b += 1
+                length = e_a - s_a
+                if count < best_count or (count == best_count and length > best_len):
+                    best = (s_a, e_a, s_b, e_b)
+                    best_count = count
+                    best_len = length
+                next_j = max(next_j, e_b)
+            j = next_j
+        return best
+
+
+# Near-linear on large sheets with many repeated (blank) rows
+DEFAULT_ENGINE = HistogramEngine.name
+
+ENGINES = {
+    DifflibEngine.name: DifflibEngine,
+    MyersEngine.name: MyersEngine,
+    PatienceEngine.name: PatienceEngine,
+    HistogramEngine.name: HistogramEngine,
+}
+
+
+def get_engine(name: str) -> AlignmentEngine:
+    if name not in ENGINES:
+        raise ValueError(f"Unknown alignment engine '{name}', expected one of {tuple(ENGINES)}")
+    return ENGINES[name]()
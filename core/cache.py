@@ -0,0 +1,145 @@
+import os
+import pickle
+import tempfile
+import time
+from hashlib import blake2b
+from typing import Optional
+from .excel_loader import LOADER_VERSION
+from .fingerprint import FINGERPRINT_VERSION
+
+# Bump when the snapshot layout (SheetSnapshot, SheetCells pickling) changes
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+_CHUNK = 1 << 20
+
+# A file modified less than this long ago may still change within the same mtime tick
+# (FAT keeps 2 s, network shares can be coarser): its digest is not memoized
+RACY_NS = 3 * 1_000_000_000
+
+
+def default_cache_dir() -> str:
+    # EXCELDIFF_CACHE overrides; otherwise the per-user cache folder
+    if os.environ.get('EXCELDIFF_CACHE'):
+        return os.environ['EXCELDIFF_CACHE']
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'exceldiff')
+
+
+class SnapshotCache:
+    """
+    On-disk cache of loaded sheets (SheetSnapshot: cells, shapes, row/column fingerprints),
+    keyed by the file's content digest, the sheet, the load options and the loader/fingerprint
+    versions. One pickle per entry; the least recently used entries are evicted once the
+    folder is over max_bytes.
+    The content digest of a path is remembered per (path, size, mtime, inode, ctime), so a
+    warm lookup does not read the workbook at all; a file rewritten with the same size and a
+    restored mtime still gets a new inode or ctime.
+    """
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.directory, kind, key)
+
+    def _write(self, path: str, data: bytes):
+        # Atomic: concurrent workers never see a partial entry
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def file_digest(self, filepath: str) -> str:
+        st = os.stat(filepath)
+        stamp = f"{os.path.abspath(filepath)}|{st.st_size}|{st.st_mtime_ns}|{st.st_ino}|{st.st_ctime_ns}"
+        memo = self._path('digests', blake2b(stamp.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest())
+        try:
+            with open(memo, 'r') as f:
+                digest = f.read()
+            os.utime(memo) # LRU, as the sheet entries
+            return digest
+        except OSError:
+            pass
+
+        h = blake2b(digest_size=32)
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        if time.time_ns() - st.st_mtime_ns >= RACY_NS:
+            self._write(memo, digest.encode('ascii'))
+        return digest
+
+    def key(self, filepath: str, sheet_name: Optional[str], **options) -> str:
+        # No sheet name means the active sheet, which the content digest already covers
+        parts = [self.file_digest(filepath), sheet_name or '', f"v{CACHE_VERSION}.{LOADER_VERSION}.{FINGERPRINT_VERSION}"]
+        parts += [f"{k}={options[k]}" for k in sorted(options)]
+        return blake2b('\0'.join(parts).encode('utf-8', 'surrogatepass'), digest_size=20).hexdigest()
+
+    def get(self, key: str):
+        path = self._path('sheets', key)
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or from an incompatible build: drop it
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path) # LRU: the mtime is the last use
+        except OSError:
+            pass
+        return snapshot
+
+    def put(self, key: str, snapshot):
+        self._write(self._path('sheets', key), pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_bytes.
+        Sheet entries and digest memos share the budget.
+        """
+        entries = []
+        total = 0
+        for kind in ('sheets', 'digests'):
+            folder = os.path.join(self.directory, kind)
+            if not os.path.isdir(folder):
+                continue
+            for entry in os.scandir(folder):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    st = entry.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                    total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for kind in ('sheets', 'digests'):
+            folder = os.path.join(self.directory, kind)
+            if os.path.isdir(folder):
+                for entry in os.scandir(folder):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
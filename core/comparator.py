@@ -1,112 +1,376 @@
-from typing import List, Dict, Optional
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
 from .excel_loader import ExcelLoader
+from .xlsx_package import XlsxPackage
+from .cache import SnapshotCache
 from .shift_detector import ShiftDetector
-from .data_types import CellData, ShapeData, DiffResult, DiffItem, DiffType, AnchorPoint
+from .alignment import DEFAULT_ENGINE
+from .fingerprint import EMPTY_ROW, RowFingerprints
+from .data_types import CellData, SheetCells, ShapeData, DiffResult, DiffItem, DiffType, AnchorPoint
+
+@dataclass
+class SheetSnapshot:
+    """One loaded sheet: everything the comparison needs, and all of it picklable."""
+    cells: SheetCells
+    shapes: List[ShapeData]
+    fps: RowFingerprints
+    col_fps: RowFingerprints
+
+# Position matching looks this many rows/columns around a shape's expected anchor cell
+SHAPE_ROW_TOLERANCE = 1
+SHAPE_COL_TOLERANCE = 1
+# Default cell size in EMU (64 x 20 px), to weigh a cell step against the offsets inside a cell
+CELL_WIDTH_EMU = 609600
+CELL_HEIGHT_EMU = 190500
+
+class ShapeGrid:
+    """
+    Shapes bucketed by anchor cell (from_anchor row, col), built once per compare: a position
+    lookup only scans the cells within row_tolerance/col_tolerance of the expected anchor
+    instead of the whole sheet.
+    """
+    def __init__(self, shapes: List[ShapeData], row_tolerance: int = SHAPE_ROW_TOLERANCE,
+                 col_tolerance: int = SHAPE_COL_TOLERANCE):
+        self.row_tolerance = row_tolerance
+        self.col_tolerance = col_tolerance
+        self.cells: Dict[Tuple[int, int], List[ShapeData]] = {}
+        for s in shapes:
+            self.cells.setdefault((s.from_anchor.row, s.from_anchor.col), []).append(s)
+
+    def nearest(self, row: int, col: int, row_off: int = 0, col_off: int = 0, taken=()) -> Optional[ShapeData]:
+        """
+        Shape not in `taken` anchored within the tolerance of cell (row, col), the closest to
+        (row, col, row_off, col_off) in EMU (cells counted at their default size); first one on ties.
+        """
+        best, best_dist = None, None
+        for r in range(row - self.row_tolerance, row + self.row_tolerance + 1):
+            for c in range(col - self.col_tolerance, col + self.col_tolerance + 1):
+                for s in self.cells.get((r, c), ()):
+                    if s in taken:
+                        continue
+                    a = s.from_anchor
+                    dist = (abs((r - row) * CELL_HEIGHT_EMU + a.row_off - row_off)
+                            + abs((c - col) * CELL_WIDTH_EMU + a.col_off - col_off))
+                    if best_dist is None or dist < best_dist:
+                        best, best_dist = s, dist
+        return best
+
+def load_sheet(filepath: str, sheet_name: str = None, streaming: bool = False, backend: str = "openpyxl",
+               use_mmap: bool = False, package: XlsxPackage = None, cache: SnapshotCache = None) -> SheetSnapshot:
+    """
+    Loads one sheet and fingerprints its rows and columns, or takes it from the cache.
+    Module level so that a worker process can run it (see ExcelComparator parallel mode).
+    """
+    key = None
+    if cache is not None:
+        key = cache.key(filepath, sheet_name, streaming=streaming, backend=backend)
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+
+    loader = ExcelLoader(filepath, sheet_name=sheet_name, streaming=streaming, backend=backend,
+                         package=package, use_mmap=use_mmap)
+    try:
+        # Shapes first: they are cheap (one drawing part) and needed by the row fingerprints,
+        # so the cell rows can then be fingerprinted while they stream out of the loader.
+        shapes = loader.load_shapes()
+        cells = SheetCells()
+
+        def _stream():
+            for row in loader.iter_rows():
+                cells.extend(row)
+                yield row
+
+        # Fingerprints do not depend on the alignment engine
+        fps, col_fps = ShiftDetector().get_fingerprints(_stream(), shapes)
+    finally:
+        loader.close()
+    snapshot = SheetSnapshot(cells, shapes, fps, col_fps)
+    if key is not None:
+        try:
+            cache.put(key, snapshot)
+        except OSError:
+            pass # A read-only or full cache folder only costs the speed-up
+    return snapshot
+
+def unchanged_parts(package_a: XlsxPackage, sheet_a: str, package_b: XlsxPackage, sheet_b: str) -> set:
+    """
+    What is byte-identical between the two sheets, from the CRC-32s and sizes in the zip
+    central directories (nothing is inflated; equal CRC and size is taken as equal content):
+      "cells"   - sheet XML and shared strings are identical, and so are the number formats
+                  that make numbers dates (styles.xml is parsed only in that case)
+      "drawing" - the sheets' DrawingML parts are identical, or neither sheet has one
+    """
+    unchanged = set()
+    if (package_a.part_crc(package_a.sheet_part(sheet_a)) == package_b.part_crc(package_b.sheet_part(sheet_b))
+            and package_a.part_crc('xl/sharedStrings.xml') == package_b.part_crc('xl/sharedStrings.xml')
+            and package_a.value_formats() == package_b.value_formats()):
+        unchanged.add("cells")
+    drawing_a = package_a.drawing_part(sheet_a)
+    drawing_b = package_b.drawing_part(sheet_b)
+    if drawing_a is None and drawing_b is None:
+        unchanged.add("drawing")
+    elif drawing_a is not None and drawing_b is not None and package_a.part_crc(drawing_a) == package_b.part_crc(drawing_b):
+        unchanged.add("drawing")
+    return unchanged
 
 class ExcelComparator:
-    def __init__(self, file_a: str, file_b: str, sheet_a: str = None, sheet_b: str = None):
+    def __init__(self, file_a: str, file_b: str, sheet_a: str = None, sheet_b: str = None,
+                 streaming: bool = False, backend: str = "openpyxl", use_mmap: bool = False,
+                 engine: str = DEFAULT_ENGINE, parallel: bool = False, use_cache: bool = True,
+                 cache: SnapshotCache = None, shape_tolerance: Tuple[int, int] = (SHAPE_ROW_TOLERANCE, SHAPE_COL_TOLERANCE)):
         self.file_a = file_a
         self.file_b = file_b
-        self.loader_a = ExcelLoader(file_a, sheet_name=sheet_a)
-        self.loader_b = ExcelLoader(file_b, sheet_name=sheet_b)
-        self.detector = ShiftDetector()
+        self.streaming = streaming
+        self.backend = backend
+        self.use_mmap = use_mmap
+        self.sheet_a = sheet_a
+        self.sheet_b = sheet_b
+        # Load the two files in two worker processes (parsing holds the GIL).
+        # On Windows the calling script needs an `if __name__ == "__main__":` guard.
+        self.parallel = parallel
+        # Loaded sheets are kept on disk (see core.cache), so an unchanged file is not parsed again
+        self.cache = (cache or SnapshotCache()) if use_cache else None
+        self.detector = ShiftDetector(engine=engine)
+        # (rows, columns) around its expected anchor cell where a shape matched by position may be
+        self.shape_tolerance = shape_tolerance
+
+    def _compare_rows(self, cells_a: SheetCells, r_a: int, cells_b: SheetCells, r_b: int, diff_items: List[DiffItem],
+                      col_mapping: Optional[Dict[int, Optional[int]]] = None, cols_inserted=()):
+        # Merge walk over two rows, both in column order.
+        # col_mapping: A column -> B column (None if deleted), 1-indexed. None means identity.
+        span_a = cells_a.row_range(r_a)
+        span_b = cells_b.row_range(r_b)
+        i, j = span_a.start, span_b.start
+        while i < span_a.stop or j < span_b.stop:
+            c_a = cells_a.cols[i] if i < span_a.stop else None
+            c_b = cells_b.cols[j] if j < span_b.stop else None
+
+            if col_mapping is not None:
+                # Cells of deleted/inserted columns are reported as such,
+                # the others are merged in B's column space (the mapping keeps column order)
+                if c_a is not None:
+                    c_a = col_mapping.get(c_a)
+                    if c_a is None:
+                        diff_items.append(DiffItem(
+                            location=cells_a.coordinate(i),
+                            item_type="Cell",
+                            diff_type=DiffType.DELETED,
+                            old_value=cells_a.value(i),
+                            details="Column deleted"
+                        ))
+                        i += 1
+                        continue
+                if c_b is not None and c_b in cols_inserted:
+                    diff_items.append(DiffItem(
+                        location=cells_b.coordinate(j),
+                        item_type="Cell",
+                        diff_type=DiffType.INSERTED,
+                        new_value=cells_b.value(j),
+                        details="Column inserted"
+                    ))
+                    j += 1
+                    continue
+
+            if c_b is None or (c_a is not None and c_a < c_b):
+                diff_items.append(DiffItem(
+                    location=cells_a.coordinate(i),
+                    item_type="Cell",
+                    diff_type=DiffType.DELETED, # Start cell gone (or moved)
+                    old_value=cells_a.value(i),
+                    details=f"Mapped to row {r_b} but cell empty"
+                ))
+                i += 1
+            elif c_a is None or c_b < c_a:
+                diff_items.append(DiffItem(
+                    location=cells_b.coordinate(j),
+                    item_type="Cell",
+                    diff_type=DiffType.INSERTED,
+                    new_value=cells_b.value(j),
+                    details="Cell added in existing row"
+                ))
+                j += 1
+            else:
+                value_a = cells_a.value(i)
+                value_b = cells_b.value(j)
+                if str(value_a) != str(value_b):
+                    diff_items.append(DiffItem(
+                        location=f"{cells_a.coordinate(i)} -> {cells_b.coordinate(j)}",
+                        item_type="Cell",
+                        diff_type=DiffType.CHANGED,
+                        old_value=value_a,
+                        new_value=value_b
+                    ))
+                i += 1
+                j += 1
+
+    def open_packages(self):
+        """
+        (XlsxPackage A, XlsxPackage B): one archive handle per distinct file, so cells and
+        shapes (and both sides, when two sheets of one workbook are compared) share it.
+        """
+        package_a = XlsxPackage(self.file_a, use_mmap=self.use_mmap)
+        if os.path.abspath(self.file_b) == os.path.abspath(self.file_a):
+            return package_a, package_a
+        try:
+            return package_a, XlsxPackage(self.file_b, use_mmap=self.use_mmap)
+        except BaseException:
+            package_a.close()
+            raise
+
+    @staticmethod
+    def close_packages(package_a, package_b):
+        package_a.close()
+        if package_b is not package_a:
+            package_b.close()
+
+    def load(self, package_a: XlsxPackage = None, package_b: XlsxPackage = None):
+        """(SheetSnapshot A, SheetSnapshot B). Packages not given are opened (and closed) here."""
+        options = dict(streaming=self.streaming, backend=self.backend, use_mmap=self.use_mmap, cache=self.cache)
+        same_file = os.path.abspath(self.file_b) == os.path.abspath(self.file_a)
+        # A single core gains nothing from a second process
+        if self.parallel and not same_file and (os.cpu_count() or 1) > 1:
+            with ProcessPoolExecutor(max_workers=2) as pool:
+                future_a = pool.submit(load_sheet, self.file_a, self.sheet_a, **options)
+                future_b = pool.submit(load_sheet, self.file_b, self.sheet_b, **options)
+                return future_a.result(), future_b.result()
+
+        if package_a is None or package_b is None:
+            package_a, package_b = self.open_packages()
+            try:
+                return self.load(package_a, package_b)
+            finally:
+                self.close_packages(package_a, package_b)
+        snap_a = load_sheet(self.file_a, self.sheet_a, package=package_a, **options)
+        snap_b = load_sheet(self.file_b, self.sheet_b, package=package_b, **options)
+        return snap_a, snap_b
+
+    def unchanged_parts(self, package_a: XlsxPackage = None, package_b: XlsxPackage = None) -> set:
+        """See unchanged_parts(). Empty if the files cannot be opened as packages (load reports why)."""
+        try:
+            if package_a is None or package_b is None:
+                package_a, package_b = self.open_packages()
+                try:
+                    return unchanged_parts(package_a, self.sheet_a, package_b, self.sheet_b)
+                finally:
+                    self.close_packages(package_a, package_b)
+            return unchanged_parts(package_a, self.sheet_a, package_b, self.sheet_b)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return set()
 
     def compare(self) -> DiffResult:
-        cells_a, shapes_a = self.loader_a.load()
-        cells_b, shapes_b = self.loader_b.load()
+        # Both packages are opened once: the unchanged-part check, the shapes and the cells
+        # all read through the same handles (central directory, workbook.xml, rels, styles)
+        try:
+            package_a, package_b = self.open_packages()
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            package_a = package_b = None # Not a package: load() reports why
+        try:
+            unchanged = self.unchanged_parts(package_a, package_b) if package_a is not None else set()
+            drawing_unchanged = "drawing" in unchanged
+            if "cells" in unchanged:
+                # No cell can differ: only the drawings are parsed, rows map to themselves
+                shapes_a = ExcelLoader(self.file_a, sheet_name=self.sheet_a, package=package_a).load_shapes()
+                shapes_b = shapes_a
+                if not drawing_unchanged:
+                    shapes_b = ExcelLoader(self.file_b, sheet_name=self.sheet_b, package=package_b).load_shapes()
+                identity = {s.from_anchor.row: s.from_anchor.row for s in shapes_a}
+                return DiffResult(items=self._compare_shapes(shapes_a, shapes_b, identity, drawing_unchanged))
+
+            snap_a, snap_b = self.load(package_a, package_b)
+        finally:
+            if package_a is not None:
+                self.close_packages(package_a, package_b)
+        return self._compare_loaded(snap_a.cells, snap_a.shapes, snap_a.fps, snap_a.col_fps,
+                                    snap_b.cells, snap_b.shapes, snap_b.fps, snap_b.col_fps, drawing_unchanged)
+
+    def _compare_loaded(self, cells_a, shapes_a, fps_a, col_fps_a, cells_b, shapes_b, fps_b, col_fps_b,
+                        drawing_unchanged=False) -> DiffResult:
         
         # DEBUG: Print shapes from each file
         print(f"DEBUG: Shapes in File A (Base): {[s.name for s in shapes_a]}")
         print(f"DEBUG: Shapes in File B (Modified): {[s.name for s in shapes_b]}")
         
         # 1. Compute Mappings
-        # Determine max rows/cols
-        max_row_a = max([c.row for c in cells_a] + [s.from_anchor.row for s in shapes_a]) if cells_a or shapes_a else 0
-        max_row_b = max([c.row for c in cells_b] + [s.from_anchor.row for s in shapes_b]) if cells_b or shapes_b else 0
-        
-        sigs_a = self.detector.get_row_signatures(cells_a, shapes_a, max_row_a)
-        sigs_b = self.detector.get_row_signatures(cells_b, shapes_b, max_row_b)
-        
-        row_mapping = self.detector.compute_mapping(sigs_a, sigs_b)
-        
-        # Col mapping (Simplified: assuming column letters match for now, 
-        # or we could do transpose signatures. Let's start with just Row mapping)
+        # Columns first (value multisets, independent of the row order): an inserted/deleted column
+        # changes every row it has a value in, so rows are then aligned on the mapped columns only.
+        # A row inserted/deleted with values changes those column keys too: inside replaced
+        # blocks, columns are paired by the values they share.
+        col_keys_a, col_keys_b = self.detector.alignment_keys(col_fps_a, col_fps_b)
+        col_index_mapping = self.detector.compute_mapping(
+            col_keys_a, col_keys_b, similarity=self.detector.column_similarity(cells_a, cells_b))
+        col_mapping = None # Identity
+        cols_inserted = set()
+        if len(col_fps_a) != len(col_fps_b) or any(a != b for a, b in col_index_mapping.items()):
+            # mapping keys/values are 0-indexed, cell columns are 1-indexed
+            col_mapping = {a + 1: (b + 1 if b is not None else None) for a, b in col_index_mapping.items()}
+            cols_inserted = set(range(1, len(col_fps_b) + 1)) - set(col_mapping.values())
+            fps_a = self.detector.get_projected_row_fingerprints(
+                cells_a, shapes_a, {a for a, b in col_mapping.items() if b is not None}, len(fps_a))
+            fps_b = self.detector.get_projected_row_fingerprints(
+                cells_b, shapes_b, set(col_mapping.values()) - {None}, len(fps_b))
+
+        keys_a, keys_b = self.detector.alignment_keys(fps_a, fps_b)
+        # Blank rows never start a moved block (key is the digest, or the full fingerprint after a collision)
+        row_mapping, moves = self.detector.align(keys_a, keys_b, ignore={EMPTY_ROW >> 64, EMPTY_ROW})
         
         diff_items = []
+
+        # Cut-and-pasted row blocks: one item per block. Their rows are mapped,
+        # so the cells are compared like any other row pair (and are identical).
+        for a_start, b_start, length in moves:
+            diff_items.append(DiffItem(
+                location=f"{a_start + 1}:{a_start + length} -> {b_start + 1}:{b_start + length}",
+                item_type="Row",
+                diff_type=DiffType.MOVED,
+                details=f"{length} row(s) moved"
+            ))
         
         # 2. Compare Cells
-        # Index cells by (row, col)
-        map_a = {(c.row, c.col): c for c in cells_a}
-        map_b = {(c.row, c.col): c for c in cells_b}
+        # One walk over the row pairs: each mapped pair merges the two rows' cells
+        # (both sorted by column), unmapped rows are whole-row deletions/insertions.
+        # Built once: B row -> A row, instead of scanning row_mapping per cell.
+        reverse_mapping = {idx_b: idx_a for idx_a, idx_b in row_mapping.items() if idx_b is not None}
         
-        # Check A against B
-        for (r_a, c_a), cell_a in map_a.items():
-            # Get expected row index in B (0-indexed in mapping + 1 for Excel)
-            # mapping keys are 0-indexed. r_a is 1-indexed.
-            idx_a = r_a - 1
-            idx_b = row_mapping.get(idx_a)
-            
+        # mapping keys/values are 0-indexed, cell rows are 1-indexed.
+        for idx_a, idx_b in row_mapping.items():
             if idx_b is None:
                 # Row deleted
-                diff_items.append(DiffItem(
-                    location=cell_a.coordinate,
-                    item_type="Cell",
-                    diff_type=DiffType.DELETED,
-                    old_value=cell_a.value
-                ))
-            else:
-                r_b = idx_b + 1
-                # Check if this cell exists in B at (r_b, c_a) (assuming cols check out)
-                cell_b = map_b.get((r_b, c_a))
-                
-                if cell_b:
-                    if str(cell_a.value) != str(cell_b.value):
-                        diff_items.append(DiffItem(
-                            location=f"{cell_a.coordinate} -> {cell_b.coordinate}",
-                            item_type="Cell",
-                            diff_type=DiffType.CHANGED,
-                            old_value=cell_a.value,
-                            new_value=cell_b.value
-                        ))
-                else:
-                     diff_items.append(DiffItem(
-                        location=cell_a.coordinate,
+                for i in cells_a.row_range(idx_a + 1):
+                    diff_items.append(DiffItem(
+                        location=cells_a.coordinate(i),
                         item_type="Cell",
-                        diff_type=DiffType.DELETED, # Start cell gone (or moved)
-                        old_value=cell_a.value,
-                        details=f"Mapped to row {r_b} but cell empty"
+                        diff_type=DiffType.DELETED,
+                        old_value=cells_a.value(i)
                     ))
+            else:
+                self._compare_rows(cells_a, idx_a + 1, cells_b, idx_b + 1, diff_items, col_mapping, cols_inserted)
 
-        # Check for Insertions in B (reverse check)
-        mapped_rows_b = set(v for v in row_mapping.values() if v is not None)
-        for (r_b, c_b), cell_b in map_b.items():
-            idx_b = r_b - 1
-            if idx_b not in mapped_rows_b:
+        # Rows of B that nothing in A maps to
+        for idx_b in range(len(fps_b)):
+            if idx_b in reverse_mapping:
+                continue
+            for j in cells_b.row_range(idx_b + 1):
                 diff_items.append(DiffItem(
-                    location=cell_b.coordinate,
+                    location=cells_b.coordinate(j),
                     item_type="Cell",
                     diff_type=DiffType.INSERTED,
-                    new_value=cell_b.value,
+                    new_value=cells_b.value(j),
                     details="Row inserted"
                 ))
-            else:
-                # If row mapped, we already checked A vs B. 
-                # Unless B has a cell where A was empty.
-                # Find reverse mapping? Or just iterate all B cells in mapped rows.
-                # Find (r_a) s.t. map[r_a] == r_b
-                # Slow but works:
-                original_row_idx = next((k for k, v in row_mapping.items() if v == idx_b), None)
-                if original_row_idx is not None:
-                     r_a = original_row_idx + 1
-                     if (r_a, c_b) not in map_a:
-                         diff_items.append(DiffItem(
-                            location=cell_b.coordinate,
-                            item_type="Cell",
-                            diff_type=DiffType.INSERTED,
-                            new_value=cell_b.value,
-                            details="Cell added in existing row"
-                        ))
 
+        diff_items.extend(self._compare_shapes(shapes_a, shapes_b, row_mapping, drawing_unchanged))
+        return DiffResult(items=diff_items)
+
+    def _compare_shapes(self, shapes_a, shapes_b, row_mapping, drawing_unchanged=False) -> List[DiffItem]:
+        if drawing_unchanged:
+            # Byte-identical drawing parts: same shapes, same anchors and text
+            return [DiffItem(location=s.name, item_type="Shape", diff_type=DiffType.MATCH) for s in shapes_a]
+
+        diff_items = []
         # 3. Compare Shapes
         # Shape similarity could be based on ID (unreliable?) or Text/Content + Relative Pos
         # Let's try matching by ID first, then fallback to property matching?
@@ -115,6 +379,7 @@ class ExcelComparator:
         # Create lookups for shapes in B
         shapes_b_by_id = {s.id: s for s in shapes_b}
         shapes_b_by_name = {s.name: s for s in shapes_b}
+        shapes_b_by_cell = ShapeGrid(shapes_b, *self.shape_tolerance)
         
         matched_shapes_b = set()
         
@@ -131,14 +396,12 @@ class ExcelComparator:
                     found_match = shapes_b_by_name[sa.name]
             
             # PRIORITY 3: Match by POSITION (last resort)
+            idx_b = row_mapping.get(sa.from_anchor.row)
             if found_match is None:
-                idx_b = row_mapping.get(sa.from_anchor.row)
+                # Unmatched shape of B around the mapped anchor cell, nearest first
                 if idx_b is not None:
-                    for sb in shapes_b:
-                        if sb in matched_shapes_b: continue
-                        if sb.from_anchor.row == idx_b and sb.from_anchor.col == sa.from_anchor.col:
-                            found_match = sb
-                            break
+                    found_match = shapes_b_by_cell.nearest(idx_b, sa.from_anchor.col, sa.from_anchor.row_off,
+                                                           sa.from_anchor.col_off, taken=matched_shapes_b)
             
             if found_match:
                 matched_shapes_b.add(found_match)
@@ -159,6 +422,9 @@ class ExcelComparator:
                     position_changed = True
                 if abs(sa.from_anchor.col_off - found_match.from_anchor.col_off) > TOLERANCE:
                     position_changed = True
+                # Anchored in another cell than its row/column map to
+                if idx_b is not None and (found_match.from_anchor.row, found_match.from_anchor.col) != (idx_b, sa.from_anchor.col):
+                    position_changed = True
                     
                 # SIZE Comparison: Compare to_anchor if available
                 if sa.to_anchor and found_match.to_anchor:
@@ -267,4 +533,4 @@ class ExcelComparator:
         for item in deleted_map.values():
             final_items.append(item)
             
-        return DiffResult(items=final_items)
+        return final_items
@@ -1,5 +1,8 @@
+from array import array
+from bisect import bisect_left
 from dataclasses import dataclass
-from typing import Optional, Any
+from typing import Optional, Any, Iterable, Iterator
+from openpyxl.utils import get_column_letter
 
 @dataclass
 class CellData:
@@ -8,6 +11,112 @@ class CellData:
     value: Any
     coordinate: str
 
+class SheetCells:
+    """
+    Columnar storage for the non-empty cells of one sheet.
+    Parallel int32 row/col/value-id arrays plus an interned value table, so a cell costs
+    12 bytes instead of a CellData object. Cells must be added in sheet order (row by row,
+    columns ascending). Coordinates are computed on demand.
+    Lookup of (row, col): row offsets give the row's slice directly, the column is then
+    found by bisection inside that row.
+    """
+    __slots__ = ("rows", "cols", "value_ids", "values", "_interned", "_row_start")
+
+    def __init__(self, cells: Iterable[CellData] = ()):
+        self.rows = array('i')
+        self.cols = array('i')
+        self.value_ids = array('i')
+        self.values = [] # Interned value table
+        self._interned = {}
+        # _row_start[r] = index of the first cell of row r (rows without cells point to the next one)
+        self._row_start = array('i', [0])
+        self.extend(cells)
+
+    def add(self, row: int, col: int, value: Any):
+        if value is None:
+            return # Empty cells are not stored
+        n = len(self.rows)
+        last_row = len(self._row_start) - 1
+        if row < last_row or (n and row == self.rows[-1] and col <= self.cols[-1]):
+            raise ValueError(f"Cells must be added in sheet order (got R{row}C{col} after R{self.rows[-1]}C{self.cols[-1]})")
+        if row > last_row:
+            self._row_start.extend([n] * (row - last_row))
+        self.rows.append(row)
+        self.cols.append(col)
+        self.value_ids.append(self._intern(value))
+
+    def extend(self, cells: Iterable[CellData]):
+        for c in cells:
+            self.add(c.row, c.col, c.value)
+
+    def __getstate__(self):
+        # Sent between processes: the intern index repeats every value, rebuild it on demand instead
+        return self.rows, self.cols, self.value_ids, self.values, self._row_start
+
+    def __setstate__(self, state):
+        self.rows, self.cols, self.value_ids, self.values, self._row_start = state
+        self._interned = None
+
+    def _intern(self, value: Any) -> int:
+        if self._interned is None:
+            self._interned = {}
+            for idx, v in enumerate(self.values):
+                try:
+                    self._interned.setdefault((v.__class__, v), idx)
+                except TypeError:
+                    pass
+        # Keyed by type too: 1, 1.0 and True are equal (and hash equal) but are different cells
+        try:
+            key = (value.__class__, value)
+            idx = self._interned.get(key)
+            if idx is None:
+                idx = self._interned[key] = len(self.values)
+                self.values.append(value)
+            return idx
+        except TypeError: # Unhashable value (e.g. rich text), stored as is
+            self.values.append(value)
+            return len(self.values) - 1
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[CellData]:
+        for i in range(len(self.rows)):
+            yield self.cell(i)
+
+    @property
+    def max_row(self) -> int:
+        return self.rows[-1] if self.rows else 0
+
+    def row_range(self, row: int) -> range:
+        """Indices of the cells in the given row."""
+        last_row = len(self._row_start) - 1
+        if row < 1 or row > last_row:
+            return range(0)
+        end = self._row_start[row + 1] if row < last_row else len(self.rows)
+        return range(self._row_start[row], end)
+
+    def index(self, row: int, col: int) -> int:
+        """Index of the cell at (row, col), or -1 if it is empty."""
+        span = self.row_range(row)
+        i = bisect_left(self.cols, col, span.start, span.stop)
+        if i < span.stop and self.cols[i] == col:
+            return i
+        return -1
+
+    def get(self, row: int, col: int, default: Any = None) -> Any:
+        i = self.index(row, col)
+        return self.values[self.value_ids[i]] if i >= 0 else default
+
+    def value(self, i: int) -> Any:
+        return self.values[self.value_ids[i]]
+
+    def coordinate(self, i: int) -> str:
+        return f"{get_column_letter(self.cols[i])}{self.rows[i]}"
+
+    def cell(self, i: int) -> CellData:
+        return CellData(row=self.rows[i], col=self.cols[i], value=self.value(i), coordinate=self.coordinate(i))
+
 @dataclass(frozen=True)
 class AnchorPoint:
     row: int
@@ -44,6 +153,7 @@ class DiffItem:
     old_value: Any = None
     new_value: Any = None
     details: str = ""
+    sheet: str = "" # Set by WorkbookComparator (sheet name in A, or in B for an inserted sheet)
 
 @dataclass
 class DiffResult:
@@ -1,81 +1,137 @@
 import openpyxl
-import zipfile
 import xml.etree.ElementTree as ET
 import os
-from .data_types import CellData, ShapeData, AnchorPoint
+from openpyxl.utils import get_column_letter
+from .data_types import CellData, SheetCells, ShapeData, AnchorPoint
+from .xlsx_package import XlsxPackage
+
+# Bump when the loaded cells/shapes change (values, types, skipped cells): cached snapshots become invalid
+LOADER_VERSION = 1
+
+# Cell backends:
+#   "openpyxl" - openpyxl workbook (full object model, or read-only when streaming)
+#   "xml"      - XlsxPackage: iterparse of the sheet XML, always streams and skips empty cells
+BACKENDS = ("openpyxl", "xml")
 
 class ExcelLoader:
-    def __init__(self, filepath: str, sheet_name: str = None):
+    def __init__(self, filepath: str, sheet_name: str = None, streaming: bool = False,
+                 backend: str = "openpyxl", package: XlsxPackage = None, use_mmap: bool = False):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown loader backend '{backend}', expected one of {BACKENDS}")
         self.filepath = filepath
         self.sheet_name = sheet_name
-        self.cells = []
+        # Streaming mode opens the workbook read-only and walks the sheet XML lazily,
+        # skipping empty (styled-only) cells. Memory stays around one row at a time.
+        self.streaming = streaming
+        self.backend = backend
+        # One archive handle for cells and shapes. A package passed in is shared
+        # (e.g. both sides of a compare in the same file) and not closed here.
+        self.package = package
+        self.use_mmap = use_mmap
+        self._owns_package = package is None
+        self.cells = SheetCells()
         self.shapes = []
         
     def load(self):
-        self._load_cells()
-        self._load_shapes()
+        try:
+            self._load_cells()
+            self._load_shapes()
+        finally:
+            self.close()
         return self.cells, self.shapes
 
+    def close(self):
+        if self._owns_package and self.package is not None:
+            self.package.close()
+            self.package = None
+
+    def _get_package(self) -> XlsxPackage:
+        if self.package is None:
+            self.package = XlsxPackage(self.filepath, use_mmap=self.use_mmap)
+        return self.package
+
+    def load_shapes(self):
+        self.shapes = []
+        self._load_shapes()
+        return self.shapes
+
     def _load_cells(self):
-        wb = openpyxl.load_workbook(self.filepath, data_only=False) # Keep formulas? Or data_only=True? 
-        # Let's keep formulas for now, or maybe value. Diffing formulas might be better.
-        # Actually user wants to check difference, usually values matter. 
-        # But if formula changes but value is same? 
-        # let's stick to default (formulas as strings if possible, or values). 
-        # openpyxl default is formulas.
-        
-        # openpyxl default is formulas.
-        
+        for row in self.iter_rows():
+            self.cells.extend(row)
+
+    def iter_rows(self):
+        """
+        Yields the cells of the selected sheet one row at a time (List[CellData]).
+        In streaming mode empty cells are skipped and rows without values are not yielded.
+        """
+        if self.backend == "xml":
+            yield from self._iter_rows_xml()
+            return
+
+        # Keep formulas (openpyxl default): a changed formula is a change
+        # even if the cached value happens to be the same.
+        # openpyxl reads through the shared handle instead of reopening the file
+        wb = openpyxl.load_workbook(self._get_package().fileobj, read_only=self.streaming, data_only=False)
+        try:
+            ws = self._select_sheet(wb)
+            for row in ws.iter_rows():
+                cells = [
+                    CellData(row=cell.row, col=cell.column, value=cell.value, coordinate=cell.coordinate)
+                    for cell in row
+                    # Read-only EmptyCell placeholders have no position, skip them
+                    if not (self.streaming and cell.value is None)
+                ]
+                if cells:
+                    yield cells
+        finally:
+            wb.close()
+
+    def _iter_rows_xml(self):
+        row, current = None, []
+        for r, c, value, formula in self._get_package().iter_cells(self.sheet_name):
+            if r != row:
+                if current:
+                    yield current
+                row, current = r, []
+            current.append(CellData(
+                row=r,
+                col=c,
+                # Same as openpyxl with data_only=False: formula text wins over the cached value
+                value=formula if formula is not None else value,
+                coordinate=f"{get_column_letter(c)}{r}"
+            ))
+        if current:
+            yield current
+
+    def _select_sheet(self, wb):
         if self.sheet_name:
             if self.sheet_name in wb.sheetnames:
-                ws = wb[self.sheet_name]
-            else:
-                raise ValueError(f"Sheet '{self.sheet_name}' not found in {self.filepath}")
-        else:
-            ws = wb.active # Assume first sheet for now
-        
-        for row in ws.iter_rows():
-            for cell in row:
-                self.cells.append(CellData(
-                    row=cell.row,
-                    col=cell.column,
-                    value=cell.value,
-                    coordinate=cell.coordinate
-                ))
-        wb.close()
+                return wb[self.sheet_name]
+            raise ValueError(f"Sheet '{self.sheet_name}' not found in {self.filepath}")
+        return wb.active # Assume first sheet for now
 
     def _load_shapes(self):
-        # We need to map worksheet relationships to find the drawing file
-        # For simplicity in V1, we iterate all drawing XMLs found in the zip 
-        # and assume they belong to the active sheet or catch them all.
-        # A more robust way involves parsing xl/worksheets/sheet1.xml to find the drawing rId.
-        
+        # Only the drawing part that belongs to the selected sheet is parsed,
+        # found through the workbook and sheet relationships.
         ns = {
             'xdr': 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing',
             'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'
         }
         
-        with zipfile.ZipFile(self.filepath, 'r') as z:
-            # TODO: Filter shapes by sheet_name if possible. 
-            # Currently parses all drawings in the file.
-            # This might include shapes from other sheets.
-            # Improvement: parsing worksheet relationships to find specific drawing file.
-            
-            # Simple heuristic: look for drawing files
-            drawing_files = [f for f in z.namelist() if 'xl/drawings/drawing' in f]
+        package = self._get_package()
+        drawing = package.drawing_part(self.sheet_name)
+        if drawing is None:
+            return
+        
+        root = ET.fromstring(package.read(drawing))
+        
+        # twoCellAnchor is the most common for shapes placed in grid
+        for anchor in root.findall('.//xdr:twoCellAnchor', ns):
+            self._parse_anchor_shape(anchor, ns)
             
-            for df in drawing_files:
-                with z.open(df) as f:
-                    tree = ET.parse(f)
-                    root = tree.getroot()
-                    
-                    # twoCellAnchor is the most common for shapes placed in grid
-                    for anchor in root.findall('.//xdr:twoCellAnchor', ns):
-                        self._parse_anchor_shape(anchor, ns)
-                        
-                    # oneCellAnchor (less common for main shapes, often for comments/buttons)
-                    for anchor in root.findall('.//xdr:oneCellAnchor', ns):
-                        self._parse_anchor_shape(anchor, ns)
+        # oneCellAnchor (less common for main shapes, often for comments/buttons)
+        for anchor in root.findall('.//xdr:oneCellAnchor', ns):
+            self._parse_anchor_shape(anchor, ns)
 
     def _parse_anchor_shape(self, anchor, ns):
         # Get Shape Info
@@ -0,0 +1,140 @@
+from array import array
+from hashlib import blake2b
+from typing import Any, Iterable, List, Optional
+
+# Bump when the encoding below changes: persisted fingerprints become invalid
+FINGERPRINT_VERSION = 2
+
+_SEP = b'\0' # Cannot appear in cell text (not allowed in XML)
+
+
+def _encode(value: Any) -> bytes:
+    # Same equality as the old string signatures: str() of the value, empty for None
+    return ("" if value is None else str(value)).encode('utf-8', 'surrogatepass')
+
+
+def row_fingerprint(values: Iterable[Any], shape_names: Iterable[str] = ()) -> int:
+    """
+    Stable 128-bit fingerprint of one row (cell values in column order, then shape names).
+    Unlike hash(), it does not change between processes, so it can be stored.
+    """
+    h = blake2b(digest_size=16)
+    for v in values:
+        h.update(_encode(v))
+        h.update(_SEP)
+    for name in shape_names:
+        h.update(b'SHP:')
+        h.update(_encode(name))
+        h.update(_SEP)
+    return int.from_bytes(h.digest(), 'big')
+
+
+EMPTY_ROW = row_fingerprint(())
+
+_MASK = (1 << 128) - 1
+
+
+def _value_digest(value: Any) -> int:
+    return int.from_bytes(blake2b(_encode(value), digest_size=16).digest(), 'big')
+
+
+def _multiset_fingerprint(total: int, count: int) -> int:
+    if not count:
+        return EMPTY_ROW # An empty column hashes like an empty row
+    h = blake2b(total.to_bytes(16, 'big'), digest_size=16, person=b'column')
+    h.update(count.to_bytes(8, 'big'))
+    return int.from_bytes(h.digest(), 'big')
+
+
+def column_fingerprint(values: Iterable[Any]) -> int:
+    """
+    Fingerprint of a column's non-empty values as a multiset (sum of the value digests).
+    It does not depend on the row order: inserting, deleting or moving a row only changes
+    the columns it has values in, and only by that value.
+    """
+    total = count = 0
+    for v in values:
+        if v is not None:
+            total = (total + _value_digest(v)) & _MASK
+            count += 1
+    return _multiset_fingerprint(total, count)
+
+
+class RowFingerprints:
+    """
+    Fingerprints of rows (or columns) 1..n of a sheet, split in two 64-bit halves:
+    digests (what the alignment compares) and checks (used to detect digest collisions).
+    """
+    __slots__ = ("digests", "checks")
+
+    def __init__(self, fingerprints: Iterable[int] = ()):
+        self.digests = array('Q')
+        self.checks = array('Q')
+        for fp in fingerprints:
+            self.append(fp)
+
+    def append(self, fp: int):
+        self.digests.append(fp >> 64)
+        self.checks.append(fp & 0xFFFFFFFFFFFFFFFF)
+
+    def __len__(self) -> int:
+        return len(self.digests)
+
+    def __getitem__(self, i: int) -> int:
+        return (self.digests[i] << 64) | self.checks[i]
+
+
+class RowFingerprinter:
+    """
+    Builds RowFingerprints while rows stream in (rows must arrive in ascending order).
+    Shapes are known up front and are folded into the row they are anchored to.
+    """
+    def __init__(self, shapes: List[Any] = ()):
+        self._shapes = {}
+        for s in shapes:
+            r = s.from_anchor.row + 1 # Convert XML 0-indexed to 1-indexed to match CellData
+            self._shapes.setdefault(r, []).append(s.name)
+        self._result = RowFingerprints()
+
+    def _fill_to(self, row: int):
+        # Rows without cells: empty, or only their shapes
+        for r in range(len(self._result) + 1, row):
+            names = self._shapes.get(r)
+            self._result.append(row_fingerprint((), names) if names else EMPTY_ROW)
+
+    def add_row(self, row: int, values: Iterable[Any]):
+        if row <= len(self._result):
+            raise ValueError(f"Row {row} added out of order")
+        self._fill_to(row)
+        self._result.append(row_fingerprint(values, self._shapes.get(row, ())))
+
+    def finish(self, max_row: Optional[int] = None) -> RowFingerprints:
+        if max_row is None:
+            max_row = max([len(self._result)] + list(self._shapes))
+        self._fill_to(max_row + 1)
+        return self._result
+
+
+class ColumnFingerprinter:
+    """
+    Builds column fingerprints (see column_fingerprint) from the same row stream as
+    RowFingerprinter. Only non-empty cells are passed in, so a blank row does not change any column.
+    """
+    def __init__(self):
+        self._sums = {} # column -> [sum of value digests, number of values]
+
+    def add_row(self, cols: Iterable[int], values: Iterable[Any]):
+        for col, v in zip(cols, values):
+            acc = self._sums.get(col)
+            if acc is None:
+                acc = self._sums[col] = [0, 0]
+            acc[0] = (acc[0] + _value_digest(v)) & _MASK
+            acc[1] += 1
+
+    def finish(self, max_col: Optional[int] = None) -> RowFingerprints:
+        if max_col is None:
+            max_col = max(self._sums, default=0)
+        result = RowFingerprints()
+        for col in range(1, max_col + 1):
+            result.append(_multiset_fingerprint(*self._sums.get(col, (0, 0))))
+        return result
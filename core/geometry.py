@@ -0,0 +1,275 @@
+import math
+import xml.etree.ElementTree as ET
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import List, Tuple
+from .xlsx_package import XlsxPackage, NS_MAIN, TAG_ROW
+
+TAG_COL = f'{{{NS_MAIN}}}col'
+TAG_FORMAT_PR = f'{{{NS_MAIN}}}sheetFormatPr'
+
+NS_XDR = 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing'
+NS_A = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+# Anchored objects that Excel lists in Worksheet.Shapes (group members are not listed)
+SHAPE_TAGS = {f'{{{NS_XDR}}}{t}' for t in ('sp', 'pic', 'cxnSp', 'grpSp', 'graphicFrame')}
+TAG_CNVPR = f'{{{NS_XDR}}}cNvPr'
+
+EMU_PER_POINT = 12700
+POINTS_PER_PIXEL = 0.75 # 96 dpi
+
+# Maximum digit width in pixels of the Normal style font. 7 is Calibri 11 (Excel's default);
+# widths are converted with it, so both sides of a compare use the same scale.
+MDW = 7
+
+DEFAULT_ROW_HEIGHT = 15.0 # Points, Calibri 11
+DEFAULT_BASE_COL_WIDTH = 8 # Characters
+
+
+def width_to_chars(width: float, mdw: int = MDW) -> float:
+    """
+    Converts a <col width> (characters + padding, as stored in the XML) to the value
+    of Range.ColumnWidth (characters), as in the OOXML spec (18.3.1.13).
+    """
+    pixels = math.trunc(((256 * width + math.trunc(128 / mdw)) / 256) * mdw)
+    return max(0.0, math.trunc((pixels - 5) / mdw * 100 + 0.5) / 100)
+
+
+def base_width_to_chars(base: int, mdw: int = MDW) -> float:
+    # Default column: base characters + 5px padding, rounded up to a multiple of 8 pixels
+    pixels = math.ceil((base * mdw + 5) / 8) * 8
+    return math.trunc((pixels - 5) / mdw * 100 + 0.5) / 100
+
+
+class SheetGeometry:
+    """
+    Row heights (points, as Range.RowHeight) and column widths (characters, as
+    Range.ColumnWidth) of one sheet. Only the explicitly sized rows/columns are stored,
+    in dense arrays; everything past them has the default size. Hidden rows/columns are 0.
+    """
+    __slots__ = ("default_height", "heights", "default_width", "widths")
+
+    def __init__(self, default_height: float = DEFAULT_ROW_HEIGHT,
+                 default_width: float = base_width_to_chars(DEFAULT_BASE_COL_WIDTH)):
+        self.default_height = default_height
+        self.default_width = default_width
+        self.heights = array('d') # Row r at index r - 1, NaN = default
+        self.widths = array('d') # Column c at index c - 1, NaN = default
+
+    @staticmethod
+    def _set(values: array, index: int, size: float):
+        if index > len(values):
+            values.extend([math.nan] * (index - len(values)))
+        values[index - 1] = size
+
+    @staticmethod
+    def _get(values: array, index: int, default: float) -> float:
+        if 1 <= index <= len(values):
+            size = values[index - 1]
+            if size == size: # Not NaN
+                return size
+        return default
+
+    def row_height(self, row: int) -> float:
+        return self._get(self.heights, row, self.default_height)
+
+    def col_width(self, col: int) -> float:
+        return self._get(self.widths, col, self.default_width)
+
+    def col_width_points(self, col: int, mdw: int = MDW) -> float:
+        # Characters -> whole pixels (5px padding) -> points, as Range.Width
+        chars = self.col_width(col)
+        return int(chars * mdw + 5 + 0.5) * POINTS_PER_PIXEL if chars > 0 else 0.0
+
+    def row_tops(self, count: int) -> List[float]:
+        """Top of rows 1..count+1 in points (Range.Top at 100% zoom), index r - 1 for row r."""
+        tops = [0.0]
+        for r in range(1, count + 1):
+            tops.append(tops[-1] + self.row_height(r))
+        return tops
+
+    def col_lefts(self, count: int) -> List[float]:
+        """Left of columns 1..count+1 in points (Range.Left), index c - 1 for column c."""
+        lefts = [0.0]
+        for c in range(1, count + 1):
+            lefts.append(lefts[-1] + self.col_width_points(c))
+        return lefts
+
+
+def read_sheet_geometry(package: XlsxPackage, sheet_name: str = None, mdw: int = MDW) -> SheetGeometry:
+    """
+    Reads the sheet's <sheetFormatPr>, <cols> and the <row ht/hidden> attributes.
+    The sheet XML is streamed; cell contents are skipped.
+    """
+    geometry = SheetGeometry()
+    base_width = DEFAULT_BASE_COL_WIDTH
+    default_col_width = None
+    row_idx = 0
+
+    with package.zip.open(package.sheet_part(sheet_name)) as f:
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if tag == TAG_ROW:
+                    # Attributes are complete on 'start': the row's cells are never needed
+                    r = elem.get('r')
+                    row_idx = int(r) if r else row_idx + 1
+                    if elem.get('hidden') in ('1', 'true'):
+                        geometry._set(geometry.heights, row_idx, 0.0)
+                    elif elem.get('ht'):
+                        geometry._set(geometry.heights, row_idx, float(elem.get('ht')))
+                continue
+
+            if tag == TAG_ROW:
+                elem.clear()
+            elif tag == TAG_FORMAT_PR:
+                if elem.get('defaultRowHeight'):
+                    geometry.default_height = float(elem.get('defaultRowHeight'))
+                if elem.get('baseColWidth'):
+                    base_width = int(elem.get('baseColWidth'))
+                if elem.get('defaultColWidth'):
+                    default_col_width = float(elem.get('defaultColWidth'))
+            elif tag == TAG_COL:
+                hidden = elem.get('hidden') in ('1', 'true')
+                width = elem.get('width')
+                if hidden:
+                    size = 0.0
+                else:
+                    # A <col> that only sets a style keeps the sheet's default width (NaN)
+                    size = width_to_chars(float(width), mdw) if width is not None else math.nan
+                for c in range(int(elem.get('min')), int(elem.get('max')) + 1):
+                    if c > 16384:
+                        break
+                    geometry._set(geometry.widths, c, size)
+
+    if default_col_width is not None:
+        geometry.default_width = width_to_chars(default_col_width, mdw)
+    else:
+        geometry.default_width = base_width_to_chars(base_width, mdw)
+    # <cols> often ends with a range up to column 16384 at the default width: drop the tail
+    while geometry.widths and (geometry.widths[-1] == geometry.default_width
+                               or geometry.widths[-1] != geometry.widths[-1]):
+        geometry.widths.pop()
+    return geometry
+
+
+def diff_sizes(count: int, old_size, new_size, tolerance: float = 0.1) -> List[Tuple[int, float, float]]:
+    """(index, old, new) for indices 1..count whose sizes differ by more than tolerance."""
+    diffs = []
+    for i in range(1, count + 1):
+        a = old_size(i)
+        b = new_size(i)
+        if abs(a - b) > tolerance:
+            diffs.append((i, a, b))
+    return diffs
+
+
+@dataclass
+class ShapeBox:
+    """Position and size of an anchored drawing object, in points (as the Shape COM properties)."""
+    id: int
+    name: str
+    top: float
+    left: float
+    width: float
+    height: float
+    anchor_row: int # 1-indexed, cell under the top-left corner (Shape.TopLeftCell)
+    anchor_col: int
+    rel_top: float # Offset from the top-left of the anchor cell
+    rel_left: float
+
+
+def _cell_at(edges: List[float], size, pos: float) -> int:
+    # 0-indexed row/column containing pos; edges (tops or lefts) grow as needed
+    while edges[-1] <= pos and len(edges) <= 1048576:
+        edges.append(edges[-1] + size(len(edges)))
+    return max(0, bisect_right(edges, pos) - 1)
+
+
+def _anchor_cell(node):
+    # <xdr:from>/<xdr:to>: 0-indexed col/row plus offsets in EMU
+    values = {child.tag.rsplit('}', 1)[-1]: int(child.text) for child in node}
+    return values['row'], values['col'], values['rowOff'] / EMU_PER_POINT, values['colOff'] / EMU_PER_POINT
+
+
+def read_shape_boxes(package: XlsxPackage, sheet_name: str = None, geometry: SheetGeometry = None) -> List[ShapeBox]:
+    """
+    All anchored objects of the sheet's drawing part (shapes, pictures, connectors,
+    groups, charts) with their geometry, from the DrawingML anchors: anchor cells are
+    converted to points with the sheet's row heights and column widths.
+    """
+    drawing = package.drawing_part(sheet_name)
+    if drawing is None:
+        return []
+    if geometry is None:
+        geometry = read_sheet_geometry(package, sheet_name)
+
+    root = ET.fromstring(package.read(drawing))
+    anchors = []
+    max_row = max_col = 0
+    for anchor in root:
+        obj = next((child for child in anchor if child.tag in SHAPE_TAGS), None)
+        if obj is None:
+            continue
+        nv = obj.find(f'.//{TAG_CNVPR}')
+        xfrm_ext = None
+        for elem in obj.iter():
+            if elem.tag.endswith('}xfrm'):
+                xfrm_ext = elem.find(f'{{{NS_A}}}ext')
+                break
+        fr = anchor.find(f'{{{NS_XDR}}}from')
+        to = anchor.find(f'{{{NS_XDR}}}to')
+        pos = anchor.find(f'{{{NS_XDR}}}pos')
+        ext = anchor.find(f'{{{NS_XDR}}}ext')
+        start = _anchor_cell(fr) if fr is not None else None
+        end = _anchor_cell(to) if to is not None else None
+        for cell in (start, end):
+            if cell is not None:
+                max_row = max(max_row, cell[0] + 1)
+                max_col = max(max_col, cell[1] + 1)
+        anchors.append((nv, xfrm_ext, start, end, pos, ext))
+
+    tops = geometry.row_tops(max_row)
+    lefts = geometry.col_lefts(max_col)
+    boxes = []
+    for nv, xfrm_ext, start, end, pos, ext in anchors:
+        if start is not None:
+            row, col, row_off, col_off = start
+            top = tops[row] + row_off
+            left = lefts[col] + col_off
+        elif pos is not None: # absoluteAnchor
+            top = int(pos.get('y')) / EMU_PER_POINT
+            left = int(pos.get('x')) / EMU_PER_POINT
+            row = col = None
+        else:
+            continue
+
+        # Size: the object's own transform is exact, otherwise the anchor extent / end cell
+        size = xfrm_ext if xfrm_ext is not None else ext
+        if size is not None:
+            width = int(size.get('cx')) / EMU_PER_POINT
+            height = int(size.get('cy')) / EMU_PER_POINT
+        elif end is not None:
+            height = tops[end[0]] + end[2] - top
+            width = lefts[end[1]] + end[3] - left
+        else:
+            width = height = 0.0
+
+        if row is None:
+            # Cell under the absolute position
+            row = _cell_at(tops, geometry.row_height, top)
+            col = _cell_at(lefts, geometry.col_width_points, left)
+
+        boxes.append(ShapeBox(
+            id=int(nv.get('id')) if nv is not None else 0,
+            name=nv.get('name', '') if nv is not None else '',
+            top=top,
+            left=left,
+            width=width,
+            height=height,
+            anchor_row=row + 1,
+            anchor_col=col + 1,
+            rel_top=top - tops[row],
+            rel_left=left - lefts[col],
+        ))
+    return boxes
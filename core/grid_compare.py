@@ -0,0 +1,106 @@
+import numpy as np
+from itertools import chain
+from typing import Any, Dict, List, Sequence, Tuple
+from openpyxl.utils import get_column_letter
+
+# Same tolerance as the per-cell comparison it replaces
+EPSILON = 0.000001
+
+# Mapped rows compared per block, bounds the size of the temporary arrays
+BLOCK_ROWS = 4096
+
+
+def _is_number(v):
+    # bool included, as isinstance(True, int)
+    return isinstance(v, (int, float))
+
+
+def _as_text(v):
+    return "" if v is None else str(v).strip()
+
+
+_numbers = np.frompyfunc(_is_number, 1, 1)
+_floats = np.frompyfunc(float, 1, 1)
+_texts = np.frompyfunc(_as_text, 1, 1)
+
+
+def diff_mask(old: np.ndarray, new: np.ndarray, epsilon: float = EPSILON) -> np.ndarray:
+    """
+    Element-wise "values differ" for two object arrays of the same shape:
+    numbers (int/float, mixed allowed) differ if they are more than epsilon apart,
+    everything else compares as stripped text with None as "".
+    """
+    # Exact equality settles almost every cell in one C-level pass
+    differ = np.asarray(old != new, dtype=bool)
+    idx = np.nonzero(differ)
+    if not len(idx[0]):
+        return differ
+
+    cand_old = old[idx]
+    cand_new = new[idx]
+    numeric = _numbers(cand_old).astype(bool) & _numbers(cand_new).astype(bool)
+
+    result = np.empty(len(cand_old), dtype=bool)
+    if numeric.any():
+        f_old = _floats(cand_old[numeric]).astype(np.float64)
+        f_new = _floats(cand_new[numeric]).astype(np.float64)
+        # NaN is never "more than epsilon apart", as with abs() before
+        result[numeric] = np.abs(f_old - f_new) > epsilon
+    text = ~numeric
+    if text.any():
+        result[text] = _texts(cand_old[text]) != _texts(cand_new[text])
+    differ[idx] = result
+    return differ
+
+
+def _grid(raw: Sequence[Sequence[Any]], rows: List[int], cols: np.ndarray) -> np.ndarray:
+    # Rows of a UsedRange all have the same width; one flat fill is the cheapest way in
+    width = len(raw[rows[0]])
+    flat = np.fromiter(chain.from_iterable(raw[r] for r in rows), dtype=object, count=len(rows) * width)
+    return flat.reshape(len(rows), width)[:, cols]
+
+
+def compare_aligned_rows(raw_old: Sequence[Sequence[Any]], raw_new: Sequence[Sequence[Any]],
+                         row_map: Dict[int, int], col_pairs: Sequence[Tuple[int, int]],
+                         epsilon: float = EPSILON, origin_old: Tuple[int, int] = (1, 1),
+                         origin_new: Tuple[int, int] = (1, 1)) -> List[Tuple[int, int, Any, Any]]:
+    """
+    Compares the cells of mapped rows (row_map: old row -> new row) on mapped columns
+    (col_pairs: [(old col, new col)]). Rows and columns are sheet coordinates, the 2D value
+    lists start at their origin (UsedRange.Row, UsedRange.Column), A1 = (1, 1).
+    Returns (old row, old col, old value, new value) for each difference, in old row/column order.
+    """
+    if not raw_old or not raw_new or not row_map or not col_pairs:
+        return []
+    # To 0-indexed positions in the value lists
+    rows_old = np.fromiter(row_map.keys(), dtype=np.intp, count=len(row_map)) - origin_old[0]
+    rows_new = np.fromiter(row_map.values(), dtype=np.intp, count=len(row_map)) - origin_new[0]
+    keep = (rows_old >= 0) & (rows_old < len(raw_old)) & (rows_new >= 0) & (rows_new < len(raw_new))
+    order = np.argsort(rows_old[keep], kind='stable')
+    rows_old = rows_old[keep][order].tolist()
+    rows_new = rows_new[keep][order].tolist()
+    cols_old = np.array([c for c, _ in col_pairs], dtype=np.intp) - origin_old[1]
+    cols_new = np.array([c for _, c in col_pairs], dtype=np.intp) - origin_new[1]
+    keep = (cols_old >= 0) & (cols_old < len(raw_old[0])) & (cols_new >= 0) & (cols_new < len(raw_new[0]))
+    cols_old = cols_old[keep]
+    cols_new = cols_new[keep]
+    if not rows_old or not len(cols_old):
+        return []
+
+    diffs = []
+    for start in range(0, len(rows_old), BLOCK_ROWS):
+        block_old = rows_old[start:start + BLOCK_ROWS]
+        old = _grid(raw_old, block_old, cols_old)
+        new = _grid(raw_new, rows_new[start:start + BLOCK_ROWS], cols_new)
+        rows, cols = np.nonzero(diff_mask(old, new, epsilon))
+        for k, c in zip(rows.tolist(), cols.tolist()):
+            diffs.append((block_old[k] + origin_old[0], int(cols_old[c]) + origin_old[1], old[k, c], new[k, c]))
+    return diffs
+
+
+def a1_address(row: int, col: int) -> str:
+    """
+    'B12' for (12, 2), without asking Excel (Range.Address is one COM call per cell).
+    get_column_letter is cached by openpyxl, so each column is converted once.
+    """
+    return f"{get_column_letter(col)}{row}"
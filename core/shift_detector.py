@@ -1,26 +1,67 @@
-import difflib
-from typing import List, Dict, Optional, Any
+from collections import Counter
+from typing import List, Dict, Optional, Any, Iterable, Callable
+from .alignment import DEFAULT_ENGINE, MAX_CHAIN, get_engine
 from .data_types import CellData
+from .fingerprint import RowFingerprinter, ColumnFingerprinter, RowFingerprints
+
+# Share of values two columns must have in common to be paired inside a replaced block
+COLUMN_MATCH = 0.5
+# Shortest run reported as a moved block: one row deleted here and an identical one
+# inserted there is more often a duplicate (a repeated total, a blank-ish row) than a move
+MIN_MOVE = 2
+# Above this many (A, B) candidates a replaced block is paired by position
+MAX_SIMILARITY_PAIRS = 10000
+
+
+def value_overlap(values_a: Counter, values_b: Counter) -> float:
+    """Share of values two columns have in common, as multisets: 1.0 same values, 0.0 none."""
+    size = max(sum(values_a.values()), sum(values_b.values()))
+    if not size:
+        return 1.0
+    return sum((values_a & values_b).values()) / size
+
 
 class ShiftDetector:
-    def __init__(self):
-        pass
+    def __init__(self, engine: str = DEFAULT_ENGINE):
+        # Alignment algorithm, see core.alignment.ENGINES
+        self.engine = get_engine(engine)
 
-    def compute_mapping(self, list_a: List[Any], list_b: List[Any]) -> Dict[int, Optional[int]]:
+    def compute_mapping(self, list_a: List[Any], list_b: List[Any],
+                        similarity: Optional[Callable[[int, int], float]] = None) -> Dict[int, Optional[int]]:
         """
         Computes a mapping from indices in A to indices in B.
         Returns: Dict { index_a: index_b (or None if deleted) }
         If index_b is None, row A was deleted.
         Any index_b not in values means row B was inserted.
+        similarity: see pair_similar (None pairs replaced blocks by position).
+        """
+        return self.align(list_a, list_b, detect_moves=False, similarity=similarity)[0]
+
+    def align(self, list_a: List[Any], list_b: List[Any], detect_moves: bool = True, ignore=(),
+              similarity: Optional[Callable[[int, int], float]] = None, min_length: int = MIN_MOVE):
+        """
+        Same mapping as compute_mapping, plus block moves: runs deleted from A that
+        reappear as inserted runs in B (see find_moves). Moved rows are mapped too.
+        Returns (mapping, moves).
         """
-        matcher = difflib.SequenceMatcher(None, list_a, list_b)
+        opcodes = self.engine.get_opcodes(list_a, list_b)
+        moves = self.find_moves(list_a, list_b, opcodes, ignore, min_length) if detect_moves else []
+
         mapping: Dict[int, Optional[int]] = {}
         
         # Initialize all as deleted (None) first
         for i in range(len(list_a)):
             mapping[i] = None
+
+        moved_a = set()
+        moved_b = set()
+        for a_start, b_start, length in moves:
+            for k in range(length):
+                mapping[a_start + k] = b_start + k
+                moved_a.add(a_start + k)
+                moved_b.add(b_start + k)
             
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        for tag, i1, i2, j1, j2 in opcodes:
             if tag == 'equal':
                 # Block match: A[i1:i2] == B[j1:j2]
                 for k in range(i2 - i1):
@@ -29,21 +70,139 @@ class ShiftDetector:
                 # Block modified: A[i1:i2] became B[j1:j2]
                 # Heuristic: Map 1-to-1 for the minimum length of the block.
                 # Remaining items in A are deleted, remaining in B are inserted.
-                len_a = i2 - i1
-                len_b = j2 - j1
-                min_len = min(len_a, len_b)
-                for k in range(min_len):
-                    mapping[i1 + k] = j1 + k
-                # If len_a > min_len, indices i1+min_len ... i2 are unmapped (None -> Deleted)
-                # If len_b > min_len, indices j1+min_len ... j2 are unmapped (Inserted)
+                # Rows that were moved in or out are not part of the pairing.
+                rest_a = [i for i in range(i1, i2) if i not in moved_a]
+                rest_b = [j for j in range(j1, j2) if j not in moved_b]
+                pairs = zip(rest_a, rest_b) if similarity is None else self.pair_similar(rest_a, rest_b, similarity)
+                for i, j in pairs:
+                    mapping[i] = j
             # 'delete', 'insert' imply no mapping for those indices
             
-        return mapping
+        return mapping, moves
+
+    def pair_similar(self, rest_a: List[int], rest_b: List[int], similarity: Callable[[int, int], float],
+                     threshold: float = COLUMN_MATCH):
+        """
+        Pairs a replaced block by content instead of position (used for columns, whose keys
+        change as soon as a row with values is inserted or deleted): the order-preserving
+        pairing with the highest total similarity(i, j), pairs below threshold excluded.
+        Between two such pairs, equally long runs left over are paired by position, as in
+        a plain replace. Returns [(i, j)].
+        """
+        m, n = len(rest_a), len(rest_b)
+        if m * n > MAX_SIMILARITY_PAIRS:
+            return list(zip(rest_a, rest_b))
+        # score[x][y]: best total over rest_a[:x], rest_b[:y] (an LCS where "equal" is "similar enough")
+        score = [[0.0] * (n + 1) for _ in range(m + 1)]
+        sims = [[None] * n for _ in range(m)]
+        for x in range(m):
+            for y in range(n):
+                best = max(score[x][y + 1], score[x + 1][y])
+                sim = similarity(rest_a[x], rest_b[y])
+                if sim >= threshold:
+                    sims[x][y] = sim
+                    best = max(best, score[x][y] + sim)
+                score[x + 1][y + 1] = best
+
+        anchors = []
+        x, y = m, n
+        while x and y:
+            sim = sims[x - 1][y - 1]
+            if sim is not None and score[x][y] == score[x - 1][y - 1] + sim:
+                x, y = x - 1, y - 1
+                anchors.append((x, y))
+            elif score[x][y] == score[x - 1][y]:
+                x -= 1
+            else:
+                y -= 1
+        anchors.reverse()
+
+        pairs = []
+        prev_x = prev_y = -1
+        for x, y in anchors + [(m, n)]:
+            if x - prev_x == y - prev_y:
+                pairs.extend(zip(rest_a[prev_x + 1:x], rest_b[prev_y + 1:y]))
+            if x < m:
+                pairs.append((rest_a[x], rest_b[y]))
+            prev_x, prev_y = x, y
+        return pairs
+
+    def column_similarity(self, cells_a, cells_b) -> Callable[[int, int], float]:
+        """
+        similarity(i, j) for pair_similar over the columns of two SheetCells (0-indexed),
+        from each column's values as a multiset. The value counts are built on first use.
+        """
+        counts = []
+
+        def similarity(i: int, j: int) -> float:
+            if not counts:
+                for cells in (cells_a, cells_b):
+                    columns = {}
+                    for col, value in zip(cells.cols, cells.value_ids):
+                        columns.setdefault(col, Counter())[str(cells.values[value])] += 1
+                    counts.append(columns)
+            empty = Counter()
+            return value_overlap(counts[0].get(i + 1, empty), counts[1].get(j + 1, empty))
 
-    def get_row_signatures(self, cells: List[CellData], shapes: List[Any], max_row: int) -> List[str]:
+        return similarity
+
+    def find_moves(self, list_a: List[Any], list_b: List[Any], opcodes, ignore=(), min_length: int = MIN_MOVE):
+        """
+        Pairs rows removed from A (delete/replace opcodes) with identical runs added
+        to B (insert/replace opcodes): a cut-and-pasted block becomes one move instead
+        of N deletions plus N insertions.
+        A block never starts on an ignored key (blank rows) or on a key seen more than
+        MAX_CHAIN times among the inserted rows, and is at least min_length long.
+        Returns [(a_start, b_start, length)], 0-indexed, in A order.
+        """
+        # Inserted rows of B: key -> positions, and the end of the run each belongs to
+        positions: Dict[Any, List[int]] = {}
+        run_end = {}
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag in ('insert', 'replace'):
+                for j in range(j1, j2):
+                    positions.setdefault(list_b[j], []).append(j)
+                    run_end[j] = j2
+        if not positions:
+            return []
+
+        used_b = set()
+        moves = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag not in ('delete', 'replace'):
+                continue
+            i = i1
+            while i < i2:
+                key = list_a[i]
+                candidates = positions.get(key)
+                if key in ignore or not candidates or len(candidates) > MAX_CHAIN:
+                    i += 1
+                    continue
+                best_j, best_len = None, 0
+                for j in candidates:
+                    if j in used_b:
+                        continue
+                    length = 0
+                    end_b = run_end[j]
+                    while (i + length < i2 and j + length < end_b and j + length not in used_b
+                           and list_a[i + length] == list_b[j + length]):
+                        length += 1
+                    if length > best_len:
+                        best_j, best_len = j, length
+                if best_j is None or best_len < min_length:
+                    i += 1
+                    continue
+                moves.append((i, best_j, best_len))
+                used_b.update(range(best_j, best_j + best_len))
+                i += best_len
+        return moves
+
+    def get_row_signatures(self, cells: Iterable[CellData], shapes: List[Any], max_row: Optional[int] = None) -> List[str]:
         """
         Generates a signature for each row.
         Signature: "Cell1|Cell2|...||Shape1|Shape2..."
+        cells may be any iterable (e.g. a row stream from ExcelLoader.iter_rows), it is
+        consumed once. If max_row is None it is taken from the last non-empty row.
         """
         # Group by row
         rows = {}
@@ -61,6 +220,9 @@ class ShiftDetector:
             # Use Shape Name or ID as signature
             rows[r].append(f"SHP:{s.name}")
 
+        if max_row is None:
+            max_row = max(rows) if rows else 0
+
         signatures = []
         # 1-indexed rows
         for r in range(1, max_row + 1):
@@ -75,3 +237,63 @@ class ShiftDetector:
             else:
                 signatures.append("") # Empty row
         return signatures
+
+    def get_row_fingerprints(self, rows: Iterable[List[CellData]], shapes: List[Any], max_row: Optional[int] = None) -> RowFingerprints:
+        """
+        Fixed-width fingerprint for each row, computed as rows stream in
+        (rows as yielded by ExcelLoader.iter_rows). Same content as get_row_signatures,
+        without building the strings.
+        """
+        fingerprinter = RowFingerprinter(shapes)
+        for row in rows:
+            # Empty cells (padding of a full load) are skipped, as in SheetCells
+            fingerprinter.add_row(row[0].row, [c.value for c in row if c.value is not None])
+        return fingerprinter.finish(max_row)
+
+    def get_fingerprints(self, rows: Iterable[List[CellData]], shapes: List[Any], max_row: Optional[int] = None):
+        """
+        Row and column fingerprints in one pass over the row stream.
+        Returns (row fingerprints, column fingerprints).
+        """
+        row_fp = RowFingerprinter(shapes)
+        col_fp = ColumnFingerprinter()
+        for row in rows:
+            cells = [c for c in row if c.value is not None] # Padding of a full load, as in SheetCells
+            values = [c.value for c in cells]
+            row_fp.add_row(row[0].row, values)
+            col_fp.add_row([c.col for c in cells], values)
+        return row_fp.finish(max_row), col_fp.finish()
+
+    def get_projected_row_fingerprints(self, cells, shapes: List[Any], columns, max_row: int) -> RowFingerprints:
+        """
+        Row fingerprints over the given columns only (cells is a SheetCells).
+        Used when columns were inserted/deleted: those columns change every row they touch.
+        """
+        fingerprinter = RowFingerprinter(shapes)
+        cols = cells.cols
+        for r in range(1, cells.max_row + 1):
+            span = cells.row_range(r)
+            if span:
+                fingerprinter.add_row(r, [cells.value(i) for i in span if cols[i] in columns])
+        return fingerprinter.finish(max_row)
+
+    def alignment_keys(self, fps_a: RowFingerprints, fps_b: RowFingerprints):
+        """
+        Returns the integer keys to align (normally the 64-bit digests).
+        Verification: a digest seen with two different check halves is a collision,
+        rows with such a digest are keyed by their full 128-bit fingerprint instead.
+        """
+        checks = {}
+        collided = set()
+        for fps in (fps_a, fps_b):
+            for digest, check in zip(fps.digests, fps.checks):
+                seen = checks.setdefault(digest, check)
+                if seen != check:
+                    collided.add(digest)
+
+        def keys(fps):
+            if not collided:
+                return list(fps.digests)
+            return [fps[i] if d in collided else d for i, d in enumerate(fps.digests)]
+
+        return keys(fps_a), keys(fps_b)
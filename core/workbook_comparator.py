@@ -0,0 +1,128 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from .alignment import DEFAULT_ENGINE
+from .cache import SnapshotCache
+from .comparator import ExcelComparator, load_sheet
+from .fingerprint import EMPTY_ROW
+from .xlsx_package import XlsxPackage
+from .data_types import DiffResult, DiffItem, DiffType
+
+# Renamed sheets: share of distinct rows (Jaccard) two unmatched sheets must have in common to be paired
+RENAME_SIMILARITY = 0.5
+
+
+def _sheet_rows(filepath: str, sheet_name: str, streaming: bool, backend: str, use_mmap: bool,
+                cache: Optional[SnapshotCache]) -> frozenset:
+    # Distinct non-blank row digests: the content fingerprint used to pair renamed sheets.
+    # With the cache on, the compare of a renamed pair then reuses these loads.
+    snap = load_sheet(filepath, sheet_name, streaming=streaming, backend=backend, use_mmap=use_mmap, cache=cache)
+    return frozenset(snap.fps.digests) - {EMPTY_ROW >> 64}
+
+
+def _compare_pair(file_a: str, sheet_a: str, file_b: str, sheet_b: str, streaming: bool, backend: str,
+                  use_mmap: bool, cache: Optional[SnapshotCache], engine: str) -> DiffResult:
+    return ExcelComparator(file_a, file_b, sheet_a, sheet_b, streaming=streaming, backend=backend,
+                           use_mmap=use_mmap, engine=engine, use_cache=cache is not None, cache=cache).compare()
+
+
+class WorkbookComparator:
+    """
+    Compares every sheet of two workbooks. Sheets are paired by name, then the remaining ones
+    by content (renamed sheets); each pair is diffed by ExcelComparator in a process pool.
+    The per-sheet results are merged into one DiffResult, items tagged with DiffItem.sheet.
+    """
+    def __init__(self, file_a: str, file_b: str, streaming: bool = False, backend: str = "openpyxl",
+                 use_mmap: bool = False, engine: str = DEFAULT_ENGINE, max_workers: Optional[int] = None,
+                 use_cache: bool = True, cache: SnapshotCache = None):
+        self.file_a = file_a
+        self.file_b = file_b
+        self.streaming = streaming
+        self.backend = backend
+        self.use_mmap = use_mmap
+        self.engine = engine
+        self.cache = (cache or SnapshotCache()) if use_cache else None
+        # None: one worker per CPU. 1 runs everything in this process.
+        self.max_workers = max_workers
+
+    def _run(self, fn, jobs: List[tuple]) -> list:
+        # Results in job order
+        workers = min(self.max_workers or os.cpu_count() or 1, len(jobs))
+        if workers <= 1:
+            return [fn(*args) for args in jobs]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fn, *zip(*jobs)))
+
+    def match_sheets(self) -> Tuple[List[Tuple[str, str]], List[str], List[str]]:
+        """
+        (pairs [(sheet A, sheet B)], sheets only in A, sheets only in B).
+        Pairs are in A's sheet order; renamed sheets are paired on their rows.
+        """
+        with XlsxPackage(self.file_a) as package:
+            names_a = package.sheet_names
+        with XlsxPackage(self.file_b) as package:
+            names_b = package.sheet_names
+
+        pairs = [(name, name) for name in names_a if name in names_b]
+        only_a = [name for name in names_a if name not in names_b]
+        only_b = [name for name in names_b if name not in names_a]
+        if not only_a or not only_b:
+            return pairs, only_a, only_b
+
+        options = (self.streaming, self.backend, self.use_mmap, self.cache)
+        rows = self._run(_sheet_rows, [(self.file_a, name) + options for name in only_a] +
+                                      [(self.file_b, name) + options for name in only_b])
+        rows_a, rows_b = rows[:len(only_a)], rows[len(only_a):]
+
+        # Greedy: most similar pair first
+        candidates = []
+        for i, a in enumerate(rows_a):
+            for j, b in enumerate(rows_b):
+                union = len(a | b)
+                if union:
+                    score = len(a & b) / union
+                    if score >= RENAME_SIMILARITY:
+                        candidates.append((-score, i, j))
+        candidates.sort()
+        renamed = {}
+        used_b = set()
+        for _, i, j in candidates:
+            if i not in renamed and j not in used_b:
+                renamed[i] = j
+                used_b.add(j)
+
+        for i, j in renamed.items():
+            pairs.append((only_a[i], only_b[j]))
+        order = {name: k for k, name in enumerate(names_a)}
+        pairs.sort(key=lambda pair: order[pair[0]])
+        return (pairs,
+                [name for i, name in enumerate(only_a) if i not in renamed],
+                [name for j, name in enumerate(only_b) if j not in used_b])
+
+    def compare(self) -> DiffResult:
+        pairs, only_a, only_b = self.match_sheets()
+
+        # Sheet level changes first
+        items = []
+        for sheet_a, sheet_b in pairs:
+            if sheet_a != sheet_b:
+                items.append(DiffItem(
+                    location=f"{sheet_a} -> {sheet_b}",
+                    item_type="Sheet",
+                    diff_type=DiffType.CHANGED,
+                    details="Sheet renamed",
+                    sheet=sheet_a
+                ))
+        for name in only_a:
+            items.append(DiffItem(location=name, item_type="Sheet", diff_type=DiffType.DELETED, sheet=name))
+        for name in only_b:
+            items.append(DiffItem(location=name, item_type="Sheet", diff_type=DiffType.INSERTED, sheet=name))
+
+        options = (self.streaming, self.backend, self.use_mmap, self.cache, self.engine)
+        results = self._run(_compare_pair, [(self.file_a, sheet_a, self.file_b, sheet_b) + options
+                                            for sheet_a, sheet_b in pairs])
+        for (sheet_a, _), result in zip(pairs, results):
+            for item in result.items:
+                item.sheet = sheet_a # Named as in A
+                items.append(item)
+        return DiffResult(items=items)
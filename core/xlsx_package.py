@@ -0,0 +1,404 @@
+import io
+import mmap
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from openpyxl.formula.translate import Translator
+from openpyxl.utils import get_column_letter
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import from_excel, from_ISO8601, WINDOWS_EPOCH, MAC_EPOCH
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_DOC_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+TAG_SHEET_DATA = f'{{{NS_MAIN}}}sheetData'
+TAG_ROW = f'{{{NS_MAIN}}}row'
+TAG_CELL = f'{{{NS_MAIN}}}c'
+TAG_VALUE = f'{{{NS_MAIN}}}v'
+TAG_FORMULA = f'{{{NS_MAIN}}}f'
+TAG_INLINE = f'{{{NS_MAIN}}}is'
+TAG_TEXT = f'{{{NS_MAIN}}}t'
+TAG_RUN = f'{{{NS_MAIN}}}r'
+
+
+def _cast_number(value: str):
+    # Same rule as openpyxl so both backends give identical Python types
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _split_ref(ref: str):
+    """'AB12' -> (12, 28)"""
+    col = 0
+    for i, ch in enumerate(ref):
+        if ch.isdigit():
+            return int(ref[i:]), col
+        col = col * 26 + (ord(ch.upper()) - 64)
+    raise ValueError(f"Invalid cell reference '{ref}'")
+
+
+def _string_item_text(node) -> str:
+    # <si>/<is> hold either a plain <t> or rich text runs <r><t>..</t></r>.
+    # Phonetic runs (<rPh>) are not part of the value.
+    parts = []
+    for child in node:
+        if child.tag == TAG_TEXT:
+            parts.append(child.text or "")
+        elif child.tag == TAG_RUN:
+            t = child.find(TAG_TEXT)
+            if t is not None:
+                parts.append(t.text or "")
+    return "".join(parts)
+
+
+class _MappedFile(io.RawIOBase):
+    """Seekable read-only file object over an mmap (zipfile and openpyxl need seekable())."""
+    def __init__(self, buffer: mmap.mmap):
+        self._buffer = buffer
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._buffer)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def read(self, size=-1):
+        end = len(self._buffer) if size is None or size < 0 else self._pos + size
+        data = self._buffer[self._pos:end]
+        self._pos += len(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class XlsxPackage:
+    """
+    Direct access to the parts of an .xlsx archive, without openpyxl's object model.
+    Sheet XML is parsed incrementally, so memory does not grow with the sheet size.
+
+    The file is opened once (optionally memory-mapped) and its central directory is read
+    once. fileobj can be handed to openpyxl so both readers share the same handle.
+    """
+    def __init__(self, filepath: str, use_mmap: bool = False):
+        self.filepath = filepath
+        self._file = open(filepath, 'rb')
+        self._mmap = None
+        if use_mmap:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.fileobj = _MappedFile(self._mmap) if self._mmap is not None else self._file
+        self.zip = zipfile.ZipFile(self.fileobj, 'r')
+        self._names = set(self.zip.namelist())
+        self._parts = {} # part -> inflated bytes
+        self._sheets = None # name -> part path, in workbook order
+        self._rels = {} # part -> relationships, see read_rels
+        self._content_types = None
+        self._active_index = 0
+        self._epoch = WINDOWS_EPOCH
+        self._shared_strings = None
+        self._date_styles = None
+        self._timedelta_styles = None
+
+    def close(self):
+        self.zip.close()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+        self._parts.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, part: str):
+        return part in self._names
+
+    def read(self, part: str) -> bytes:
+        """Inflated content of a (small) part. Each part is inflated at most once."""
+        data = self._parts.get(part)
+        if data is None:
+            data = self._parts[part] = self.zip.read(part)
+        return data
+
+    def part_crc(self, part: str):
+        """
+        (CRC-32, size) of a part from the central directory, read when the archive was
+        opened: nothing is inflated. None if the part does not exist.
+        """
+        if part not in self._names:
+            return None
+        info = self.zip.getinfo(part)
+        return info.CRC, info.file_size
+
+    def content_type(self, part: str):
+        """Content type of a part: its Override in [Content_Types].xml, else its extension's Default."""
+        if self._content_types is None:
+            self._content_types = {}
+            root = ET.fromstring(self.read('[Content_Types].xml'))
+            for node in root:
+                tag = node.tag.rsplit('}', 1)[-1]
+                if tag == 'Default':
+                    self._content_types['.' + node.get('Extension', '').lower()] = node.get('ContentType')
+                elif tag == 'Override':
+                    self._content_types[node.get('PartName', '').lstrip('/')] = node.get('ContentType')
+        types = self._content_types
+        return types.get(part) or types.get(posixpath.splitext(part)[1].lower())
+
+    # --- Workbook structure ---
+
+    def list_rels(self, part: str) -> list:
+        """
+        (id, type, target, external) for every relationship of the part, in file order.
+        Internal targets are resolved to part paths (as read_rels), external ones are kept as is.
+        """
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, '_rels', name + '.rels')
+        if rels_path not in self._names:
+            return []
+        rels = []
+        for rel in ET.fromstring(self.read(rels_path)).findall(f'{{{NS_PKG_REL}}}Relationship'):
+            target = rel.get('Target')
+            external = rel.get('TargetMode') == 'External'
+            if not external:
+                target = target[1:] if target.startswith('/') else posixpath.normpath(posixpath.join(folder, target))
+            rels.append((rel.get('Id'), rel.get('Type'), target, external))
+        return rels
+
+    def read_rels(self, part: str) -> dict:
+        """
+        Relationship id -> (type, target part path) for the given part.
+        Resolved once per archive, later lookups come from the cache.
+        """
+        if part in self._rels:
+            return self._rels[part]
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, '_rels', name + '.rels')
+        rels = {}
+        if rels_path in self._names:
+            root = ET.fromstring(self.read(rels_path))
+            for rel in root.findall(f'{{{NS_PKG_REL}}}Relationship'):
+                if rel.get('TargetMode') == 'External':
+                    continue
+                target = rel.get('Target')
+                if target.startswith('/'):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join(folder, target))
+                rels[rel.get('Id')] = (rel.get('Type'), target)
+        self._rels[part] = rels
+        return rels
+
+    def _load_workbook(self):
+        root = ET.fromstring(self.read('xl/workbook.xml'))
+        rels = self.read_rels('xl/workbook.xml')
+
+        pr = root.find(f'{{{NS_MAIN}}}workbookPr')
+        if pr is not None and pr.get('date1904') in ('1', 'true'):
+            self._epoch = MAC_EPOCH
+
+        view = root.find(f'{{{NS_MAIN}}}bookViews/{{{NS_MAIN}}}workbookView')
+        if view is not None:
+            self._active_index = int(view.get('activeTab', 0))
+
+        self._sheets = {}
+        for sheet in root.iter(f'{{{NS_MAIN}}}sheet'):
+            rid = sheet.get(f'{{{NS_DOC_REL}}}id')
+            self._sheets[sheet.get('name')] = rels.get(rid, (None, None))[1]
+
+    @property
+    def sheet_names(self):
+        if self._sheets is None:
+            self._load_workbook()
+        return list(self._sheets)
+
+    @property
+    def active_sheet(self) -> str:
+        """Name of the active sheet (as openpyxl's wb.active)."""
+        names = self.sheet_names
+        if not names:
+            raise ValueError(f"No sheets found in {self.filepath}")
+        return names[min(self._active_index, len(names) - 1)]
+
+    def sheet_part(self, sheet_name: str = None) -> str:
+        """Archive path of the sheet XML. No name means the active sheet (as openpyxl's wb.active)."""
+        if not sheet_name:
+            sheet_name = self.active_sheet
+        if sheet_name not in self.sheet_names:
+            raise ValueError(f"Sheet '{sheet_name}' not found in {self.filepath}")
+        return self._sheets[sheet_name]
+
+    def drawing_part(self, sheet_name: str = None):
+        """
+        Archive path of the DrawingML part attached to the sheet
+        (workbook.xml -> workbook rels -> sheet rels), or None if the sheet has no drawing.
+        """
+        for rel_type, target in self.read_rels(self.sheet_part(sheet_name)).values():
+            if rel_type and rel_type.endswith('/drawing'):
+                return target
+        return None
+
+    # --- Shared tables ---
+
+    @property
+    def shared_strings(self) -> list:
+        if self._shared_strings is None:
+            self._shared_strings = []
+            if 'xl/sharedStrings.xml' in self._names:
+                with self.zip.open('xl/sharedStrings.xml') as f:
+                    for _, elem in ET.iterparse(f):
+                        if elem.tag == f'{{{NS_MAIN}}}si':
+                            self._shared_strings.append(_string_item_text(elem))
+                            elem.clear()
+        return self._shared_strings
+
+    def _load_styles(self):
+        # Only the number formats matter here: they decide which numbers are dates
+        self._date_styles = set()
+        self._timedelta_styles = set()
+        if 'xl/styles.xml' not in self._names:
+            return
+        root = ET.fromstring(self.read('xl/styles.xml'))
+        custom = {}
+        for fmt in root.iter(f'{{{NS_MAIN}}}numFmt'):
+            custom[int(fmt.get('numFmtId'))] = fmt.get('formatCode')
+        xfs = root.find(f'{{{NS_MAIN}}}cellXfs')
+        if xfs is None:
+            return
+        for idx, xf in enumerate(xfs.findall(f'{{{NS_MAIN}}}xf')):
+            fmt_id = int(xf.get('numFmtId', 0))
+            fmt = custom.get(fmt_id, BUILTIN_FORMATS.get(fmt_id))
+            if fmt is None:
+                continue
+            if is_date_format(fmt):
+                self._date_styles.add(idx)
+            if is_timedelta_format(fmt):
+                self._timedelta_styles.add(idx)
+
+    def value_formats(self):
+        """
+        Everything besides the sheet XML and shared strings that decides the cell values:
+        (date epoch, date style indexes, timedelta style indexes).
+        """
+        if self._sheets is None:
+            self._load_workbook()
+        if self._date_styles is None:
+            self._load_styles()
+        return self._epoch, frozenset(self._date_styles), frozenset(self._timedelta_styles)
+
+    # --- Cells ---
+
+    def iter_cells(self, sheet_name: str = None):
+        """
+        Yields (row, col, value, formula) for every non-empty cell, in sheet order.
+        value is the cached value converted like openpyxl does (numbers, bools, dates),
+        formula is the formula text with a leading '=' or None.
+        """
+        if self._date_styles is None:
+            self._load_styles()
+        date_styles = self._date_styles
+        shared = self.shared_strings
+        shared_formulas = {}
+        col_cache = {}
+        row_idx = 0
+
+        sheet_data = None
+
+        # The sheet XML is the one big part: it is streamed, never cached
+        with self.zip.open(self.sheet_part(sheet_name)) as f:
+            # Only whole <row> elements are handled (end events), their cells are
+            # walked directly and the row is then removed from <sheetData>, so the
+            # tree never holds more than one row.
+            for event, row in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if row.tag == TAG_SHEET_DATA:
+                        sheet_data = row
+                    continue
+                if row.tag != TAG_ROW:
+                    continue
+                r = row.get('r')
+                row_idx = int(r) if r else row_idx + 1
+                col_idx = 0
+
+                for elem in row:
+                    ref = elem.get('r')
+                    if ref:
+                        letters = ref.rstrip('0123456789')
+                        col_idx = col_cache.get(letters)
+                        if col_idx is None:
+                            col_idx = col_cache[letters] = _split_ref(letters + '1')[1]
+                    else:
+                        col_idx += 1
+
+                    data_type = elem.get('t', 'n')
+                    raw = None
+                    formula = None
+                    inline = None
+                    for child in elem:
+                        if child.tag == TAG_VALUE:
+                            raw = child.text
+                        elif child.tag == TAG_FORMULA:
+                            formula = child
+                        elif child.tag == TAG_INLINE:
+                            inline = child
+
+                    if formula is not None:
+                        # Shared formulas are translated between cell references
+                        formula = self._formula_text(formula, ref or f"{get_column_letter(col_idx)}{row_idx}",
+                                                     shared_formulas)
+
+                    value = None
+                    if raw:
+                        if data_type == 'n':
+                            value = _cast_number(raw)
+                            style = elem.get('s')
+                            if style and int(style) in date_styles:
+                                try:
+                                    value = from_excel(value, self._epoch, timedelta=int(style) in self._timedelta_styles)
+                                except (OverflowError, ValueError):
+                                    value = "#VALUE!"
+                        elif data_type == 's':
+                            value = shared[int(raw)]
+                        elif data_type == 'b':
+                            value = bool(int(raw))
+                        elif data_type == 'd':
+                            value = from_ISO8601(raw)
+                        else: # 'str' (formula string result), 'e' (error)
+                            value = raw
+                    elif data_type == 'inlineStr' and inline is not None:
+                        value = _string_item_text(inline)
+
+                    if value is None and formula is None:
+                        continue
+                    yield row_idx, col_idx, value, formula
+                row.clear()
+                if sheet_data is not None:
+                    sheet_data.remove(row)
+
+    def _formula_text(self, node, ref, shared_formulas):
+        text = "=" + (node.text or "")
+        if node.get('t') == 'shared':
+            # Only the master cell carries the text, dependents translate it to their position
+            idx = node.get('si')
+            if idx in shared_formulas:
+                return shared_formulas[idx].translate_formula(ref)
+            if text != "=":
+                shared_formulas[idx] = Translator(text, ref)
+        return text
@@ -3,14 +3,23 @@ import win32com.client as win32
 import os
 import threading
 import pythoncom
-import difflib
 import openpyxl
 from openpyxl.utils import get_column_letter 
 from dataclasses import dataclass
 from typing import List, Dict, Tuple, Any
 from tkinter import filedialog, messagebox
 from datetime import datetime
+from collections import Counter
 import time 
+from core.fingerprint import row_fingerprint, column_fingerprint
+from core.shift_detector import ShiftDetector, value_overlap
+from core.alignment import DEFAULT_ENGINE
+from core.grid_compare import compare_aligned_rows, a1_address
+from core.geometry import read_sheet_geometry, read_shape_boxes, diff_sizes
+from core.xlsx_package import XlsxPackage
+from openpyxl.utils.cell import coordinate_to_tuple
+from reporting.ranges import coalesce, range_address, address_batches, hyperlink_formula
+from reporting.native_report import NativeReportGenerator, HIGHLIGHT_RGB
 
 # --- CONFIGURATION & CONSTANTS ---
 AUTHOR_ID = "KNT15083"
@@ -41,6 +50,19 @@ xlCalculationManual = -4135
 xlCalculationAutomatic = -4105
 xlMaximized = -4137
 
+# Report layout
+CELL_REPORT_HEADERS = ["Index", "Category", "Action", "Address / ID", "Old Value / Size", "New Value / Size", "Details"]
+SHAPE_REPORT_HEADERS = ["Index", "Shape ID", "Shape Name", "Verdict", 
+                        "Diff X", "Diff Y", "Diff W", "Diff H", 
+                        "Old Anchor", "New Anchor (Exp)", "New Anchor (Act)",
+                        "Old Rel X", "Old Rel Y", "New Rel X", "New Rel Y"]
+NO_CELL_DIFFS_TEXT = "No Cell/Grid Differences Found."
+NO_SHAPE_DIFFS_TEXT = "No Shapes Found (or all Matched)."
+# [NEW] True: báo cáo ghi trực tiếp file .xlsx (reporting.native_report), không Copy sheet qua Excel
+NATIVE_REPORT = False
+# [NEW] Thuật toán dóng hàng/cột (core.alignment.ENGINES), dùng chung với ExcelComparator
+ALIGN_ENGINE = DEFAULT_ENGINE
+
 # --- LOCALIZATION DATA ---
 LANGUAGES = {
     "English": {
@@ -313,12 +335,84 @@ class ExcelEngine:
             raise Exception(f"System Error: {str(e)}")
 
     def get_sheet_by_name(self, wb, name):
+        # [UPDATED] Không tự lấy Sheet 1 khi sai tên: so nhầm sheet còn tệ hơn báo lỗi
+        if not name:
+            return wb.Sheets(1)
         try:
             return wb.Sheets(name)
-        except:
-            return wb.Sheets(1) 
+        except Exception:
+            raise ValueError(f"Sheet '{name}' not found in {wb.Name}")
+
+    def get_scan_bounds(self, ws, file_label="Unknown File", scan_range_addr=None, log_func=None):
+        """(use_custom_bounds, r_min, c_min, r_max, c_max): vùng quét shape (scan_range_addr hoặc UsedRange)."""
+        try:
+            if scan_range_addr and scan_range_addr.strip() != "":
+                scan_area = ws.Range(scan_range_addr)
+            else:
+                scan_area = ws.UsedRange
+            r_min = scan_area.Row
+            c_min = scan_area.Column
+            r_max = r_min + scan_area.Rows.Count - 1
+            c_max = c_min + scan_area.Columns.Count - 1
+            return True, r_min, c_min, r_max, c_max
+        except Exception as e:
+            if log_func: log_func(f"[{file_label}] Warning: Bound calc failed. Scan all.")
+            return False, 0, 0, 0, 0
+
+    def get_shape_boxes(self, ws):
+        """
+        [NEW] Vị trí/kích thước tất cả shape của sheet, đọc một lần từ DrawingML của file
+        (anchor + chiều cao hàng/độ rộng cột -> point, như Top/Left/Width/Height ở Zoom 100%).
+        Trả về None nếu không đọc được (.xls, file lỗi...) -> dùng COM.
+        """
+        try:
+            with XlsxPackage(ws.Parent.FullName) as package:
+                return read_shape_boxes(package, ws.Name)
+        except Exception:
+            return None
 
     def extract_shapes(self, ws, file_label="Unknown File", scan_range_addr=None, log_func=None) -> Dict[int, ShapeData]:
+        # [UPDATED] Bulk: đọc shape từ DrawingML (không tốn COM call cho từng thuộc tính).
+        # COM chỉ dùng cho shape không có trong DrawingML (comment, form control...) hoặc khi đọc XML lỗi.
+        use_custom_bounds, r_min, c_min, r_max, c_max = self.get_scan_bounds(ws, file_label, scan_range_addr, log_func)
+        shape_dict = {}
+        known_names = set()
+        boxes = self.get_shape_boxes(ws)
+        try:
+            total_shapes = ws.Shapes.Count
+            if boxes and total_shapes > 0:
+                # Key của dict là Shape.ID: kiểm tra id trong XML trùng với COM, nếu không thì quét COM
+                first = ws.Shapes(1)
+                by_name = {box.name: box.id for box in boxes}
+                if by_name.get(first.Name, first.ID) != first.ID:
+                    boxes = None
+        except Exception:
+            boxes = None
+
+        if boxes is not None:
+            for box in boxes:
+                known_names.add(box.name)
+                if use_custom_bounds:
+                    if not (r_min <= box.anchor_row <= r_max and c_min <= box.anchor_col <= c_max):
+                        continue
+                shape_dict[box.id] = ShapeData(
+                    id=box.id,
+                    name=box.name,
+                    height=box.height,
+                    width=box.width,
+                    abs_top=box.top,
+                    abs_left=box.left,
+                    anchor_address=f"${get_column_letter(box.anchor_col)}${box.anchor_row}",
+                    anchor_row=box.anchor_row,
+                    anchor_col=box.anchor_col,
+                    rel_top=box.rel_top,
+                    rel_left=box.rel_left
+                )
+            if len(boxes) >= total_shapes:
+                if log_func: log_func(f"[{file_label}] Bulk Scan Complete (DrawingML). Found {len(shape_dict)} valid shapes.")
+                return shape_dict
+            if log_func: log_func(f"[{file_label}] {total_shapes - len(boxes)} shape(s) not in DrawingML, scanning them via COM...")
+
         # [CRITICAL LOGIC UPDATE] 
         # Sử dụng wb.Windows(1) thay vì ActiveWindow để tránh lỗi focus nhầm file
         
@@ -389,39 +483,19 @@ class ExcelEngine:
         # 5. SCAN VALUES
         if log_func: log_func(f"[{file_label}] Starting Shape Scan...")
 
-        shape_dict = {}
         shapes = ws.Shapes
         total_shapes = shapes.Count 
         
-        # --- [SPEED OPTIMIZATION 2] ---
-        r_min, c_min, r_max, c_max = 0, 0, 0, 0
-        use_custom_bounds = False
-        
-        try:
-            if scan_range_addr and scan_range_addr.strip() != "":
-                scan_area = ws.Range(scan_range_addr)
-                r_min = scan_area.Row
-                c_min = scan_area.Column
-                r_max = r_min + scan_area.Rows.Count - 1
-                c_max = c_min + scan_area.Columns.Count - 1
-                use_custom_bounds = True
-            else:
-                scan_area = ws.UsedRange
-                r_min = scan_area.Row
-                c_min = scan_area.Column
-                r_max = r_min + scan_area.Rows.Count - 1
-                c_max = c_min + scan_area.Columns.Count - 1
-                use_custom_bounds = True 
-        except Exception as e:
-            if log_func: log_func(f"[{file_label}] Warning: Bound calc failed. Scan all.")
-            use_custom_bounds = False
-        
         for i, shp in enumerate(shapes):
             current_idx = i + 1
             if log_func and current_idx % 10 == 0: 
                 log_func(f"[{file_label}] Scanning Shape {current_idx}/{total_shapes}...")
 
             try:
+                # Đã đọc từ DrawingML
+                if known_names and shp.Name in known_names:
+                    continue
+
                 # Check Bounds bằng số học
                 tl_cell = shp.TopLeftCell
                 if use_custom_bounds:
@@ -448,6 +522,25 @@ class ExcelEngine:
         if log_func: log_func(f"[{file_label}] Scan Complete. Found {len(shape_dict)} valid shapes.")
         return shape_dict
 
+    def get_used_range_origin(self, ws):
+        """(Row, Column) của ô đầu UsedRange: get_used_range_values trả dữ liệu tính từ ô này, không phải A1."""
+        try:
+            used = ws.UsedRange
+            return used.Row, used.Column
+        except:
+            return 1, 1
+
+    def get_sheet_geometry(self, ws):
+        """
+        [NEW] Chiều cao hàng / độ rộng cột của sheet, đọc một lần từ XML của file (.xlsx/.xlsm).
+        File được mở ReadOnly nên nội dung trên đĩa trùng với Excel. Trả về None nếu không đọc được.
+        """
+        try:
+            with XlsxPackage(ws.Parent.FullName) as package:
+                return read_sheet_geometry(package, ws.Name)
+        except Exception:
+            return None
+
     def get_used_range_values(self, ws):
         data = ws.UsedRange.Value
         if data is None: return []
@@ -468,9 +561,141 @@ class ExcelEngine:
         except:
             pass
 
+    def highlight_batches(self, anchors):
+        """Anchor cells ("$B$3") -> multi-area address strings for Range(), adjacent cells merged."""
+        cells = []
+        others = []
+        for anchor in anchors:
+            try:
+                cells.append(coordinate_to_tuple(anchor.replace('$', '')))
+            except ValueError:
+                others.append(anchor.replace('$', '')) # Already a range
+        addresses = [range_address(rect) for rect in coalesce(cells)]
+        return address_batches(addresses + others)
+
+    def cell_link(self, d):
+        """Address / ID cell of a CellDiff: a HYPERLINK formula to the source sheet, or the plain text."""
+        addr = d.address_id
+        target_sheet = "Source_Old" if "DELETED" in d.action else "Source_New"
+        if ":" not in addr and "Row" not in addr and " " not in addr:
+            return hyperlink_formula(target_sheet, addr)
+        elif "Row" in addr:
+            row_num = addr.replace("Row", "").strip()
+            return hyperlink_formula(target_sheet, f"A{row_num}", addr)
+        return addr
+
+    def anchor_link(self, target_sheet, anchor):
+        if anchor and anchor != "N/A":
+            return hyperlink_formula(target_sheet, anchor.replace('$', ''), anchor)
+        return anchor
+
+    def style_link_column(self, rng):
+        # HYPERLINK formulas do not get the Hyperlink style: blue + underline, 1 call per column
+        try:
+            rng.Font.Color = 16711680 # Blue (BGR)
+            rng.Font.Underline = 2 # xlUnderlineStyleSingle
+        except: pass
+
+    def highlight_anchors(self, shape_diffs):
+        """Anchor cells painted red: (on Source_New, on Source_Old)."""
+        red_addresses_new = []
+        red_addresses_old = []
+        
+        for s in shape_diffs:
+            if s.verdict != "MATCH" and "DELETED" not in s.verdict:
+                if s.act_anchor and s.act_anchor != "N/A":
+                    red_addresses_new.append(s.act_anchor)
+                    
+            if s.verdict != "MATCH" and "NEW" not in s.verdict:
+                if s.old_anchor and s.old_anchor != "N/A":
+                    red_addresses_old.append(s.old_anchor)
+        return red_addresses_new, red_addresses_old
+
+    def report_rows(self, cell_diffs, shape_diffs, only_diffs=False):
+        """Rows of Cell_Grid_Report and Shape_Report (link cells are HYPERLINK formulas)."""
+        # [UPDATED] Cột địa chỉ là công thức HYPERLINK, ghi cùng dữ liệu trong 1 lệnh Range.Value
+        data1 = [[d.index, d.category, d.action, self.cell_link(d), str(d.old_val), str(d.new_val), d.details] for d in cell_diffs]
+        
+        # FILTER DATA BASED ON REPORT MODE
+        final_shape_diffs = shape_diffs
+        if only_diffs:
+            final_shape_diffs = [s for s in shape_diffs if s.verdict != "MATCH"]
+
+        data2 = []
+        for s in final_shape_diffs:
+            data2.append([
+                s.index, s.shape_id, s.name, s.verdict, 
+                round(s.diff_x, 2), round(s.diff_y, 2), round(s.diff_w, 2), round(s.diff_h, 2),
+                self.anchor_link("Source_Old", s.old_anchor), s.exp_anchor, self.anchor_link("Source_New", s.act_anchor),
+                round(s.old_rel_x, 2), round(s.old_rel_y, 2), 
+                round(s.new_rel_x, 2), round(s.new_rel_y, 2)
+            ])
+        return data1, data2
+
+    def report_path(self, output_folder, ws_src_old):
+        # =========================================================================
+        # [CẬP NHẬT] ĐẶT TÊN FILE THEO ĐỊNH DẠNG MỚI
+        # Format: ExcelDiff_[10 kí tự file gốc]_[Tên sheet gốc]_[Thời gian].xlsx
+        # =========================================================================
+        try:
+            # 1. Lấy tên file gốc (Source) và bỏ phần mở rộng (.xlsx)
+            src_filename = ws_src_old.Parent.Name
+            src_name_clean = os.path.splitext(src_filename)[0]
+            
+            # 2. Cắt lấy 10 ký tự đầu tiên
+            short_src_name = src_name_clean[:10].strip()
+            
+            # 3. Lấy tên Sheet gốc
+            sheet_name = ws_src_old.Name
+            # Xử lý ký tự đặc biệt trong tên sheet (để an toàn khi lưu file)
+            safe_sheet_name = "".join([c if c.isalnum() or c in " -_" else "_" for c in sheet_name])
+
+            # 4. Lấy thời gian
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            
+            # 5. Tạo tên file cuối cùng
+            out_name = f"ExcelDiff_{short_src_name}_{safe_sheet_name}_{timestamp}.xlsx"
+            
+        except Exception:
+            # Fallback nếu lỗi lấy tên
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            out_name = f"ExcelDiff_{timestamp}.xlsx"
+
+        out_path = os.path.join(output_folder, out_name)
+        
+        if os.path.exists(out_path):
+            try: os.remove(out_path)
+            except: pass
+        return out_path
+
+    def create_report_native(self, output_folder, cell_diffs, shape_diffs, ws_src_old, ws_src_new,
+                             only_diffs=False, highlight_changes=False):
+        """[NEW] Same report written by reporting.native_report: no sheet Copy / ListObjects in Excel."""
+        data1, data2 = self.report_rows(cell_diffs, shape_diffs, only_diffs)
+        fills_new, fills_old = {}, {}
+        if highlight_changes:
+            anchors_new, anchors_old = self.highlight_anchors(shape_diffs)
+            for fills, anchors in ((fills_new, anchors_new), (fills_old, anchors_old)):
+                for anchor in anchors:
+                    try:
+                        fills[coordinate_to_tuple(anchor.replace('$', ''))] = HIGHLIGHT_RGB
+                    except ValueError: pass
+        
+        out_path = self.report_path(output_folder, ws_src_old)
+        # Excel đang mở file nguồn (chỉ đọc): đọc thẳng từ đĩa
+        NativeReportGenerator(out_path, ws_src_old.Parent.FullName, ws_src_new.Parent.FullName,
+                              ws_src_old.Name, ws_src_new.Name).generate(
+            [("Cell_Grid_Report", CELL_REPORT_HEADERS, data1, NO_CELL_DIFFS_TEXT),
+             ("Shape_Report", SHAPE_REPORT_HEADERS, data2, NO_SHAPE_DIFFS_TEXT)],
+            fills_old=fills_old, fills_new=fills_new)
+        return out_path
+
     def create_report_workbook(self, output_folder, cell_diffs: List[CellDiff], shape_diffs: List[ShapeDiff], 
-                               ws_src_old, ws_src_new, only_diffs=False, highlight_changes=False):
+                               ws_src_old, ws_src_new, only_diffs=False, highlight_changes=False, native=False):
         """Generates the formatted Excel report."""
+        if native:
+            return self.create_report_native(output_folder, cell_diffs, shape_diffs, ws_src_old, ws_src_new,
+                                             only_diffs=only_diffs, highlight_changes=highlight_changes)
         
         self._optimize_speed(True)
         
@@ -498,44 +723,21 @@ class ExcelEngine:
             
             # --- TÔ MÀU CẢ 2 SHEET ---
             if highlight_changes:
-                red_addresses_new = []
-                red_addresses_old = []
-                
-                for s in shape_diffs:
-                    if s.verdict != "MATCH" and "DELETED" not in s.verdict:
-                        if s.act_anchor and s.act_anchor != "N/A":
-                            red_addresses_new.append(s.act_anchor)
-                            
-                    if s.verdict != "MATCH" and "NEW" not in s.verdict:
-                        if s.old_anchor and s.old_anchor != "N/A":
-                            red_addresses_old.append(s.old_anchor)
+                red_addresses_new, red_addresses_old = self.highlight_anchors(shape_diffs)
                 
-                # Tô màu cho New Sheet
-                if red_addresses_new:
-                    chunk_size = 20
-                    for i in range(0, len(red_addresses_new), chunk_size):
-                        chunk = red_addresses_new[i:i + chunk_size]
-                        addr_str = ",".join(chunk)
-                        try:
-                            ws_copy_new.Range(addr_str).Interior.Color = 255
-                        except: pass
-                        
-                # Tô màu cho Old Sheet
-                if red_addresses_old:
-                    chunk_size = 20
-                    for i in range(0, len(red_addresses_old), chunk_size):
-                        chunk = red_addresses_old[i:i + chunk_size]
-                        addr_str = ",".join(chunk)
+                # [UPDATED] Gộp các ô liền kề thành vùng chữ nhật, tô mỗi lô <= 255 ký tự bằng 1 lệnh Range
+                for ws_copy, anchors in ((ws_copy_new, red_addresses_new), (ws_copy_old, red_addresses_old)):
+                    for addr_str in self.highlight_batches(anchors):
                         try:
-                            ws_copy_old.Range(addr_str).Interior.Color = 255
+                            ws_copy.Range(addr_str).Interior.Color = 255
                         except: pass
 
             # --- Sheet 1: Cell_Grid_Report ---
             ws1 = wb_out.Sheets(1)
             ws1.Name = "Cell_Grid_Report"
             
-            headers1 = ["Index", "Category", "Action", "Address / ID", "Old Value / Size", "New Value / Size", "Details"]
-            data1 = [[d.index, d.category, d.action, d.address_id, str(d.old_val), str(d.new_val), d.details] for d in cell_diffs]
+            headers1 = CELL_REPORT_HEADERS
+            data1, data2 = self.report_rows(cell_diffs, shape_diffs, only_diffs)
                 
             if data1:
                 ws1.Range(ws1.Cells(1, 1), ws1.Cells(1, 7)).Value = headers1
@@ -548,56 +750,18 @@ class ExcelEngine:
                 try: ws1.Cells.Font.Name = "Meiryo UI"
                 except: pass
 
-                # Hyperlinks
-                for i, d in enumerate(cell_diffs):
-                    row_idx = i + 2
-                    cell_addr_obj = ws1.Cells(row_idx, 4) 
-                    action = d.action
-                    addr = d.address_id
-                    
-                    target_sheet = "Source_New"
-                    if "DELETED" in action:
-                        target_sheet = "Source_Old"
-                    
-                    if ":" not in addr and "Row" not in addr and " " not in addr: 
-                        sub_addr = f"'{target_sheet}'!{addr}"
-                        try:
-                            ws1.Hyperlinks.Add(Anchor=cell_addr_obj, Address="", SubAddress=sub_addr, TextToDisplay=addr)
-                        except: pass
-                    elif "Row" in addr:
-                        try:
-                            row_num = addr.replace("Row", "").strip()
-                            sub_addr = f"'{target_sheet}'!A{row_num}"
-                            ws1.Hyperlinks.Add(Anchor=cell_addr_obj, Address="", SubAddress=sub_addr, TextToDisplay=addr)
-                        except: pass
+                # Hyperlinks (kiểu chữ cho cả cột)
+                self.style_link_column(ws1.Range(f"D2:D{last_row}"))
                 
                 ws1.Columns.AutoFit()
             else:
-                ws1.Cells(1, 1).Value = "No Cell/Grid Differences Found."
+                ws1.Cells(1, 1).Value = NO_CELL_DIFFS_TEXT
 
             # --- Sheet 2: Shape_Report ---
             ws2 = wb_out.Sheets.Add(After=ws1)
             ws2.Name = "Shape_Report"
             
-            headers2 = ["Index", "Shape ID", "Shape Name", "Verdict", 
-                        "Diff X", "Diff Y", "Diff W", "Diff H", 
-                        "Old Anchor", "New Anchor (Exp)", "New Anchor (Act)",
-                        "Old Rel X", "Old Rel Y", "New Rel X", "New Rel Y"]
-            
-            # FILTER DATA BASED ON REPORT MODE
-            final_shape_diffs = shape_diffs
-            if only_diffs:
-                final_shape_diffs = [s for s in shape_diffs if s.verdict != "MATCH"]
-
-            data2 = []
-            for s in final_shape_diffs:
-                data2.append([
-                    s.index, s.shape_id, s.name, s.verdict, 
-                    round(s.diff_x, 2), round(s.diff_y, 2), round(s.diff_w, 2), round(s.diff_h, 2),
-                    s.old_anchor, s.exp_anchor, s.act_anchor,
-                    round(s.old_rel_x, 2), round(s.old_rel_y, 2), 
-                    round(s.new_rel_x, 2), round(s.new_rel_y, 2)
-                ])
+            headers2 = SHAPE_REPORT_HEADERS
                 
             if data2:
                 ws2.Range(ws2.Cells(1, 1), ws2.Cells(1, 15)).Value = headers2
@@ -610,61 +774,15 @@ class ExcelEngine:
                 try: ws2.Cells.Font.Name = "Meiryo UI"
                 except: pass
 
-                # Hyperlinks
-                for i, s in enumerate(final_shape_diffs):
-                    row_idx = i + 2
-                    
-                    if s.old_anchor and s.old_anchor != "N/A":
-                        cell_old = ws2.Cells(row_idx, 9)
-                        sub_addr_old = f"'Source_Old'!{s.old_anchor.replace('$','')}"
-                        try:
-                            ws2.Hyperlinks.Add(Anchor=cell_old, Address="", SubAddress=sub_addr_old, TextToDisplay=s.old_anchor)
-                        except: pass
-                        
-                    if s.act_anchor and s.act_anchor != "N/A":
-                        cell_new = ws2.Cells(row_idx, 11)
-                        sub_addr_new = f"'Source_New'!{s.act_anchor.replace('$','')}"
-                        try:
-                            ws2.Hyperlinks.Add(Anchor=cell_new, Address="", SubAddress=sub_addr_new, TextToDisplay=s.act_anchor)
-                        except: pass
+                # Hyperlinks (kiểu chữ cho cả cột)
+                self.style_link_column(ws2.Range(f"I2:I{last_row}"))
+                self.style_link_column(ws2.Range(f"K2:K{last_row}"))
 
                 ws2.Columns.AutoFit()
             else:
-                ws2.Cells(1, 1).Value = "No Shapes Found (or all Matched)."
+                ws2.Cells(1, 1).Value = NO_SHAPE_DIFFS_TEXT
 
-            # =========================================================================
-            # [CẬP NHẬT] ĐẶT TÊN FILE THEO ĐỊNH DẠNG MỚI
-            # Format: ExcelDiff_[10 kí tự file gốc]_[Tên sheet gốc]_[Thời gian].xlsx
-            # =========================================================================
-            try:
-                # 1. Lấy tên file gốc (Source) và bỏ phần mở rộng (.xlsx)
-                src_filename = ws_src_old.Parent.Name
-                src_name_clean = os.path.splitext(src_filename)[0]
-                
-                # 2. Cắt lấy 10 ký tự đầu tiên
-                short_src_name = src_name_clean[:10].strip()
-                
-                # 3. Lấy tên Sheet gốc
-                sheet_name = ws_src_old.Name
-                # Xử lý ký tự đặc biệt trong tên sheet (để an toàn khi lưu file)
-                safe_sheet_name = "".join([c if c.isalnum() or c in " -_" else "_" for c in sheet_name])
-
-                # 4. Lấy thời gian
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                
-                # 5. Tạo tên file cuối cùng
-                out_name = f"ExcelDiff_{short_src_name}_{safe_sheet_name}_{timestamp}.xlsx"
-                
-            except Exception:
-                # Fallback nếu lỗi lấy tên
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                out_name = f"ExcelDiff_{timestamp}.xlsx"
-
-            out_path = os.path.join(output_folder, out_name)
-            
-            if os.path.exists(out_path):
-                try: os.remove(out_path)
-                except: pass
+            out_path = self.report_path(output_folder, ws_src_old)
                 
             wb_out.SaveAs(out_path)
             return out_path
@@ -680,8 +798,9 @@ class ExcelEngine:
             pass
 
 class Comparator:
-    def __init__(self, tolerance):
+    def __init__(self, tolerance, align_engine: str = ALIGN_ENGINE):
         self.tolerance = tolerance
+        self.detector = ShiftDetector(engine=align_engine)
 
     def compare_grids_and_cells(self, ws_old, ws_new, engine: ExcelEngine, log_func=None) -> Tuple[List[CellDiff], Dict[int, int], Dict[int, int]]:
         report = []
@@ -689,144 +808,181 @@ class Comparator:
         if log_func: log_func("Reading Grid Data...")
         raw_old = engine.get_used_range_values(ws_old)
         raw_new = engine.get_used_range_values(ws_new)
+        # [UPDATED] raw_* tính từ ô đầu của UsedRange, không phải A1: độ lệch để đổi sang tọa độ sheet
+        row0_old, col0_old = engine.get_used_range_origin(ws_old)
+        row0_new, col0_new = engine.get_used_range_origin(ws_new)
+        dr_old, dc_old = row0_old - 1, col0_old - 1
+        dr_new, dc_new = row0_new - 1, col0_new - 1
         
         if log_func: log_func(f"Analyzing Grid Structure (Rows: {len(raw_old)} vs {len(raw_new)})...")
         
-        # [UPDATED] TỐI ƯU HIỆU SUẤT: Dùng HASH để so sánh cấu trúc dòng nhanh hơn thay vì string
-        sig_old = [hash(tuple(r)) for r in raw_old]
-        sig_new = [hash(tuple(r)) for r in raw_new]
+        idx_counter = 1
+        
+        # [NEW FEATURE] DÒ CỘT CHÈN/XÓA: chữ ký chuyển vị (mỗi cột băm như một hàng, bỏ ô trống)
+        # Trước đây col_map cố định 1->1, chèn 1 cột làm mọi ô bên phải bị báo MODIFIED
+        # [UPDATED] Chữ ký cột = tập giá trị (multiset), không phụ thuộc thứ tự hàng
+        col_sig_old = [column_fingerprint(col) for col in zip(*raw_old)]
+        col_sig_new = [column_fingerprint(col) for col in zip(*raw_new)]
+        # Chèn/xóa hàng có dữ liệu làm đổi chữ ký mọi cột: trong khối 'replace' ghép cột theo tỉ lệ giá trị chung
+        values_old = [Counter(str(v) for v in col if v is not None) for col in zip(*raw_old)]
+        values_new = [Counter(str(v) for v in col if v is not None) for col in zip(*raw_new)]
+        # [UPDATED] Ghép cột bằng ShiftDetector (cùng engine với phần core), kể cả cột bị di chuyển
+        # (1 cột di chuyển cũng báo MOVED: độ dài tối thiểu MIN_MOVE chỉ dùng cho hàng)
+        col_mapping, col_moves = self.detector.align(
+            col_sig_old, col_sig_new, ignore={row_fingerprint(())}, min_length=1,
+            similarity=lambda c_old, c_new: value_overlap(values_old[c_old], values_new[c_new]))
+        col_pairs = sorted((c_old + 1, c_new + 1) for c_old, c_new in col_mapping.items() if c_new is not None)
+        for a_start, b_start, length in col_moves:
+            first_old, first_new = a_start + 1 + dc_old, b_start + 1 + dc_new
+            report.append(CellDiff(idx_counter, "COLUMN", "MOVED", f"Col {get_column_letter(first_new)}",
+                                   f"{get_column_letter(first_old)}:{get_column_letter(first_old + length - 1)}",
+                                   f"{get_column_letter(first_new)}:{get_column_letter(first_new + length - 1)}",
+                                   f"{length} column(s) moved"))
+            idx_counter += 1
+        for c_old, c_new in col_mapping.items():
+            if c_new is None:
+                report.append(CellDiff(idx_counter, "COLUMN", "DELETED", f"Col {get_column_letter(c_old + 1 + dc_old)}", "", "", "Column removed"))
+                idx_counter += 1
+        mapped_new = {c_new for _, c_new in col_pairs}
+        for c in range(len(col_sig_new)):
+            if c + 1 not in mapped_new:
+                report.append(CellDiff(idx_counter, "COLUMN", "INSERTED", f"Col {get_column_letter(c + 1 + dc_new)}", "", "", "Column added"))
+                idx_counter += 1
+        # row_map/col_map trả về theo tọa độ sheet (compare_shapes dùng vị trí neo tuyệt đối)
+        col_map = {c_old + dc_old: c_new + dc_new for c_old, c_new in col_pairs}
         
-        # [UPDATED] autojunk=False để tăng độ chính xác với dữ liệu số
-        matcher = difflib.SequenceMatcher(None, sig_old, sig_new, autojunk=False)
+        # [UPDATED] TỐI ƯU HIỆU SUẤT: Dùng fingerprint cố định (blake2b) thay vì hash() của Python
+        # (hash() thay đổi theo từng process nên không lưu lại được)
+        if len(col_sig_old) == len(col_sig_new) and all(c_old == c_new for c_old, c_new in col_pairs):
+            sig_old = [row_fingerprint(r) for r in raw_old]
+            sig_new = [row_fingerprint(r) for r in raw_new]
+        else:
+            # Có cột chèn/xóa: chữ ký hàng chỉ tính trên các cột đã ghép cặp
+            sig_old = [row_fingerprint([r[c_old - 1] for c_old, _ in col_pairs]) for r in raw_old]
+            sig_new = [row_fingerprint([r[c_new - 1] for _, c_new in col_pairs]) for r in raw_new]
         
+        # [UPDATED] Thuật toán dóng hàng lấy từ ShiftDetector (core.alignment.ENGINES)
+        row_opcodes = self.detector.engine.get_opcodes(sig_old, sig_new)
         row_map = {} 
-        idx_counter = 1
         
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        # [NEW FEATURE] DÒ KHỐI HÀNG DI CHUYỂN (cắt/dán): 1 dòng MOVED thay vì N dòng xóa + N dòng chèn
+        # Hàng trống không được làm điểm bắt đầu của khối
+        blank_sigs = {row_fingerprint([None] * len(col_sig_old)), row_fingerprint([None] * len(col_sig_new)),
+                      row_fingerprint([None] * len(col_pairs))}
+        moves = self.detector.find_moves(sig_old, sig_new, row_opcodes, ignore=blank_sigs)
+        moved_old, moved_new = set(), set()
+        for a_start, b_start, length in moves:
+            first_old, first_new = a_start + 1 + dr_old, b_start + 1 + dr_new
+            report.append(CellDiff(idx_counter, "ROW", "MOVED", f"Row {first_new}",
+                                   f"{first_old}:{first_old+length-1}", f"{first_new}:{first_new+length-1}",
+                                   f"{length} row(s) moved"))
+            idx_counter += 1
+            for k in range(length):
+                row_map[first_old + k] = first_new + k
+                moved_old.add(a_start + k)
+                moved_new.add(b_start + k)
+        
+        for tag, i1, i2, j1, j2 in row_opcodes:
             if tag == 'equal':
                 for k in range(i2 - i1):
-                    row_map[i1 + k + 1] = j1 + k + 1
+                    row_map[i1 + k + 1 + dr_old] = j1 + k + 1 + dr_new
             elif tag == 'delete':
                 for k in range(i2 - i1):
-                    report.append(CellDiff(idx_counter, "ROW", "DELETED", f"Row {i1+k+1}", "", "", "Row removed"))
+                    if i1 + k in moved_old: continue
+                    report.append(CellDiff(idx_counter, "ROW", "DELETED", f"Row {i1+k+1+dr_old}", "", "", "Row removed"))
                     idx_counter += 1
             elif tag == 'insert':
                 for k in range(j2 - j1):
-                    report.append(CellDiff(idx_counter, "ROW", "INSERTED", f"Row {j1+k+1}", "", "", "Row added"))
+                    if j1 + k in moved_new: continue
+                    report.append(CellDiff(idx_counter, "ROW", "INSERTED", f"Row {j1+k+1+dr_new}", "", "", "Row added"))
                     idx_counter += 1
             elif tag == 'replace':
-                if (i2-i1) == (j2-j1):
-                    for k in range(i2-i1):
-                        row_map[i1+k+1] = j1+k+1
+                rest_old = [i for i in range(i1, i2) if i not in moved_old]
+                rest_new = [j for j in range(j1, j2) if j not in moved_new]
+                if len(rest_old) == len(rest_new):
+                    for i, j in zip(rest_old, rest_new):
+                        row_map[i + 1 + dr_old] = j + 1 + dr_new
         
-        col_map = {i: i for i in range(1, 256)} 
+        # --- [UPDATED] CHECK COLUMN WIDTH / ROW HEIGHT ---
+        # Đọc kích thước hàng/cột hàng loạt từ XML của file đã lưu (thay vì 2 lệnh COM cho mỗi hàng/cột),
+        # so sánh trong bộ nhớ. Không đọc được (file .xls, ...) thì quay về cách gọi COM cũ.
+        geo_old = engine.get_sheet_geometry(ws_old)
+        geo_new = engine.get_sheet_geometry(ws_new)
         
-        # --- [NEW FEATURE] CHECK COLUMN WIDTH ---
         if log_func: log_func("Checking Column Widths...")
         try:
             # Lấy số cột lớn nhất để quét
             max_col_check = 0
-            try: max_col_check = max(ws_old.UsedRange.Columns.Count, ws_new.UsedRange.Columns.Count)
+            try: max_col_check = max(col0_old + ws_old.UsedRange.Columns.Count, col0_new + ws_new.UsedRange.Columns.Count) - 1
             except: pass
             
-            if max_col_check > 0:
+            if geo_old is not None and geo_new is not None:
+                width_diffs = diff_sizes(max_col_check, geo_old.col_width, geo_new.col_width)
+            else:
+                width_diffs = []
                 for c_idx in range(1, max_col_check + 1):
                     try:
                         w_old = ws_old.Columns(c_idx).ColumnWidth
                         w_new = ws_new.Columns(c_idx).ColumnWidth
-                        
                         # So sánh với sai số 0.1 (do float point)
                         if abs(w_old - w_new) > 0.1:
-                            col_letter = get_column_letter(c_idx)
-                            report.append(CellDiff(
-                                idx_counter, "COLUMN", "RESIZED", 
-                                f"Col {col_letter}", 
-                                round(w_old, 2), round(w_new, 2), 
-                                "Width changed"
-                            ))
-                            idx_counter += 1
+                            width_diffs.append((c_idx, w_old, w_new))
                     except: continue
+            
+            for c_idx, w_old, w_new in width_diffs:
+                col_letter = get_column_letter(c_idx)
+                report.append(CellDiff(
+                    idx_counter, "COLUMN", "RESIZED", 
+                    f"Col {col_letter}", 
+                    round(w_old, 2), round(w_new, 2), 
+                    "Width changed"
+                ))
+                idx_counter += 1
         except Exception as e:
             if log_func: log_func(f"Warning: Column Width check failed ({str(e)})")
 
-        # --- [NEW FEATURE] CHECK ROW HEIGHT ---
         if log_func: log_func("Checking Row Heights...")
         try:
             max_row_check = 0
-            try: max_row_check = max(ws_old.UsedRange.Rows.Count, ws_new.UsedRange.Rows.Count)
+            try: max_row_check = max(row0_old + ws_old.UsedRange.Rows.Count, row0_new + ws_new.UsedRange.Rows.Count) - 1
             except: pass
             
-            if max_row_check > 0:
+            if geo_old is not None and geo_new is not None:
+                height_diffs = diff_sizes(max_row_check, geo_old.row_height, geo_new.row_height)
+            else:
+                height_diffs = []
                 for r_idx in range(1, max_row_check + 1):
                     try:
                         h_old = ws_old.Rows(r_idx).RowHeight
                         h_new = ws_new.Rows(r_idx).RowHeight
-                        
                         if abs(h_old - h_new) > 0.1:
-                            report.append(CellDiff(
-                                idx_counter, "ROW", "RESIZED", 
-                                f"Row {r_idx}", 
-                                round(h_old, 2), round(h_new, 2), 
-                                "Height changed"
-                            ))
-                            idx_counter += 1
+                            height_diffs.append((r_idx, h_old, h_new))
                     except: continue
+            
+            for r_idx, h_old, h_new in height_diffs:
+                report.append(CellDiff(
+                    idx_counter, "ROW", "RESIZED", 
+                    f"Row {r_idx}", 
+                    round(h_old, 2), round(h_new, 2), 
+                    "Height changed"
+                ))
+                idx_counter += 1
         except Exception as e:
             if log_func: log_func(f"Warning: Row Height check failed ({str(e)})")
 
-        total_rows_check = len(raw_old)
-        for r_old_idx, row_data in enumerate(raw_old):
-            if log_func and r_old_idx % 100 == 0:
-                log_func(f"Comparing Cells Row: {r_old_idx+1}/{total_rows_check}...")
-
-            excel_r_old = r_old_idx + 1
-            if excel_r_old in row_map:
-                excel_r_new = row_map[excel_r_old]
-                if excel_r_new - 1 < len(raw_new):
-                    row_new_data = raw_new[excel_r_new - 1]
-                    max_col = max(len(row_data), len(row_new_data))
-                    for c_idx in range(max_col):
-                        val_old = row_data[c_idx] if c_idx < len(row_data) else None
-                        val_new = row_new_data[c_idx] if c_idx < len(row_new_data) else None
-                        
-                        # [UPDATED] TĂNG ĐỘ CHÍNH XÁC: So sánh theo Type thay vì String
-                        is_diff = False
-                        
-                        # Chuẩn hóa None về "" để so sánh an toàn
-                        v1_check = "" if val_old is None else val_old
-                        v2_check = "" if val_new is None else val_new
-                        
-                        # Logic so sánh thông minh
-                        if type(v1_check) != type(v2_check):
-                            # Nếu khác kiểu, nhưng là số (VD: 10 vs 10.0) -> check sai số
-                            if isinstance(v1_check, (int, float)) and isinstance(v2_check, (int, float)):
-                                if abs(float(v1_check) - float(v2_check)) > 0.000001:
-                                    is_diff = True
-                            else:
-                                # Thử ép kiểu string nếu không phải số thuần túy
-                                if str(v1_check).strip() != str(v2_check).strip():
-                                    is_diff = True
-                        else:
-                            # Cùng kiểu dữ liệu
-                            if isinstance(v1_check, (int, float)):
-                                if abs(v1_check - v2_check) > 0.000001: # Epsilon cho số
-                                    is_diff = True
-                            elif isinstance(v1_check, str):
-                                # So sánh string có strip khoảng trắng thừa
-                                if v1_check.strip() != v2_check.strip(): 
-                                    is_diff = True
-                            else:
-                                # Các kiểu khác (datetime, boolean...)
-                                if v1_check != v2_check:
-                                    is_diff = True
-                        
-                        if is_diff:
-                            v1_str = str(val_old) if val_old is not None else ""
-                            v2_str = str(val_new) if val_new is not None else ""
-                            
-                            addr = ws_old.Cells(excel_r_old, c_idx+1).Address.replace("$", "")
-                            report.append(CellDiff(idx_counter, "CELL", "MODIFIED", addr, v1_str, v2_str, f"Val changed"))
-                            idx_counter += 1
+        # [UPDATED] TỐI ƯU HIỆU SUẤT: So sánh vector hóa bằng NumPy theo từng khối hàng đã ghép cặp
+        # (cùng quy tắc như trước: số so theo sai số, còn lại so chuỗi đã strip; None = "")
+        # Địa chỉ A1 tính trực tiếp (đã cộng gốc UsedRange), không gọi COM ws.Cells(r, c).Address cho mỗi ô khác
+        if log_func: log_func(f"Comparing Cells ({len(row_map)} rows x {len(col_pairs)} cols)...")
+        diffs = compare_aligned_rows(raw_old, raw_new, row_map, sorted(col_map.items()),
+                                     origin_old=(row0_old, col0_old), origin_new=(row0_new, col0_new))
+        for r_old, c_old, val_old, val_new in diffs:
+            v1_str = str(val_old) if val_old is not None else ""
+            v2_str = str(val_new) if val_new is not None else ""
+            
+            addr = a1_address(r_old, c_old)
+            report.append(CellDiff(idx_counter, "CELL", "MODIFIED", addr, v1_str, v2_str, f"Val changed"))
+            idx_counter += 1
                                 
         return report, row_map, col_map
 
@@ -1226,7 +1382,8 @@ class AppUI(ctk.CTk):
             out_file = engine.create_report_workbook(p_out, cell_report, shape_report, 
                                                      ws_old, ws_new, 
                                                      only_diffs=is_only_diffs, 
-                                                     highlight_changes=is_highlight)
+                                                     highlight_changes=is_highlight,
+                                                     native=NATIVE_REPORT)
             
             self.log(txt_data["status_done"])
             
@@ -1,15 +1,42 @@
 import openpyxl
+from openpyxl.formatting.rule import FormulaRule
 from openpyxl.styles import PatternFill, Font, Color
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.cell import WriteOnlyCell
 from core.data_types import DiffResult, DiffType
+from core.xlsx_package import XlsxPackage
+from .ranges import coalesce, range_address, row_move
+
+SUMMARY_HEADER = ["Type", "Location", "Details", "Old Value", "New Value"]
+
+# Columns painted for an inserted or moved row (streaming mode: the sheet's width, if wider)
+ROW_HIGHLIGHT_COLS = 19
+
+def _literal(ws, value):
+    # Write-only cell for a value: text starting with "=" stays text instead of becoming a formula
+    if isinstance(value, str) and value.startswith("="):
+        cell = WriteOnlyCell(ws, value)
+        cell.data_type = 's'
+        return cell
+    return value
 
 class ExcelReportGenerator:
-    def __init__(self, file_b_path: str, output_path: str):
+    def __init__(self, file_b_path: str, output_path: str, streaming: bool = False, sheet_name: str = None):
         self.file_b_path = file_b_path
         self.output_path = output_path
-        
+        # Streaming: a new write-only workbook (constant memory) with the summary and the
+        # values of the modified sheet, highlights as conditional formats on coalesced ranges.
+        # The original cell formatting is not carried over in this mode.
+        self.streaming = streaming
+        self.sheet_name = sheet_name # None: active sheet
+
     def generate(self, result: DiffResult):
+        if self.streaming:
+            self._generate_streaming(result)
+            return
+
         wb = openpyxl.load_workbook(self.file_b_path)
-        ws = wb.active # Assume active sheet
+        ws = wb[self.sheet_name] if self.sheet_name else wb.active # Assume active sheet
         
         # Styles
         fill_changed = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid") # Yellow
@@ -46,7 +73,7 @@ class ExcelReportGenerator:
                         if "Row inserted" in item.details:
                             # Apply to reasonable range, e.g. A:End
                             # Use cell.row
-                            for col_idx in range(1, 20): # Hardcoded max col for visual
+                            for col_idx in range(1, ROW_HIGHLIGHT_COLS + 1): # Hardcoded max col for visual
                                 try:
                                     ws.cell(row=cell.row, column=col_idx).fill = fill_inserted
                                 except: pass
@@ -55,6 +82,14 @@ class ExcelReportGenerator:
                 elif item.diff_type == DiffType.DELETED:
                     deleted_items.append(item)
 
+            elif item.item_type == "Row" and item.diff_type == DiffType.MOVED:
+                # Moved block: its rows at their new place
+                rows = row_move(item.location)
+                if rows is not None:
+                    for r in range(rows[1][0], rows[1][1] + 1):
+                        for col_idx in range(1, ROW_HIGHLIGHT_COLS + 1):
+                            ws.cell(row=r, column=col_idx).fill = fill_moved
+
             elif item.item_type == "Shape":
                 # Highlighting shapes is hard via openpyxl.
                 # We will list them in the "Summary" sheet.
@@ -62,15 +97,80 @@ class ExcelReportGenerator:
 
         # Create Summary Sheet
         ws_summary = wb.create_sheet("Diff Summary", 0)
-        ws_summary.append(["Type", "Location", "Details", "Old Value", "New Value"])
+        ws_summary.append(SUMMARY_HEADER)
         
         for item in result.items:
-            ws_summary.append([
-                item.diff_type.value,
-                item.location,
-                item.details,
-                str(item.old_value) if item.old_value else "",
-                str(item.new_value) if item.new_value else ""
-            ])
+            ws_summary.append(self._summary_row(item))
             
         wb.save(self.output_path)
+
+    def _summary_row(self, item):
+        return [
+            item.diff_type.value,
+            item.location,
+            item.details,
+            str(item.old_value) if item.old_value else "",
+            str(item.new_value) if item.new_value else ""
+        ]
+
+    def _highlight_cells(self, result: DiffResult):
+        """(changed cells, inserted cells, inserted rows, moved rows) in B, as (row, col) / row numbers."""
+        changed, inserted, inserted_rows, moved_rows = [], [], set(), set()
+        for item in result.items:
+            if item.item_type == "Row" and item.diff_type == DiffType.MOVED:
+                rows = row_move(item.location)
+                if rows is not None:
+                    moved_rows.update(range(rows[1][0], rows[1][1] + 1))
+            if item.item_type != "Cell":
+                continue
+            try:
+                if item.diff_type == DiffType.CHANGED:
+                    changed.append(coordinate_to_tuple(item.location.split("->")[-1].strip()))
+                elif item.diff_type == DiffType.INSERTED:
+                    cell = coordinate_to_tuple(item.location)
+                    inserted.append(cell)
+                    if "Row inserted" in item.details:
+                        inserted_rows.add(cell[0])
+            except ValueError:
+                pass
+        return changed, inserted, inserted_rows, moved_rows
+
+    def _generate_streaming(self, result: DiffResult):
+        changed, inserted, inserted_rows, moved_rows = self._highlight_cells(result)
+
+        wb = openpyxl.Workbook(write_only=True)
+        ws_summary = wb.create_sheet("Diff Summary")
+        ws_summary.append(SUMMARY_HEADER)
+        for item in result.items:
+            ws_summary.append([_literal(ws_summary, v) for v in self._summary_row(item)])
+
+        # The modified sheet, one row at a time
+        max_col = 0
+        with XlsxPackage(self.file_b_path) as package:
+            title = self.sheet_name or package.active_sheet
+            ws = wb.create_sheet(title)
+            row_idx, values = 1, []
+            for r, c, value, formula in package.iter_cells(title):
+                if r != row_idx:
+                    ws.append(values)
+                    for _ in range(row_idx + 1, r): # Empty rows
+                        ws.append([])
+                    row_idx, values = r, []
+                values.extend([None] * (c - 1 - len(values)))
+                # Formulas of the source are written as formulas, any other text literally
+                values.append(formula if formula is not None else _literal(ws, value))
+                max_col = max(max_col, c)
+            ws.append(values)
+
+        # Inserted and moved rows are painted across the sheet's columns
+        row_width = max(max_col, ROW_HIGHLIGHT_COLS)
+        inserted.extend((r, c) for r in inserted_rows for c in range(1, row_width + 1))
+        moved = [(r, c) for r in moved_rows for c in range(1, row_width + 1)]
+        for color, cells in (("FFFF00", changed), ("00FF00", inserted), ("FFA500", moved)):
+            if not cells:
+                continue
+            fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+            sqref = " ".join(range_address(rect) for rect in coalesce(cells))
+            ws.conditional_formatting.add(sqref, FormulaRule(formula=["TRUE"], fill=fill))
+
+        wb.save(self.output_path)
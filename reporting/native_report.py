@@ -0,0 +1,94 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from openpyxl.utils.cell import coordinate_to_tuple
+from core.data_types import DiffResult, DiffType
+from core.xlsx_package import XlsxPackage
+from .excel_writer import SUMMARY_HEADER
+from .ranges import hyperlink_formula
+from .xlsx_builder import WorkbookBuilder
+
+TABLE_STYLE = "TableStyleMedium2"
+REPORT_FONT = '<font><sz val="11"/><name val="Meiryo UI"/><family val="3"/></font>'
+LINK_FONT = '<font><u/><sz val="11"/><color rgb="FF0000FF"/><name val="Meiryo UI"/><family val="3"/></font>'
+
+# Interior.Color = 255 of the COM report
+HIGHLIGHT_RGB = "FF0000"
+
+# Cell highlights of a DiffResult report (as ExcelReportGenerator / VisualReporter)
+CHANGED_RGB = "FFFF00"
+INSERTED_RGB = "00FF00"
+DELETED_RGB = "FFB6C1"
+
+# (sheet title, header, rows, text written instead of an empty table)
+ReportTable = Tuple[str, Sequence[str], List[list], str]
+
+
+class NativeReportGenerator:
+    """
+    The report of ExcelEngine.create_report_workbook written without Excel: the report tables
+    as native table parts (TableStyleMedium2, Meiryo UI), followed by copies of both source
+    sheets ("Source_Old", "Source_New") made at the zip level with their shapes, and the
+    highlighted cells painted into the copies. Runs anywhere, reports can be built in parallel.
+    """
+    def __init__(self, output_path: str, file_old: str, file_new: str,
+                 sheet_old: Optional[str] = None, sheet_new: Optional[str] = None):
+        self.output_path = output_path
+        self.file_old = file_old
+        self.file_new = file_new
+        self.sheet_old = sheet_old # None: active sheet
+        self.sheet_new = sheet_new
+
+    def generate(self, tables: List[ReportTable], fills_old: Dict[Tuple[int, int], str] = None,
+                 fills_new: Dict[Tuple[int, int], str] = None) -> str:
+        """
+        tables: see ReportTable. Link cells are =HYPERLINK formulas (reporting.ranges.hyperlink_formula).
+        fills_old / fills_new: (row, col) -> rgb painted on the source copies.
+        """
+        builder = WorkbookBuilder()
+        with XlsxPackage(self.file_old) as old, XlsxPackage(self.file_new) as new:
+            builder.copy_sheet(old, self.sheet_old, "Source_Old", cell_fills=fills_old)
+            builder.copy_sheet(new, self.sheet_new, "Source_New", cell_fills=fills_new)
+        for position, (title, header, rows, empty_text) in enumerate(tables):
+            if rows:
+                builder.add_sheet(title, [list(header)] + rows, table_style=TABLE_STYLE,
+                                  font=REPORT_FONT, link_font=LINK_FONT, position=position)
+            else:
+                builder.add_sheet(title, [[empty_text]], font=REPORT_FONT, position=position)
+        builder.save(self.output_path)
+        return self.output_path
+
+
+def diff_result_tables(result: DiffResult):
+    """
+    Report content for a core DiffResult (MATCH items left out): a Cell_Report and a
+    Shape_Report table, cell locations linked to the source copies, and the changed /
+    inserted / deleted cells as fills. Returns (tables, fills_old, fills_new).
+    """
+    cells, shapes = [], []
+    fills_old, fills_new = {}, {}
+    for item in result.items:
+        if item.diff_type == DiffType.MATCH:
+            continue
+        row = [item.diff_type.value, item.location, item.details,
+               "" if item.old_value is None else str(item.old_value),
+               "" if item.new_value is None else str(item.new_value)]
+        if item.item_type == "Shape":
+            shapes.append(row)
+            continue
+        parts = [p.strip() for p in item.location.split("->")]
+        try:
+            if item.diff_type == DiffType.CHANGED:
+                fills_old[coordinate_to_tuple(parts[0])] = CHANGED_RGB
+                fills_new[coordinate_to_tuple(parts[-1])] = CHANGED_RGB
+                row[1] = hyperlink_formula("Source_New", parts[-1], item.location)
+            elif item.diff_type == DiffType.INSERTED:
+                fills_new[coordinate_to_tuple(parts[0])] = INSERTED_RGB
+                row[1] = hyperlink_formula("Source_New", parts[0])
+            elif item.diff_type == DiffType.DELETED:
+                fills_old[coordinate_to_tuple(parts[0])] = DELETED_RGB
+                row[1] = hyperlink_formula("Source_Old", parts[0])
+        except ValueError:
+            pass # Not a single cell (moved row blocks): plain text
+        cells.append(row)
+    tables = [("Cell_Report", SUMMARY_HEADER, cells, "No Cell Differences Found."),
+              ("Shape_Report", SUMMARY_HEADER, shapes, "No Shape Differences Found.")]
+    return tables, fills_old, fills_new
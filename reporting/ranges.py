@@ -0,0 +1,112 @@
+from typing import Iterable, List, Optional, Tuple
+from openpyxl.utils import get_column_letter
+
+# (min_row, min_col, max_row, max_col), 1-indexed, inclusive
+Rect = Tuple[int, int, int, int]
+
+# Longest address string Range() accepts (Excel COM)
+MAX_ADDRESS_LEN = 255
+
+
+def _runs(cols: List[int]) -> List[Tuple[int, int]]:
+    # Sorted columns -> (first, last) of each run of adjacent columns
+    runs = []
+    start = prev = cols[0]
+    for c in cols[1:]:
+        if c != prev + 1:
+            runs.append((start, prev))
+            start = c
+        prev = c
+    runs.append((start, prev))
+    return runs
+
+
+def row_runs(rows: Iterable[int]) -> List[Tuple[int, int]]:
+    """(first, last) of each run of adjacent rows, for whole-row highlights."""
+    rows = sorted(set(rows))
+    return _runs(rows) if rows else []
+
+
+def row_move(location: str) -> Optional[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    """
+    Rows of a moved block, from its DiffItem location "11:30 -> 31:50":
+    ((first, last) in the old sheet, (first, last) in the new sheet). None if not a row move.
+    """
+    parts = location.split("->")
+    if len(parts) != 2:
+        return None
+    try:
+        runs = tuple(tuple(int(r) for r in part.split(":")) for part in parts)
+    except ValueError:
+        return None
+    if any(len(run) != 2 for run in runs):
+        return None
+    return runs
+
+
+def coalesce(cells: Iterable[Tuple[int, int]]) -> List[Rect]:
+    """
+    Rectangles that cover exactly the given (row, col) cells: adjacent cells of a row
+    become one run, and the same run on consecutive rows grows into one rectangle.
+    Sorted by top-left cell.
+    """
+    by_row = {}
+    for r, c in cells:
+        by_row.setdefault(r, set()).add(c)
+
+    rects = []
+    active = {} # (first col, last col) -> first row
+    prev_row = None
+    for r in sorted(by_row):
+        runs = set(_runs(sorted(by_row[r])))
+        for run in list(active):
+            if r != prev_row + 1 or run not in runs:
+                rects.append((active.pop(run), run[0], prev_row, run[1]))
+        for run in runs:
+            active.setdefault(run, r)
+        prev_row = r
+    for run, start in active.items():
+        rects.append((start, run[0], prev_row, run[1]))
+    rects.sort()
+    return rects
+
+
+def range_address(rect: Rect) -> str:
+    """'B2' or 'B2:D5' (relative, as in a sqref or Range())."""
+    r1, c1, r2, c2 = rect
+    top_left = f"{get_column_letter(c1)}{r1}"
+    if r1 == r2 and c1 == c2:
+        return top_left
+    return f"{top_left}:{get_column_letter(c2)}{r2}"
+
+
+def rows_address(run: Tuple[int, int]) -> str:
+    """'5:5' or '5:9': whole rows."""
+    return f"{run[0]}:{run[1]}"
+
+
+def address_batches(addresses: Iterable[str], limit: int = MAX_ADDRESS_LEN) -> List[str]:
+    """
+    Joins addresses into comma separated multi-area strings of at most `limit` characters,
+    so each batch is painted with one Range() call.
+    """
+    batches = []
+    current = ""
+    for addr in addresses:
+        if current and len(current) + 1 + len(addr) > limit:
+            batches.append(current)
+            current = ""
+        current = f"{current},{addr}" if current else addr
+    if current:
+        batches.append(current)
+    return batches
+
+
+def hyperlink_formula(sheet: str, address: str, text: str = None) -> str:
+    """
+    =HYPERLINK("#'Sheet'!A5","A5"): a link to a cell of the same workbook that can be
+    written with the rest of a column in one Range.Value assignment (no Hyperlinks.Add call).
+    """
+    target = "#'{}'!{}".format(sheet.replace("'", "''"), address)
+    text = address if text is None else text
+    return '=HYPERLINK("{}","{}")'.format(target.replace('"', '""'), str(text).replace('"', '""'))
@@ -1,16 +1,194 @@
-import xlwings as xw
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+from openpyxl.utils.cell import coordinate_to_tuple
 from core.data_types import DiffResult, DiffType
+from core.xlsx_package import XlsxPackage
+from .ranges import coalesce, row_runs, row_move, range_address, rows_address, address_batches
+from .xlsx_builder import WorkbookBuilder
 import os
 
+# Cell colors
+COLOR_INSERTED = (144, 238, 144) # Light Green (rows/cells added)
+COLOR_CHANGED = (255, 255, 224) # Light Yellow (cells changed)
+COLOR_DELETED = (255, 182, 193) # Light Red/Pink (rows/cells deleted)
+COLOR_MOVED = (173, 216, 230) # Light Blue (row blocks moved: source rows in Base Diff, target rows in Modified Diff)
+
+# Shape Color Codes (VBA RGB values)
+COLOR_RED = 255        # Position changed
+COLOR_BLUE = 16711680  # Size changed
+COLOR_GREEN = 65280    # Deleted shape
+COLOR_ORANGE = 42495   # Inserted shape
+
+SHEET_NAMES = ["Original", "Modified", "Modified Diff", "Base Diff", "Unchanged"]
+
+def _cell(location):
+    # "A3" -> (3, 1); None if the location is not a single cell
+    try:
+        return coordinate_to_tuple(location.strip())
+    except ValueError:
+        return None
+
+def _rgb(color) -> str:
+    # (r, g, b) or a VBA RGB value (0xBBGGRR) -> "RRGGBB"
+    if isinstance(color, int):
+        color = (color & 0xFF, (color >> 8) & 0xFF, (color >> 16) & 0xFF)
+    return "%02X%02X%02X" % tuple(color)
+
+def _paint(sheet, cells, rows, color):
+    """Colors whole rows and cells with as few multi-area Range calls as the address limit allows."""
+    addresses = [rows_address(run) for run in row_runs(rows)]
+    addresses += [range_address(rect) for rect in coalesce(cells)]
+    for batch in address_batches(addresses):
+        try:
+            sheet.range(batch).color = color
+        except: pass
+
+def _line(shape, color):
+    shape.api.Line.ForeColor.RGB = color
+    shape.api.Line.Weight = 2.5
+    shape.api.Line.Visible = True
+
+@dataclass
+class Highlights:
+    """What the diff sheets show for a DiffResult: cells and rows per color, notes and shape outlines."""
+    inserted_cells: List[Tuple[int, int]] = field(default_factory=list)
+    inserted_rows: Set[int] = field(default_factory=set)
+    changed_new: List[Tuple[int, int]] = field(default_factory=list)
+    changed_old: List[Tuple[int, int]] = field(default_factory=list)
+    deleted_cells: List[Tuple[int, int]] = field(default_factory=list)
+    deleted_rows: Set[int] = field(default_factory=set)
+    moved_old: Set[int] = field(default_factory=set) # Rows of moved blocks, Base Diff
+    moved_new: Set[int] = field(default_factory=set) # Rows of moved blocks, Modified Diff
+    comments: List[tuple] = field(default_factory=list) # (loc_new, loc_old, item) of every changed cell
+    lines_new: Dict[str, int] = field(default_factory=dict) # Shape name -> VBA color, Modified Diff
+    lines_old: Dict[str, int] = field(default_factory=dict) # Shape name -> VBA color, Base Diff
+    matched: List[str] = field(default_factory=list) # Unchanged shapes, removed from both diff sheets
+
+def collect_highlights(result: DiffResult) -> Highlights:
+    h = Highlights()
+    for item in result.items:
+        if item.item_type == "Cell":
+            # ===== MODIFIED DIFF: Show changes/insertions in Modified =====
+            if item.diff_type == DiffType.INSERTED:
+                cell = _cell(item.location)
+                if cell is None:
+                    continue
+                if "Row inserted" in item.details:
+                    h.inserted_rows.add(cell[0])
+                else:
+                    h.inserted_cells.append(cell)
+
+            elif item.diff_type == DiffType.CHANGED:
+                parts = item.location.split("->")
+                loc_new = parts[-1].strip()
+                loc_old = parts[0].strip() if len(parts) > 1 else loc_new
+                # Highlight in Modified Diff and in Base Diff
+                cell_new = _cell(loc_new)
+                cell_old = _cell(loc_old)
+                if cell_new is not None:
+                    h.changed_new.append(cell_new)
+                if cell_old is not None:
+                    h.changed_old.append(cell_old)
+                h.comments.append((loc_new, loc_old, item))
+
+            # ===== BASE DIFF: Show deletions from Base =====
+            elif item.diff_type == DiffType.DELETED:
+                cell = _cell(item.location)
+                if cell is None:
+                    continue
+                if "Row deleted" in (item.details or ""):
+                    h.deleted_rows.add(cell[0])
+                else:
+                    h.deleted_cells.append(cell)
+
+        elif item.item_type == "Row" and item.diff_type == DiffType.MOVED:
+            rows = row_move(item.location)
+            if rows is not None:
+                (old_first, old_last), (new_first, new_last) = rows
+                h.moved_old.update(range(old_first, old_last + 1))
+                h.moved_new.update(range(new_first, new_last + 1))
+
+        elif item.item_type == "Shape":
+            details = item.details if item.details else ""
+
+            if item.diff_type in [DiffType.CHANGED, DiffType.MOVED]:
+                # Changed/moved shape in Modified Diff: red if it moved, blue if only resized
+                size_only = "size_changed" in details and "position_changed" not in details
+                h.lines_new[item.location] = COLOR_BLUE if size_only else COLOR_RED
+            elif item.diff_type == DiffType.DELETED:
+                # Deleted shape in Base Diff (it exists there)
+                h.lines_old[item.location] = COLOR_GREEN
+            elif item.diff_type == DiffType.INSERTED:
+                h.lines_new[item.location] = COLOR_ORANGE
+            elif item.diff_type == DiffType.MATCH:
+                h.matched.append(item.location)
+    return h
+
+def _notes(h: Highlights):
+    """("Was:" notes for Modified Diff, "Now:" notes for Base Diff), each (row, col) -> text."""
+    notes_new, notes_old = {}, {}
+    for loc_new, loc_old, item in h.comments:
+        cell_new, cell_old = _cell(loc_new), _cell(loc_old)
+        if cell_new is not None:
+            notes_new.setdefault(cell_new, f"Was: {item.old_value}")
+        if cell_old is not None:
+            notes_old.setdefault(cell_old, f"Now: {item.new_value}")
+    return notes_new, notes_old
+
 class VisualReporter:
-    def __init__(self, file_a, file_b, output_path, sheet_a=None, sheet_b=None):
+    """
+    Report of a DiffResult as five copies of the compared sheets: Original, Modified, Modified Diff,
+    Base Diff, Unchanged, the diff sheets highlighted.
+    native=True builds it at the zip level (reporting.xlsx_builder) without Excel, in time that
+    follows the size of the diff rather than of the sheets; otherwise Excel copies the sheets via COM.
+    """
+    def __init__(self, file_a, file_b, output_path, sheet_a=None, sheet_b=None, native=False):
         self.file_a = os.path.abspath(file_a)
         self.file_b = os.path.abspath(file_b)
         self.output_path = os.path.abspath(output_path)
         self.sheet_a = sheet_a
         self.sheet_b = sheet_b
+        self.native = native
         
     def generate(self, result: DiffResult):
+        highlights = collect_highlights(result)
+        if self.native:
+            return self._generate_native(highlights)
+        return self._generate_com(highlights)
+
+    def _generate_native(self, h: Highlights):
+        sheet_a = self.sheet_a if self.sheet_a != "Select File First" else None
+        sheet_b = self.sheet_b if self.sheet_b != "Select File First" else None
+        fills_new = dict.fromkeys(h.inserted_cells, _rgb(COLOR_INSERTED))
+        fills_new.update(dict.fromkeys(h.changed_new, _rgb(COLOR_CHANGED)))
+        fills_old = dict.fromkeys(h.changed_old, _rgb(COLOR_CHANGED))
+        fills_old.update(dict.fromkeys(h.deleted_cells, _rgb(COLOR_DELETED)))
+        rows_new = dict.fromkeys(h.moved_new, _rgb(COLOR_MOVED))
+        rows_new.update(dict.fromkeys(h.inserted_rows, _rgb(COLOR_INSERTED)))
+        rows_old = dict.fromkeys(h.moved_old, _rgb(COLOR_MOVED))
+        rows_old.update(dict.fromkeys(h.deleted_rows, _rgb(COLOR_DELETED)))
+
+        builder = WorkbookBuilder()
+        with XlsxPackage(self.file_a) as pkg_a, XlsxPackage(self.file_b) as pkg_b:
+            builder.copy_sheet(pkg_a, sheet_a, "Original")
+            builder.copy_sheet(pkg_b, sheet_b, "Modified")
+            mod_diff = builder.copy_sheet(
+                pkg_b, sheet_b, "Modified Diff", cell_fills=fills_new,
+                row_fills=rows_new,
+                shape_lines={name: _rgb(c) for name, c in h.lines_new.items()}, drop_shapes=h.matched)
+            base_diff = builder.copy_sheet(
+                pkg_a, sheet_a, "Base Diff", cell_fills=fills_old, row_fills=rows_old,
+                shape_lines={name: _rgb(c) for name, c in h.lines_old.items()}, drop_shapes=h.matched)
+            builder.copy_sheet(pkg_a, sheet_a, "Unchanged")
+
+        notes_new, notes_old = _notes(h)
+        builder.add_comments(mod_diff, notes_new)
+        builder.add_comments(base_diff, notes_old)
+        builder.save(self.output_path)
+        return self.output_path
+
+    def _generate_com(self, h: Highlights):
+        import xlwings as xw
         app = xw.App(visible=False)
         try:
             wb_a = app.books.open(self.file_a)
@@ -57,120 +235,39 @@ class VisualReporter:
             
             # Delete the default blank sheet if still exists
             for sheet in wb_out.sheets:
-                if sheet.name not in ["Original", "Modified", "Modified Diff", "Base Diff", "Unchanged"]:
+                if sheet.name not in SHEET_NAMES:
                     try:
                         sheet.delete()
                     except:
                         pass
             
-            # Colors
-            color_inserted = (144, 238, 144) # Light Green (rows/cells added)
-            color_changed = (255, 255, 224) # Light Yellow (cells changed)
-            color_deleted = (255, 182, 193) # Light Red/Pink (rows/cells deleted)
-            
-            # 4. Iterate Differences
-            # Shape Color Codes (VBA RGB values)
-            COLOR_RED = 255        # Position changed
-            COLOR_BLUE = 16711680  # Size changed
-            COLOR_GREEN = 65280    # Deleted shape
-            COLOR_ORANGE = 42495   # Inserted shape
+            # Shapes
+            for name, color in h.lines_new.items():
+                try:
+                    _line(ws_mod_diff.shapes[name], color)
+                except Exception as e:
+                    print(f"DEBUG: Shape style failed: {e}")
+            for name, color in h.lines_old.items():
+                try:
+                    _line(ws_base_diff.shapes[name], color)
+                except Exception as e:
+                    print(f"DEBUG: Deleted shape style failed: {e}")
+            for name in h.matched:
+                # Remove unchanged shapes from BOTH diff sheets
+                try:
+                    ws_mod_diff.shapes[name].api.Delete()
+                except: pass
+                try:
+                    ws_base_diff.shapes[name].api.Delete()
+                except: pass
             
-            import re
-            
-            for item in result.items:
-                if item.item_type == "Cell":
-                    # ===== MODIFIED DIFF: Show changes/insertions in Modified =====
-                    if item.diff_type == DiffType.INSERTED:
-                        if "Row inserted" in item.details:
-                            match = re.search(r'\d+', item.location)
-                            if match:
-                                r = int(match.group())
-                                try:
-                                    ws_mod_diff.range(f"{r}:{r}").color = color_inserted
-                                except: pass
-                        else:
-                            try:
-                                ws_mod_diff.range(item.location).color = color_inserted
-                            except: pass
-
-                    elif item.diff_type == DiffType.CHANGED:
-                        parts = item.location.split("->")
-                        loc_new = parts[-1].strip()
-                        loc_old = parts[0].strip() if len(parts) > 1 else loc_new
-                        # Highlight in Modified Diff
-                        try:
-                            ws_mod_diff.range(loc_new).color = color_changed
-                            ws_mod_diff.range(loc_new).api.AddComment(f"Was: {item.old_value}")
-                        except: pass
-                        # Highlight in Base Diff
-                        try:
-                            ws_base_diff.range(loc_old).color = color_changed
-                            ws_base_diff.range(loc_old).api.AddComment(f"Now: {item.new_value}")
-                        except: pass
-                    
-                    # ===== BASE DIFF: Show deletions from Base =====
-                    elif item.diff_type == DiffType.DELETED:
-                        if "Row deleted" in (item.details or ""):
-                            match = re.search(r'\d+', item.location)
-                            if match:
-                                r = int(match.group())
-                                try:
-                                    ws_base_diff.range(f"{r}:{r}").color = color_deleted
-                                except: pass
-                        else:
-                            try:
-                                ws_base_diff.range(item.location).color = color_deleted
-                            except: pass
-                            
-                elif item.item_type == "Shape":
-                    details = item.details if item.details else ""
-                    
-                    if item.diff_type in [DiffType.CHANGED, DiffType.MOVED]:
-                        # Highlight changed/moved shape in Modified Diff
-                        position_changed = "position_changed" in details
-                        size_changed = "size_changed" in details
-                        
-                        try:
-                            shape_mod = ws_mod_diff.shapes[item.location]
-                            if position_changed:
-                                shape_mod.api.Line.ForeColor.RGB = COLOR_RED
-                            elif size_changed:
-                                shape_mod.api.Line.ForeColor.RGB = COLOR_BLUE
-                            else:
-                                shape_mod.api.Line.ForeColor.RGB = COLOR_RED
-                            shape_mod.api.Line.Weight = 2.5
-                            shape_mod.api.Line.Visible = True
-                        except Exception as e:
-                            print(f"DEBUG: Shape style failed: {e}")
-                            
-                    elif item.diff_type == DiffType.DELETED:
-                        # Highlight deleted shape in Base Diff (it exists there)
-                        try:
-                            shape_del = ws_base_diff.shapes[item.location]
-                            shape_del.api.Line.ForeColor.RGB = COLOR_GREEN
-                            shape_del.api.Line.Weight = 2.5
-                            shape_del.api.Line.Visible = True
-                        except Exception as e:
-                            print(f"DEBUG: Deleted shape style failed: {e}")
-                     
-                    elif item.diff_type == DiffType.INSERTED:
-                        # Highlight inserted shape in Modified Diff
-                        try:
-                            shape_new = ws_mod_diff.shapes[item.location]
-                            shape_new.api.Line.ForeColor.RGB = COLOR_ORANGE
-                            shape_new.api.Line.Weight = 2.5
-                            shape_new.api.Line.Visible = True
-                        except Exception as e:
-                            print(f"DEBUG: Inserted shape style failed: {e}")
-                      
-                    elif item.diff_type == DiffType.MATCH:
-                        # Remove unchanged shapes from BOTH diff sheets
-                        try:
-                            ws_mod_diff.shapes[item.location].api.Delete()
-                        except: pass
-                        try:
-                            ws_base_diff.shapes[item.location].api.Delete()
-                        except: pass
+            # Cells are painted as coalesced ranges, per sheet and color
+            _paint(ws_mod_diff, h.inserted_cells, h.inserted_rows, COLOR_INSERTED)
+            _paint(ws_mod_diff, h.changed_new, (), COLOR_CHANGED)
+            _paint(ws_base_diff, h.changed_old, (), COLOR_CHANGED)
+            _paint(ws_base_diff, h.deleted_cells, h.deleted_rows, COLOR_DELETED)
+            _paint(ws_mod_diff, (), h.moved_new, COLOR_MOVED)
+            _paint(ws_base_diff, (), h.moved_old, COLOR_MOVED)
             
             # Save output
             wb_out.save(self.output_path)
@@ -180,4 +277,22 @@ class VisualReporter:
             
         finally:
             app.quit()
+        # Notes are added to the saved file, not with two AddComment calls per changed cell
+        self._add_notes(h)
+
+    def _add_notes(self, h: Highlights):
+        """
+        Adds the "Was:"/"Now:" notes to the saved report: its sheets are copied at the zip
+        level with the notes (as in native mode), so the time follows the number of notes
+        rather than one COM round-trip each.
+        """
+        notes_new, notes_old = _notes(h)
+        if not notes_new and not notes_old:
+            return
+        builder = WorkbookBuilder()
+        with XlsxPackage(self.output_path) as report:
+            parts = {name: builder.copy_sheet(report, name, name) for name in SHEET_NAMES}
+        builder.add_comments(parts["Modified Diff"], notes_new)
+        builder.add_comments(parts["Base Diff"], notes_old)
+        builder.save(self.output_path)
 
@@ -0,0 +1,943 @@
+import math
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr, unescape
+from openpyxl.formula.tokenizer import Tokenizer, Token, TokenizerError
+from openpyxl.formula.translate import Translator
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import column_index_from_string, coordinate_to_tuple
+from core.geometry import NS_XDR, NS_A, EMU_PER_POINT
+from core.xlsx_package import XlsxPackage, NS_MAIN, NS_DOC_REL, NS_PKG_REL
+
+NS_XML = '{http://www.w3.org/XML/1998/namespace}'
+REL_BASE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+
+CT_WORKBOOK = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml'
+CT_SHEET = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+CT_STYLES = 'application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml'
+CT_STRINGS = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml'
+CT_TABLE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.table+xml'
+CT_THEME = 'application/vnd.openxmlformats-officedocument.theme+xml'
+CT_RELS = 'application/vnd.openxmlformats-package.relationships+xml'
+CT_COMMENTS = 'application/vnd.openxmlformats-officedocument.spreadsheetml.comments+xml'
+CT_VML = 'application/vnd.openxmlformats-officedocument.vmlDrawing'
+
+# Deflate level of the output: sheet copies are large and repetitive, level 1 compresses them
+# several times faster than the default for a slightly larger file
+ZIP_LEVEL = 1
+
+XML_DECL = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Relationships of a copied sheet that are carried over. Others (pivot tables, slicers,
+# ActiveX controls, OLE objects) point into workbook-level parts that are not copied.
+SHEET_RELS = {'drawing', 'vmlDrawing', 'comments', 'table', 'hyperlink', 'image', 'printerSettings'}
+# Relationships of copied sub-parts (drawings, charts...) that are never followed
+SKIPPED_RELS = {'worksheet', 'chartsheet', 'officeDocument', 'pivotTable', 'pivotCacheDefinition',
+                'slicerCache', 'externalLink'}
+
+DEFAULT_FONT = '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+FILL_NONE = '<fill><patternFill patternType="none"/></fill>'
+FILL_GRAY = '<fill><patternFill patternType="gray125"/></fill>'
+BORDER_NONE = '<border><left/><right/><top/><bottom/><diagonal/></border>'
+XF_DEFAULT = {'numFmtId': '0', 'fontId': '0', 'fillId': '0', 'borderId': '0'}
+
+# Outline drawn around highlighted shapes (Line.Weight = 2.5 in the COM reporter)
+OUTLINE_WIDTH = int(2.5 * EMU_PER_POINT)
+
+# VML namespaces of the note boxes, with the prefixes Excel writes
+VML_NAMESPACES = (('v', 'urn:schemas-microsoft-com:vml'), ('o', 'urn:schemas-microsoft-com:office:office'),
+                  ('x', 'urn:schemas-microsoft-com:office:excel'))
+# Shape type of the VML boxes of cell notes
+VML_NOTE_TYPE = ('<{v}shapetype id="_x0000_t202" coordsize="21600,21600" {o}spt="202" path="m,l,21600r21600,l21600,xe">'
+                 '<{v}stroke joinstyle="miter"/><{v}path gradientshapeok="t" {o}connecttype="rect"/></{v}shapetype>')
+# Elements that follow <legacyDrawing> in a worksheet
+_AFTER_LEGACY = (b'legacyDrawingHF', b'drawingHF', b'picture', b'oleObjects', b'controls',
+                 b'webPublishItems', b'tableParts', b'extLst')
+
+_DOTALL = re.DOTALL
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _xml(elem) -> str:
+    """
+    SpreadsheetML element as markup without namespace prefixes (the output parts declare
+    the main namespace as default). extLst and children from other namespaces are left out.
+    """
+    parts = ['<', _local(elem.tag)]
+    for k, v in elem.attrib.items():
+        if k.startswith(NS_XML):
+            parts.append(f' xml:{k[len(NS_XML):]}={quoteattr(v)}')
+        elif not k.startswith('{'):
+            parts.append(f' {k}={quoteattr(v)}')
+    inner = [escape(elem.text or '')]
+    for child in elem:
+        if child.tag.startswith(f'{{{NS_MAIN}}}') and _local(child.tag) != 'extLst':
+            inner.append(_xml(child))
+        inner.append(escape(child.tail or ''))
+    inner = ''.join(inner)
+    parts.append(f'>{inner}</{_local(elem.tag)}>' if inner else '/>')
+    return ''.join(parts)
+
+
+def _solid_fill(rgb: str) -> str:
+    return f'<fill><patternFill patternType="solid"><fgColor rgb="FF{rgb}"/><bgColor indexed="64"/></patternFill></fill>'
+
+
+def _is_identity(mapping) -> bool:
+    return all(i == j for i, j in enumerate(mapping))
+
+
+class _Table:
+    """Style table (fonts, fills, borders): markup in output order, equal entries shared."""
+    def __init__(self):
+        self.items = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, markup: str) -> int:
+        idx = self._index.get(markup)
+        if idx is None:
+            idx = self._index[markup] = len(self.items)
+            self.items.append(markup)
+        return idx
+
+
+class _Styles:
+    """
+    styles.xml of the output: the style tables of every imported workbook, appended.
+    Cell formats (cellXfs) and differential formats (dxfs) of the first import keep their
+    indexes, so the first workbook's sheets are copied without renumbering their cells.
+    """
+    def __init__(self):
+        self.num_fmts = {} # format code -> id
+        self.fonts = _Table()
+        self.fills = _Table()
+        self.borders = _Table()
+        self.style_xfs = [] # cellStyleXfs: (attributes, children markup)
+        self.cell_xfs = []
+        self.dxfs = []
+        self._derived = {} # (base xf, font, fill) -> xf
+
+    def _ensure_defaults(self):
+        if not self.fonts:
+            self.fonts.add(DEFAULT_FONT)
+        if not self.fills:
+            self.fills.add(FILL_NONE)
+            self.fills.add(FILL_GRAY)
+        if not self.borders:
+            self.borders.add(BORDER_NONE)
+        if not self.style_xfs:
+            self.style_xfs.append((dict(XF_DEFAULT), ''))
+        if not self.cell_xfs:
+            self.cell_xfs.append((dict(XF_DEFAULT, xfId='0'), ''))
+
+    def _num_fmt(self, custom: dict, fmt_id: int) -> int:
+        code = custom.get(fmt_id)
+        if code is None:
+            return fmt_id # Built-in format
+        if code not in self.num_fmts:
+            self.num_fmts[code] = 164 + len(self.num_fmts)
+        return self.num_fmts[code]
+
+    def _xf(self, node, custom, font_map, fill_map, border_map, style_map=None):
+        def lookup(mapping, value):
+            idx = int(value)
+            return str(mapping[idx] if idx < len(mapping) else 0)
+
+        attrs = {}
+        for k, v in node.attrib.items():
+            if k.startswith('{'):
+                continue
+            if k == 'numFmtId':
+                v = str(self._num_fmt(custom, int(v)))
+            elif k == 'fontId':
+                v = lookup(font_map, v)
+            elif k == 'fillId':
+                v = lookup(fill_map, v)
+            elif k == 'borderId':
+                v = lookup(border_map, v)
+            elif k == 'xfId' and style_map is not None:
+                v = lookup(style_map, v)
+            attrs[k] = v
+        children = ''.join(_xml(c) for c in node if c.tag.startswith(f'{{{NS_MAIN}}}') and _local(c.tag) != 'extLst')
+        return attrs, children
+
+    def import_package(self, package: XlsxPackage):
+        """Appends the package's styles. Returns (cellXfs index map, dxfs index map)."""
+        xf_map, dxf_map = [], []
+        if 'xl/styles.xml' in package:
+            root = ET.fromstring(package.read('xl/styles.xml'))
+
+            def section(name):
+                node = root.find(f'{{{NS_MAIN}}}{name}')
+                return list(node) if node is not None else []
+
+            custom = {int(n.get('numFmtId')): n.get('formatCode') for n in section('numFmts')}
+            font_map = [self.fonts.add(_xml(n)) for n in section('fonts')]
+            fill_map = [self.fills.add(_xml(n)) for n in section('fills')]
+            border_map = [self.borders.add(_xml(n)) for n in section('borders')]
+            style_map = []
+            for node in section('cellStyleXfs'):
+                style_map.append(len(self.style_xfs))
+                self.style_xfs.append(self._xf(node, custom, font_map, fill_map, border_map))
+            for node in section('cellXfs'):
+                xf_map.append(len(self.cell_xfs))
+                self.cell_xfs.append(self._xf(node, custom, font_map, fill_map, border_map, style_map))
+            for node in section('dxfs'):
+                dxf_map.append(len(self.dxfs))
+                self.dxfs.append(_xml(node))
+        self._ensure_defaults()
+        return xf_map, dxf_map
+
+    def _derive(self, base: int, font: str = None, fill: str = None) -> int:
+        key = (base, font, fill)
+        idx = self._derived.get(key)
+        if idx is None:
+            self._ensure_defaults()
+            attrs, children = self.cell_xfs[base] if base < len(self.cell_xfs) else self.cell_xfs[0]
+            attrs = dict(attrs)
+            if font is not None:
+                attrs['fontId'] = str(self.fonts.add(font))
+                attrs['applyFont'] = '1'
+            if fill is not None:
+                attrs['fillId'] = str(self.fills.add(fill))
+                attrs['applyFill'] = '1'
+            idx = self._derived[key] = len(self.cell_xfs)
+            self.cell_xfs.append((attrs, children))
+        return idx
+
+    def font(self, font: str) -> int:
+        """Cell format with the given <font> markup."""
+        return self._derive(0, font=font)
+
+    def highlight(self, base: int, rgb: str) -> int:
+        """Cell format `base` with a solid `rgb` fill ("FF0000")."""
+        return self._derive(base, fill=_solid_fill(rgb))
+
+    def to_xml(self) -> bytes:
+        self._ensure_defaults()
+
+        def xfs(items):
+            out = []
+            for attrs, children in items:
+                attr = ''.join(f' {k}={quoteattr(v)}' for k, v in attrs.items())
+                out.append(f'<xf{attr}>{children}</xf>' if children else f'<xf{attr}/>')
+            return ''.join(out)
+
+        parts = [f'<styleSheet xmlns="{NS_MAIN}">']
+        if self.num_fmts:
+            fmts = ''.join(f'<numFmt numFmtId="{i}" formatCode={quoteattr(code)}/>' for code, i in self.num_fmts.items())
+            parts.append(f'<numFmts count="{len(self.num_fmts)}">{fmts}</numFmts>')
+        parts.append(f'<fonts count="{len(self.fonts)}">{"".join(self.fonts.items)}</fonts>')
+        parts.append(f'<fills count="{len(self.fills)}">{"".join(self.fills.items)}</fills>')
+        parts.append(f'<borders count="{len(self.borders)}">{"".join(self.borders.items)}</borders>')
+        parts.append(f'<cellStyleXfs count="{len(self.style_xfs)}">{xfs(self.style_xfs)}</cellStyleXfs>')
+        parts.append(f'<cellXfs count="{len(self.cell_xfs)}">{xfs(self.cell_xfs)}</cellXfs>')
+        parts.append('<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>')
+        if self.dxfs:
+            parts.append(f'<dxfs count="{len(self.dxfs)}">{"".join(self.dxfs)}</dxfs>')
+        parts.append('</styleSheet>')
+        return XML_DECL + ''.join(parts).encode('utf-8')
+
+
+# --- Sheet XML patches (bytes, the sheet is never parsed as a whole) ---
+
+_STYLE_ATTR = re.compile(rb'(\s(?:s|style)=")(\d+)"')
+_DXF_ATTR = re.compile(rb'(\sdxfId=")(\d+)"')
+_ROW_NUM = re.compile(rb'\sr="(\d+)"')
+_CELL_REF = re.compile(rb'\sr="([A-Z]+)(\d+)"')
+_CELL_STYLE = re.compile(rb'\ss="(\d+)"')
+_TAB_SELECTED = re.compile(rb'\stabSelected="(?:1|true)"')
+_ALTERNATE = re.compile(rb'<(\w+):AlternateContent\b.*?</\1:AlternateContent>', _DOTALL)
+_REL_ID = re.compile(rb'\s\w+:id="([^"]*)"')
+
+
+def _prefix(data: bytes) -> bytes:
+    # Namespace prefix of the SpreadsheetML elements ('' for the usual default namespace)
+    m = re.search(rb'<(\w+:)?worksheet\b', data)
+    return (m.group(1) or b'') if m else b''
+
+
+def _split_sheet(data: bytes, p: bytes):
+    """(head, sheetData content, tail) of a sheet part; head ends with the <sheetData> start tag."""
+    start = data.find(b'<%ssheetData' % p)
+    if start < 0:
+        return data, b'', b''
+    open_end = data.index(b'>', start) + 1
+    close_tag = b'</%ssheetData>' % p
+    if data[open_end - 2:open_end] == b'/>':
+        return data[:open_end - 2] + b'>', b'', close_tag + data[open_end:]
+    close = data.index(close_tag, open_end)
+    return data[:open_end], data[open_end:close], data[close:]
+
+
+# A1 references of the sheet itself: cells, ranges, whole columns and rows
+_LOCAL_REF = re.compile(r'^\$?[A-Z]{1,3}\$?\d+(?::\$?[A-Z]{1,3}\$?\d+)?$|^\$?[A-Z]{1,3}:\$?[A-Z]{1,3}$|^\$?\d+:\$?\d+$')
+
+_CELL_TOKEN = re.compile(r'\$?\b[A-Z]{1,3}\$?\d+\b')
+
+
+def _is_local(formula: str, cache: dict) -> bool:
+    """
+    True if the formula only refers to cells of its own sheet, so that it still works in a copy.
+    Other sheets, defined names, table references and external links are not copied.
+    """
+    # Filled-down formulas differ only in their cell references: tokenized once per shape
+    shape = _CELL_TOKEN.sub('A1', formula)
+    local = cache.get(shape)
+    if local is None:
+        try:
+            local = all(_LOCAL_REF.match(t.value) for t in Tokenizer(shape).items
+                        if t.type == Token.OPERAND and t.subtype == Token.RANGE)
+        except TokenizerError:
+            local = False # Not parsable: treated as foreign
+        cache[shape] = local
+    return local
+
+
+def _clean_formulas(body: bytes, p: bytes) -> bytes:
+    """
+    Formula cells of a copied sheet. Formulas that only refer to their own sheet are kept.
+    Others are dropped for their cached value; without one, the cell shows the formula text
+    (files written by openpyxl have no cached values), rather than an empty cell.
+    """
+    local = {}
+    masters = {} # Shared formula index -> (master cell, formula text)
+    for m in re.finditer(rb'<%sc\b[^>/]*?\sr="([A-Z]+\d+)"[^>/]*>(?:(?!</%sc>).)*?<%sf\b([^>]*?\st="shared"[^>]*)>([^<]+)</%sf>'
+                         % (p, p, p, p), body, _DOTALL):
+        si = re.search(rb'\ssi="(\d+)"', m.group(2))
+        if si:
+            masters[si.group(1)] = (m.group(1).decode('ascii'), unescape(m.group(3).decode('utf-8')))
+    f_pattern = re.compile(rb'<%sf\b([^>]*?)(?:/>|>(.*?)</%sf>)' % (p, p), _DOTALL)
+    v_pattern = re.compile(rb'<%sv>(.*?)</%sv>' % (p, p), _DOTALL)
+
+    def cell(m):
+        inner = m.group(2)
+        f = f_pattern.search(inner)
+        if f is None:
+            return m.group(0)
+        attrs = f.group(1)
+        text = unescape(f.group(2).decode('utf-8')) if f.group(2) else None
+        ref = re.search(rb'\sr="([A-Z]+\d+)"', m.group(1))
+        if b'shared' in attrs and text is None:
+            si = re.search(rb'\ssi="(\d+)"', attrs)
+            master = masters.get(si.group(1)) if si else None
+            if master and ref:
+                text = Translator('=' + master[1], origin=master[0]).translate_formula(ref.group(1).decode('ascii'))[1:]
+        if text is not None and b'dataTable' not in attrs and _is_local('=' + text, local):
+            return m.group(0)
+        inner = inner[:f.start()] + inner[f.end():]
+        v = v_pattern.search(inner)
+        if (v is None or not v.group(1)) and text is not None:
+            attrs = re.sub(rb'\st="[^"]*"', b'', m.group(1))
+            return b'<%sc%s t="inlineStr"><%sis><%st xml:space="preserve">%s</%st></%sis></%sc>' % (
+                p, attrs, p, p, escape('=' + text).encode('utf-8'), p, p, p)
+        return b'<%sc%s>%s</%sc>' % (p, m.group(1), inner, p)
+    return re.sub(rb'<%sc\b([^>/]*)>(.*?)</%sc>' % (p, p), cell, body, flags=_DOTALL)
+
+
+def _clean_sheet(data: bytes, p: bytes) -> bytes:
+    """
+    Makes a sheet part self-contained: formulas referring to other sheets or names are replaced
+    by their cached values (see _clean_formulas), formula strings without a formula become
+    inline strings, and data validations, ActiveX/OLE blocks and extension lists go.
+    """
+    head, body, tail = _split_sheet(data, p)
+    if b'<%sf' % p in body:
+        body = _clean_formulas(body, p)
+
+    def inline(m):
+        if b'<%sf' % p in m.group(3):
+            return m.group(0) # Kept formula: t="str" is its result type
+        v = re.search(rb'<%sv>(.*?)</%sv>' % (p, p), m.group(3), _DOTALL)
+        if v is None:
+            return b'<%sc%s%s/>' % (p, m.group(1), m.group(2))
+        return (b'<%sc%s t="inlineStr"%s><%sis><%st xml:space="preserve">%s</%st></%sis></%sc>'
+                % (p, m.group(1), m.group(2), p, p, v.group(1), p, p, p))
+    if b't="str"' in body:
+        body = re.sub(rb'<%sc\b([^>/]*?)\st="str"([^>/]*)>(.*?)</%sc>' % (p, p), inline, body, flags=_DOTALL)
+
+    head = _TAB_SELECTED.sub(b'', head)
+    for name in (b'dataValidations', b'extLst', b'oleObjects', b'controls'):
+        if b'<%s%s' % (p, name) in tail:
+            tail = re.sub(rb'<%s%s\b[^>]*?(?:/>|>.*?</%s%s>)' % (p, name, p, name), b'', tail, flags=_DOTALL)
+    return head + body + _ALTERNATE.sub(b'', tail)
+
+
+def _remap_sheet(data: bytes, p: bytes, xf_map, dxf_map, string_offset: int) -> bytes:
+    """Renumbers cell/row/column formats, differential formats and shared string indexes."""
+    head, body, tail = _split_sheet(data, p)
+    xf_bytes = [b'%d' % i for i in xf_map]
+
+    def style(m):
+        idx = int(m.group(2))
+        return m.group(1) + (xf_bytes[idx] if idx < len(xf_bytes) else b'0') + b'"'
+
+    head = re.sub(rb'<%scol\b[^>]*>' % p, lambda m: _STYLE_ATTR.sub(style, m.group(0)), head)
+    body = re.sub(rb'(<%s(?:c|row)\b[^>]*?\ss=")(\d+)"' % p, style, body)
+    if string_offset:
+        body = re.sub(rb'(<%sc\b[^>/]*\st="s"[^>/]*>\s*<%sv>)(\d+)' % (p, p),
+                      lambda m: b'%s%d' % (m.group(1), int(m.group(2)) + string_offset), body)
+
+    def dxf(m):
+        idx = int(m.group(2))
+        return b'%s%d"' % (m.group(1), dxf_map[idx] if idx < len(dxf_map) else 0)
+    return head + body + _DXF_ATTR.sub(dxf, tail)
+
+
+def _drop_dangling(data: bytes, p: bytes, rel_ids) -> bytes:
+    # Elements pointing to relationships that were not copied (they all follow sheetData)
+    head, body, tail = _split_sheet(data, p)
+    for rid in set(m.group(1) for m in _REL_ID.finditer(tail)) - set(rel_ids):
+        quoted = re.escape(rid.decode('utf-8'))
+        tail = re.sub(rb'<[^<>]*\s\w+:id="%s"[^<>]*/>' % quoted.encode('utf-8'), b'', tail)
+    return head + body + tail
+
+
+def _set_style(tag: bytes, style: int) -> bytes:
+    # tag: a <c ...> / <row ...> start tag, self-closing or not
+    if _CELL_STYLE.search(tag):
+        return _CELL_STYLE.sub(b' s="%d"' % style, tag, count=1)
+    end = -2 if tag.endswith(b'/>') else -1
+    return tag[:end] + b' s="%d"' % style + tag[end:]
+
+
+def _patch_fills(data: bytes, p: bytes, cell_fills: dict, row_fills: dict, highlight) -> bytes:
+    """
+    Applies fills to (row, col) -> rgb cells and row -> rgb whole rows. Only the rows that
+    get a fill are rewritten: the work follows the number of highlights, not the sheet size.
+    highlight(format index, rgb) -> format index of the same format with the fill.
+    """
+    by_row = {}
+    for (r, c), rgb in cell_fills.items():
+        by_row.setdefault(r, {})[c] = rgb
+    for r in row_fills:
+        by_row.setdefault(r, {})
+    if not by_row:
+        return data
+
+    head, body, tail = _split_sheet(data, p)
+    if not tail:
+        return data # No sheetData
+
+    cell_pattern = re.compile(rb'<%sc\b[^>]*?(?:/>|>.*?</%sc>)' % (p, p), _DOTALL)
+    row_close = b'</%srow>' % p
+
+    def empty_cell(r, c, rgb):
+        return b'<%sc r="%s%d" s="%d"/>' % (p, get_column_letter(c).encode('ascii'), r, highlight(0, rgb))
+
+    def patch_row(r, start_tag, inner):
+        cols = by_row[r]
+        row_rgb = row_fills.get(r)
+        if row_rgb:
+            m = _CELL_STYLE.search(start_tag)
+            start_tag = _set_style(start_tag, highlight(int(m.group(1)) if m else 0, row_rgb))
+            if b'customFormat=' not in start_tag:
+                start_tag = start_tag[:-1] + b' customFormat="1">'
+        out, pos, col = [start_tag], 0, 0
+        missing = sorted(cols)
+        for m in cell_pattern.finditer(inner):
+            cell = m.group(0)
+            tag_end = cell.index(b'>') + 1
+            tag = cell[:tag_end]
+            ref = _CELL_REF.search(tag)
+            col = column_index_from_string(ref.group(1).decode('ascii')) if ref else col + 1
+            out.append(inner[pos:m.start()])
+            # Cells that do not exist yet are inserted in column order
+            while missing and missing[0] < col:
+                c = missing.pop(0)
+                out.append(empty_cell(r, c, cols[c]))
+            if missing and missing[0] == col:
+                missing.pop(0)
+            rgb = cols.get(col) or row_rgb
+            if rgb:
+                m_style = _CELL_STYLE.search(tag)
+                tag = _set_style(tag, highlight(int(m_style.group(1)) if m_style else 0, rgb))
+            out.append(tag + cell[tag_end:])
+            pos = m.end()
+        out.append(inner[pos:])
+        out.extend(empty_cell(r, c, cols[c]) for c in missing)
+        out.append(row_close)
+        return b''.join(out)
+
+    targets = sorted(by_row)
+    out, pos, row_idx, i = [head], 0, 0, 0
+    for m in re.finditer(rb'<%srow\b[^>]*>' % p, body):
+        tag = m.group(0)
+        num = _ROW_NUM.search(tag)
+        row_idx = int(num.group(1)) if num else row_idx + 1
+        while i < len(targets) and targets[i] < row_idx: # Rows that do not exist yet
+            out.append(body[pos:m.start()])
+            pos = m.start()
+            out.append(patch_row(targets[i], b'<%srow r="%d">' % (p, targets[i]), b''))
+            i += 1
+        if i < len(targets) and targets[i] == row_idx:
+            if tag.endswith(b'/>'):
+                end, inner = m.end(), b''
+                tag = tag[:-2] + b'>'
+            else:
+                close = body.index(row_close, m.end())
+                end, inner = close + len(row_close), body[m.end():close]
+            out.append(body[pos:m.start()])
+            out.append(patch_row(row_idx, tag, inner))
+            pos = end
+            i += 1
+        if i == len(targets):
+            break
+    out.append(body[pos:])
+    out.extend(patch_row(r, b'<%srow r="%d">' % (p, r), b'') for r in targets[i:])
+    out.append(tail)
+    return b''.join(out)
+
+
+def _ns_prefix(data: bytes, uri: str):
+    # Prefix bound to the namespace in a part (b'' if it is the default namespace, None if absent)
+    uri = re.escape(uri.encode('utf-8'))
+    m = re.search(rb'xmlns:(\w+)="%s"' % uri, data)
+    if m:
+        return m.group(1) + b':'
+    return b'' if re.search(rb'xmlns="%s"' % uri, data) else None
+
+
+def _outline(sp_pr: bytes, x: bytes, a: bytes, rgb: str, width: int) -> bytes:
+    """<xdr:spPr> with its outline (<a:ln>) replaced by a solid `rgb` line."""
+    ln = b'<%sln w="%d"><%ssolidFill><%ssrgbClr val="%s"/></%ssolidFill></%sln>' % (
+        a, width, a, a, rgb.encode('ascii'), a, a)
+    if sp_pr.endswith(b'/>'):
+        return sp_pr[:-2] + b'>' + ln + b'</%sspPr>' % x
+    sp_pr = re.sub(rb'<%sln\b[^>]*?(?:/>|>.*?</%sln>)' % (a, a), b'', sp_pr, flags=_DOTALL)
+    # The outline follows the geometry and the fill, and precedes the effects
+    m = re.search(rb'<%s(?:effectLst|effectDag|scene3d|sp3d|extLst)\b' % a, sp_pr)
+    pos = m.start() if m else sp_pr.rindex(b'</')
+    return sp_pr[:pos] + ln + sp_pr[pos:]
+
+
+def _patch_drawing(data: bytes, lines: dict, drop=(), width: int = OUTLINE_WIDTH) -> bytes:
+    """
+    Patches the top-level shapes of a DrawingML part by name (as ws.Shapes(name)):
+    lines: name -> rgb outline (every shape of a group gets it), drop: names of shapes removed.
+    """
+    x = _ns_prefix(data, NS_XDR)
+    a = _ns_prefix(data, NS_A)
+    if x is None:
+        return data
+    if a is None:
+        lines = {} # No DrawingML namespace to write <a:ln> with
+    name_pattern = re.compile(rb'<%scNvPr\b[^>]*?\sname="([^"]*)"' % x)
+    sp_pr_pattern = re.compile(rb'<%sspPr\b[^>]*?(?:/>|>.*?</%sspPr>)' % (x, x), _DOTALL)
+
+    def anchor(m):
+        block = m.group(0)
+        found = name_pattern.search(block)
+        name = unescape(found.group(1).decode('utf-8'), {'&quot;': '"', '&apos;': "'"}) if found else None
+        if name in drop:
+            return b''
+        rgb = lines.get(name)
+        if rgb:
+            block = sp_pr_pattern.sub(lambda s: _outline(s.group(0), x, a, rgb, width), block)
+        return block
+    return re.sub(rb'<%s(twoCellAnchor|oneCellAnchor|absoluteAnchor)\b.*?</%s\1>' % (x, x),
+                  anchor, data, flags=_DOTALL)
+
+
+def _vml_prefixes(data: bytes):
+    """
+    (data, {'v': 'v:', 'o': ..., 'x': ...}): the prefixes a VML part binds to the VML, Office and
+    Excel namespaces (files saved by openpyxl use ns0, ns1...). A namespace without a prefix
+    is declared on the root element.
+    """
+    prefixes = {}
+    for name, uri in VML_NAMESPACES:
+        prefix = _ns_prefix(data, uri)
+        if not prefix: # Absent, or the default namespace (attributes need a prefix)
+            prefix, n = name.encode('ascii'), 0
+            while re.search(rb'xmlns:%s=' % prefix, data):
+                n += 1
+                prefix = b'%s%d' % (name.encode('ascii'), n)
+            data = re.sub(rb'<xml\b', b'<xml xmlns:%s="%s"' % (prefix, uri.encode('ascii')), data, count=1)
+            prefix += b':'
+        prefixes[name] = prefix.decode('ascii')
+    return data, prefixes
+
+
+def _vml_note(spid: int, row: int, col: int, v: str = 'v:', o: str = 'o:', x: str = 'x:') -> str:
+    # Hidden note box of cell (row, col), opening to the right of the cell as Excel places it
+    return (f'<{v}shape id="_x0000_s{spid}" type="#_x0000_t202" style="position:absolute;margin-left:59.25pt;'
+            'margin-top:1.5pt;width:108pt;height:59.25pt;z-index:1;visibility:hidden" fillcolor="#ffffe1" '
+            f'{o}insetmode="auto"><{v}fill color2="#ffffe1"/><{v}shadow on="t" color="black" obscured="t"/>'
+            f'<{v}path {o}connecttype="none"/><{v}textbox style="mso-direction-alt:auto"><div style="text-align:left"/>'
+            f'</{v}textbox><{x}ClientData ObjectType="Note"><{x}MoveWithCells/><{x}SizeWithCells/>'
+            f'<{x}Anchor>{col}, 15, {max(row - 2, 0)}, 10, {col + 2}, 15, {row + 3}, 4</{x}Anchor>'
+            f'<{x}AutoFill>False</{x}AutoFill><{x}Row>{row - 1}</{x}Row><{x}Column>{col - 1}</{x}Column>'
+            f'</{x}ClientData></{v}shape>')
+
+
+def _insert_child(data: bytes, parent: bytes, markup: bytes) -> bytes:
+    """Appends markup as the last children of the first `parent` element (prefixed tag name)."""
+    close = data.find(b'</%s>' % parent)
+    if close >= 0:
+        return data[:close] + markup + data[close:]
+    m = re.search(rb'<%s\b[^>]*/>' % re.escape(parent), data)
+    if m:
+        return data[:m.end() - 2] + b'>' + markup + b'</%s>' % parent + data[m.end():]
+    return None
+
+
+def _add_legacy_drawing(data: bytes, p: bytes, rid: str) -> bytes:
+    """Sheet part with a <legacyDrawing> (the VML of its notes) at its schema position."""
+    tag = b'<%slegacyDrawing xmlns:r="%s" r:id="%s"/>' % (p, NS_DOC_REL.encode('ascii'), rid.encode('ascii'))
+    start = max(data.rfind(b'</%ssheetData>' % p), 0)
+    m = re.compile(rb'<%s(?:%s)\b' % (p, b'|'.join(_AFTER_LEGACY))).search(data, start)
+    pos = m.start() if m else data.rindex(b'</%sworksheet>' % p)
+    return data[:pos] + tag + data[pos:]
+
+
+class WorkbookBuilder:
+    """
+    Writes an .xlsx at the zip level, without Excel: copies of sheets from existing workbooks
+    plus new table sheets.
+    A copied sheet keeps its XML; the style and shared string tables of its workbook are
+    merged into the output (cells renumbered as needed), and its drawing, comments, tables,
+    images and charts are copied with their relationships under new part names.
+    """
+    def __init__(self):
+        self.parts = {} # part -> bytes
+        self.content_types = {} # part -> content type
+        self.rels = {} # part -> [(id, type, target part or URL, external)], written on save
+        self.sheets = [] # (title, part), in workbook order
+        self.styles = _Styles()
+        self.strings = [] # <si> markup
+        self.theme = None
+        self._imports = {} # workbook path -> (xf map, dxf map, shared string offset)
+        self._counters = {}
+        self._table_id = 0
+        self._vml_block = 100
+
+    # --- Parts ---
+
+    def _new_part(self, folder: str, stem: str, ext: str) -> str:
+        n = self._counters[(folder, stem)] = self._counters.get((folder, stem), 0) + 1
+        return f"{folder}/{stem}{n}{ext}"
+
+    def _add_part(self, part: str, data: bytes, content_type: str = None):
+        self.parts[part] = data
+        if content_type:
+            self.content_types[part] = content_type
+
+    def _add_rels(self, part: str, rels):
+        if rels:
+            self.rels[part] = list(rels)
+
+    @staticmethod
+    def _rels_xml(part: str, rels):
+        # rels: (id, type, target part or external URL, external) -> (rels part, content)
+        folder, name = posixpath.split(part)
+        out = [f'<Relationships xmlns="{NS_PKG_REL}">']
+        for rid, rel_type, target, external in rels:
+            if external:
+                out.append(f'<Relationship Id={quoteattr(rid)} Type={quoteattr(rel_type)} '
+                           f'Target={quoteattr(target)} TargetMode="External"/>')
+            else:
+                target = posixpath.relpath(target, folder)
+                out.append(f'<Relationship Id={quoteattr(rid)} Type={quoteattr(rel_type)} Target={quoteattr(target)}/>')
+        out.append('</Relationships>')
+        return posixpath.join(folder, '_rels', name + '.rels'), XML_DECL + ''.join(out).encode('utf-8')
+
+    def _copy_part(self, package: XlsxPackage, part: str, copied: dict) -> str:
+        """Copies a part and, recursively, the parts it refers to. Returns the new part name."""
+        if part in copied:
+            return copied[part]
+        folder, name = posixpath.split(part)
+        stem, ext = posixpath.splitext(name)
+        new = copied[part] = self._new_part(folder, stem.rstrip('0123456789') or 'part', ext)
+        content_type = package.content_type(part)
+        data = package.zip.read(part)
+        if content_type == CT_TABLE:
+            # Table ids and names are unique per workbook
+            self._table_id += 1
+            def root(m):
+                tag = re.sub(rb'(\sid=")\d+"', b'\\g<1>%d"' % self._table_id, m.group(0), count=1)
+                return re.sub(rb'(\s(?:name|displayName)=")[^"]*"', b'\\g<1>Table%d"' % self._table_id, tag)
+            data = re.sub(rb'<(\w+:)?table\b[^>]*>', root, data, count=1)
+        self._add_part(new, data, content_type)
+
+        rels = []
+        for rid, rel_type, target, external in package.list_rels(part):
+            if external:
+                rels.append((rid, rel_type, target, True))
+            elif rel_type.rsplit('/', 1)[-1] not in SKIPPED_RELS and target in package:
+                rels.append((rid, rel_type, self._copy_part(package, target, copied), False))
+        self._add_rels(new, rels)
+        return new
+
+    def _import(self, package: XlsxPackage):
+        key = package.filepath
+        if key not in self._imports:
+            xf_map, dxf_map = self.styles.import_package(package)
+            offset = len(self.strings)
+            if 'xl/sharedStrings.xml' in package:
+                with package.zip.open('xl/sharedStrings.xml') as f:
+                    for _, elem in ET.iterparse(f):
+                        if elem.tag == f'{{{NS_MAIN}}}si':
+                            self.strings.append(_xml(elem))
+                            elem.clear()
+            if self.theme is None:
+                for rel_type, target in package.read_rels('xl/workbook.xml').values():
+                    if rel_type and rel_type.endswith('/theme') and target in package:
+                        self.theme = package.read(target)
+            self._imports[key] = (xf_map, dxf_map, offset)
+        return self._imports[key]
+
+    def _place(self, title: str, part: str, position: int = None):
+        if position is None:
+            self.sheets.append((title, part))
+        else:
+            self.sheets.insert(position, (title, part))
+
+    # --- Sheets ---
+
+    def copy_sheet(self, package: XlsxPackage, sheet_name: str, title: str,
+                   cell_fills: dict = None, row_fills: dict = None, shape_lines: dict = None,
+                   drop_shapes=(), position: int = None) -> str:
+        """
+        Adds a copy of a sheet (None: the active sheet) as `title`.
+        cell_fills: (row, col) -> rgb and row_fills: row -> rgb are painted on the copy,
+        shape_lines: shape name -> rgb outlines shapes, drop_shapes are left out of the copy.
+        Returns the new sheet part.
+        """
+        xf_map, dxf_map, offset = self._import(package)
+        part = package.sheet_part(sheet_name)
+        data = package.zip.read(part)
+        p = _prefix(data)
+        data = _clean_sheet(data, p)
+        if offset or not _is_identity(xf_map) or not _is_identity(dxf_map):
+            data = _remap_sheet(data, p, xf_map, dxf_map, offset)
+
+        new = self._new_part('xl/worksheets', 'sheet', '.xml')
+        copied = {}
+        rels = []
+        for rid, rel_type, target, external in package.list_rels(part):
+            if rel_type.rsplit('/', 1)[-1] not in SHEET_RELS:
+                continue
+            if external:
+                rels.append((rid, rel_type, target, True))
+            elif target in package:
+                target = self._copy_part(package, target, copied)
+                if (shape_lines or drop_shapes) and rel_type.endswith('/drawing'):
+                    self.parts[target] = _patch_drawing(self.parts[target], shape_lines or {}, set(drop_shapes))
+                rels.append((rid, rel_type, target, False))
+        data = _drop_dangling(data, p, [r[0].encode('utf-8') for r in rels])
+        if cell_fills or row_fills:
+            data = _patch_fills(data, p, cell_fills or {}, row_fills or {}, self.styles.highlight)
+
+        self._add_part(new, data, CT_SHEET)
+        self._add_rels(new, rels)
+        self._place(title, new, position)
+        return new
+
+    def add_sheet(self, title: str, rows, table_style: str = None, font: str = None,
+                  link_font: str = None, position: int = None) -> str:
+        """
+        Adds a sheet with the given rows of values. =HYPERLINK(...) strings (ranges.hyperlink_formula)
+        are written as formulas in link_font; any other string is text, even with a leading "=".
+        With table_style the first row is the header of a native table over the whole data.
+        """
+        style = self.styles.font(font) if font else 0
+        link_style = self.styles.font(link_font) if link_font else style
+        widths = {}
+        out = []
+        for r, values in enumerate(rows, 1):
+            cells = []
+            for c, value in enumerate(values, 1):
+                ref = f"{get_column_letter(c)}{r}"
+                if value is None or value == "":
+                    continue
+                if isinstance(value, bool):
+                    cells.append(f'<c r="{ref}" s="{style}" t="b"><v>{int(value)}</v></c>')
+                    text = str(value)
+                elif isinstance(value, (int, float)) and math.isfinite(value):
+                    cells.append(f'<c r="{ref}" s="{style}"><v>{value!r}</v></c>')
+                    text = str(value)
+                else:
+                    text = str(value)
+                    if text.startswith("=HYPERLINK("):
+                        cells.append(f'<c r="{ref}" s="{link_style}" t="str"><f>{escape(text[1:])}</f></c>')
+                        text = text.rsplit('"', 2)[-2] if text.count('"') >= 2 else text # Display text of HYPERLINK
+                    else:
+                        cells.append(f'<c r="{ref}" s="{style}" t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>')
+                widths[c] = max(widths.get(c, 0), len(text))
+            out.append(f'<row r="{r}">{"".join(cells)}</row>')
+        n_rows = len(out)
+        n_cols = max(widths) if widths else 1
+
+        new = self._new_part('xl/worksheets', 'sheet', '.xml')
+        cols = ''.join(f'<col min="{c}" max="{c}" width="{min(w + 3, 60)}" customWidth="1"/>' for c, w in sorted(widths.items()))
+        xml = [f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_DOC_REL}">',
+               f'<dimension ref="A1:{get_column_letter(n_cols)}{max(n_rows, 1)}"/>',
+               '<sheetViews><sheetView workbookViewId="0"/></sheetViews>',
+               '<sheetFormatPr defaultRowHeight="15"/>',
+               f'<cols>{cols}</cols>' if cols else '',
+               f'<sheetData>{"".join(out)}</sheetData>']
+        rels = []
+        if table_style and n_rows > 1:
+            self._table_id += 1
+            ref = f"A1:{get_column_letter(len(rows[0]))}{n_rows}"
+            columns = ''.join(f'<tableColumn id="{i}" name={quoteattr(str(h))}/>' for i, h in enumerate(rows[0], 1))
+            table = (f'<table xmlns="{NS_MAIN}" id="{self._table_id}" name="Table{self._table_id}" '
+                     f'displayName="Table{self._table_id}" ref="{ref}" totalsRowShown="0">'
+                     f'<autoFilter ref="{ref}"/><tableColumns count="{len(rows[0])}">{columns}</tableColumns>'
+                     f'<tableStyleInfo name={quoteattr(table_style)} showFirstColumn="0" showLastColumn="0" '
+                     f'showRowStripes="1" showColumnStripes="0"/></table>')
+            table_part = self._new_part('xl/tables', 'table', '.xml')
+            self._add_part(table_part, XML_DECL + table.encode('utf-8'), CT_TABLE)
+            rels.append(('rId1', REL_BASE + 'table', table_part, False))
+            xml.append('<tableParts count="1"><tablePart r:id="rId1"/></tableParts>')
+        xml.append('</worksheet>')
+
+        self._add_part(new, XML_DECL + ''.join(xml).encode('utf-8'), CT_SHEET)
+        self._add_rels(new, rels)
+        self._place(title, new, position)
+        return new
+
+    def add_comments(self, sheet_part: str, comments: dict, author: str = "ExcelDiff"):
+        """
+        Adds notes to a sheet of the output: (row, col) -> text. They join the comments and
+        VML drawing the sheet was copied with, if any; cells that already have a comment keep it.
+        """
+        rels = self.rels.setdefault(sheet_part, [])
+        targets = {t.rsplit('/', 1)[-1]: target for _, t, target, external in rels if not external}
+        rel_ids = {r[0] for r in rels}
+
+        def new_rel(rel_type, target):
+            n = len(rel_ids) + 1
+            while f"rId{n}" in rel_ids:
+                n += 1
+            rel_ids.add(f"rId{n}")
+            rels.append((f"rId{n}", REL_BASE + rel_type, target, False))
+            return f"rId{n}"
+
+        # --- Comments part ---
+        comments_part = targets.get('comments')
+        data = self.parts[comments_part] if comments_part else None
+        c = (_ns_prefix(data, NS_MAIN) or b'') if data else b''
+        if data:
+            taken = {coordinate_to_tuple(ref.decode('ascii'))
+                     for ref in re.findall(rb'<%scomment\b[^>]*?\sref="([A-Z]+\d+)"' % c, data)}
+            comments = {cell: text for cell, text in comments.items() if cell not in taken}
+        if not comments:
+            return
+        cells = sorted(comments)
+        author_id = len(re.findall(rb'<%sauthor\b' % c, data)) if data else 0
+        author_xml = b'<%sauthor>%s</%sauthor>' % (c, escape(author).encode('utf-8'), c)
+        items = b''.join(
+            b'<%scomment ref="%s" authorId="%d"><%stext><%st xml:space="preserve">%s</%st></%stext></%scomment>' % (
+                c, f"{get_column_letter(col)}{row}".encode('ascii'), author_id, c, c,
+                escape(str(comments[(row, col)])).encode('utf-8'), c, c, c)
+            for row, col in cells)
+        if data:
+            data = _insert_child(data, b'%sauthors' % c, author_xml) or data
+            data = _insert_child(data, b'%scommentList' % c, items) or data
+            self.parts[comments_part] = data
+        else:
+            comments_part = self._new_part('xl', 'comments', '.xml')
+            self._add_part(comments_part, XML_DECL + b'<comments xmlns="%s"><authors>%s</authors><commentList>%s</commentList></comments>' % (
+                NS_MAIN.encode('ascii'), author_xml, items), CT_COMMENTS)
+            new_rel('comments', comments_part)
+
+        # --- VML boxes; shape ids come from id blocks (1024 each) not used by copied drawings ---
+        blocks = []
+        for _ in range(len(cells) // 1023 + 1):
+            self._vml_block += 1
+            blocks.append(self._vml_block)
+        block_list = ",".join(map(str, blocks))
+        vml_part = targets.get('vmlDrawing')
+        new_vml = vml_part is None
+        if not new_vml:
+            data, ns = _vml_prefixes(self.parts[vml_part])
+            o = re.escape(ns['o'].encode('ascii'))
+            idmap = re.compile(rb'(<%sidmap\b[^>]*?\sdata=")([^"]*)"' % o)
+            if idmap.search(data):
+                data = idmap.sub(lambda m: m.group(1) + m.group(2) + b',' + block_list.encode('ascii') + b'"', data, count=1)
+            else:
+                layout = '<{o}shapelayout {v}ext="edit"><{o}idmap {v}ext="edit" data="{blocks}"/></{o}shapelayout>'.format(
+                    blocks=block_list, **ns)
+                root_end = data.index(b'>', data.index(b'<xml')) + 1
+                data = data[:root_end] + layout.encode('utf-8') + data[root_end:]
+            markup = VML_NOTE_TYPE.format(**ns) if b'"_x0000_t202"' not in data else ''
+        else:
+            vml_part = self._new_part('xl/drawings', 'vmlDrawing', '.vml')
+            ns = {name: name + ':' for name, _ in VML_NAMESPACES}
+            data = ('<xml %s><o:shapelayout v:ext="edit"><o:idmap v:ext="edit" data="%s"/></o:shapelayout></xml>' % (
+                ' '.join(f'xmlns:{name}="{uri}"' for name, uri in VML_NAMESPACES), block_list)).encode('utf-8')
+            markup = VML_NOTE_TYPE.format(**ns)
+        markup += ''.join(_vml_note(blocks[i // 1023] * 1024 + i % 1023 + 1, row, col, **ns)
+                          for i, (row, col) in enumerate(cells))
+        end = data.rindex(b'</xml>')
+        self.parts[vml_part] = data[:end] + markup.encode('utf-8') + data[end:]
+        if new_vml:
+            self.content_types[vml_part] = CT_VML
+            rid = new_rel('vmlDrawing', vml_part)
+            sheet = self.parts[sheet_part]
+            self.parts[sheet_part] = _add_legacy_drawing(sheet, _prefix(sheet), rid)
+
+    # --- Output ---
+
+    def save(self, path: str):
+        if not self.sheets:
+            raise ValueError("A workbook needs at least one sheet")
+        parts = dict(self.parts)
+        for part, part_rels in self.rels.items():
+            rels_part, data = self._rels_xml(part, part_rels)
+            parts[rels_part] = data
+
+        # The first sheet is the selected one
+        first = self.sheets[0][1]
+        parts[first] = re.sub(rb'(<(?:\w+:)?sheetView\b)', rb'\1 tabSelected="1"', parts[first], count=1)
+
+        rels = []
+        sheets = []
+        for i, (title, part) in enumerate(self.sheets, 1):
+            rels.append((f"rId{i}", REL_BASE + 'worksheet', part, False))
+            sheets.append(f'<sheet name={quoteattr(title)} sheetId="{i}" r:id="rId{i}"/>')
+        parts['xl/styles.xml'] = self.styles.to_xml()
+        self.content_types['xl/styles.xml'] = CT_STYLES
+        rels.append((f"rId{len(rels) + 1}", REL_BASE + 'styles', 'xl/styles.xml', False))
+        if self.strings:
+            sst = f'<sst xmlns="{NS_MAIN}" uniqueCount="{len(self.strings)}">{"".join(self.strings)}</sst>'
+            parts['xl/sharedStrings.xml'] = XML_DECL + sst.encode('utf-8')
+            self.content_types['xl/sharedStrings.xml'] = CT_STRINGS
+            rels.append((f"rId{len(rels) + 1}", REL_BASE + 'sharedStrings', 'xl/sharedStrings.xml', False))
+        if self.theme is not None:
+            parts['xl/theme/theme1.xml'] = self.theme
+            self.content_types['xl/theme/theme1.xml'] = CT_THEME
+            rels.append((f"rId{len(rels) + 1}", REL_BASE + 'theme', 'xl/theme/theme1.xml', False))
+
+        workbook = (f'<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_DOC_REL}">'
+                    '<bookViews><workbookView activeTab="0"/></bookViews>'
+                    f'<sheets>{"".join(sheets)}</sheets><calcPr calcId="0" fullCalcOnLoad="1"/></workbook>')
+        parts['xl/workbook.xml'] = XML_DECL + workbook.encode('utf-8')
+        self.content_types['xl/workbook.xml'] = CT_WORKBOOK
+        rels_part, data = self._rels_xml('xl/workbook.xml', rels)
+        parts[rels_part] = data
+        parts['_rels/.rels'] = XML_DECL + (
+            f'<Relationships xmlns="{NS_PKG_REL}"><Relationship Id="rId1" '
+            f'Type="{REL_BASE}officeDocument" Target="xl/workbook.xml"/></Relationships>').encode('utf-8')
+
+        overrides = ''.join(f'<Override PartName={quoteattr("/" + part)} ContentType={quoteattr(ct)}/>'
+                            for part, ct in self.content_types.items() if part in parts)
+        types = ('<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                 f'<Default Extension="rels" ContentType="{CT_RELS}"/>'
+                 '<Default Extension="xml" ContentType="application/xml"/>'
+                 f'{overrides}</Types>')
+
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=ZIP_LEVEL) as zf:
+            zf.writestr('[Content_Types].xml', XML_DECL + types.encode('utf-8'))
+            for part, data in parts.items():
+                zf.writestr(part, data)
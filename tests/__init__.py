@@ -0,0 +1,10 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Comparators are cached by default (core.cache): the tests cache into a throwaway folder,
+# never into the user's cache
+_CACHE_DIR = tempfile.mkdtemp(prefix='exceldiff-test-cache-')
+os.environ['EXCELDIFF_CACHE'] = _CACHE_DIR
+atexit.register(shutil.rmtree, _CACHE_DIR, ignore_errors=True)
@@ -0,0 +1,75 @@
+import random
+import difflib
+import unittest
+from core.alignment import ENGINES, get_engine, opcodes_from_pairs
+from core.shift_detector import ShiftDetector
+
+def lcs_length(a, b):
+    prev = [0] * (len(b) + 1)
+    for x in a:
+        cur = [0]
+        for j, y in enumerate(b):
+            cur.append(prev[j] + 1 if x == y else max(prev[j + 1], cur[j]))
+        prev = cur
+    return prev[-1]
+
+class TestAlignmentEngines(unittest.TestCase):
+    def assertValidOpcodes(self, a, b, opcodes):
+        # Opcodes must cover both sequences in order and rebuild b from a
+        i = j = 0
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            self.assertEqual((i1, j1), (i, j))
+            if tag == 'equal':
+                self.assertEqual(a[i1:i2], b[j1:j2])
+            rebuilt.extend(b[j1:j2])
+            i, j = i2, j2
+        self.assertEqual((i, j), (len(a), len(b)))
+        self.assertEqual(rebuilt, list(b))
+
+    def test_random_sequences(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            a = [rng.randint(0, 4) for _ in range(rng.randint(0, 25))]
+            b = [rng.randint(0, 4) for _ in range(rng.randint(0, 25))]
+            for name in ENGINES:
+                opcodes = get_engine(name).get_opcodes(a, b)
+                self.assertValidOpcodes(a, b, opcodes)
+            # Myers is minimal: its equal blocks form a longest common subsequence
+            opcodes = get_engine("myers").get_opcodes(a, b)
+            matched = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == 'equal')
+            self.assertEqual(matched, lcs_length(a, b))
+
+    def test_blank_rows_not_junk(self):
+        # More than 200 items with a frequent blank row: difflib's autojunk would drop it
+        a = ["" if i % 3 else f"r{i}" for i in range(600)]
+        b = a[:300] + ["new"] + a[300:]
+        for name in ENGINES:
+            opcodes = get_engine(name).get_opcodes(a, b)
+            self.assertValidOpcodes(a, b, opcodes)
+            self.assertEqual([op for op in opcodes if op[0] != 'equal'], [('insert', 300, 300, 300, 301)])
+
+    def test_same_opcodes_as_difflib(self):
+        a = list("abcdefgh")
+        b = list("abXdefYgh")
+        expected = difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+        for name in ENGINES:
+            self.assertEqual(get_engine(name).get_opcodes(a, b), expected)
+
+    def test_opcodes_from_pairs(self):
+        self.assertEqual(opcodes_from_pairs([(0, 0), (2, 1)], 3, 3), [
+            ('equal', 0, 1, 0, 1), ('delete', 1, 2, 1, 1),
+            ('equal', 2, 3, 1, 2), ('insert', 3, 3, 2, 3)])
+        self.assertEqual(opcodes_from_pairs([], 2, 1), [('replace', 0, 2, 0, 1)])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            ShiftDetector(engine="nope")
+
+    def test_detector_engine(self):
+        for name in ENGINES:
+            mapping = ShiftDetector(engine=name).compute_mapping(['A', 'B', 'C'], ['A', 'INS', 'B', 'C'])
+            self.assertEqual(mapping, {0: 0, 1: 2, 2: 3})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import xlsxwriter
+import os
+import shutil
+from unittest.mock import patch
+from core.cache import SnapshotCache
+from core.comparator import ExcelComparator, load_sheet
+
+class TestSnapshotCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = 'test_cache_dir'
+        self.filename = 'test_cache.xlsx'
+        self.other = 'test_cache_other.xlsx'
+        for name, value in ((self.filename, 'Row2'), (self.other, 'Row2 Changed')):
+            wb = xlsxwriter.Workbook(name)
+            ws = wb.add_worksheet('Data')
+            ws.write_column('A1', ['Title', value])
+            ws.insert_textbox('B2', 'Box1')
+            wb.close()
+        self.cache = SnapshotCache(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+        for f in (self.filename, self.other):
+            if os.path.exists(f):
+                os.remove(f)
+
+    def test_warm_load_skips_parsing(self):
+        cold = load_sheet(self.filename, 'Data', backend="xml", cache=self.cache)
+        with patch('core.comparator.ExcelLoader') as loader:
+            warm = load_sheet(self.filename, 'Data', backend="xml", cache=self.cache)
+            loader.assert_not_called()
+        self.assertEqual(list(warm.cells), list(cold.cells))
+        self.assertEqual(warm.shapes, cold.shapes)
+        self.assertEqual(list(warm.fps.digests), list(cold.fps.digests))
+        # Other options are other entries
+        self.assertNotEqual(self.cache.key(self.filename, 'Data', backend="xml"),
+                            self.cache.key(self.filename, 'Data', backend="openpyxl"))
+
+    def test_content_change_invalidates(self):
+        key = self.cache.key(self.filename, 'Data')
+        shutil.copyfile(self.other, self.filename)
+        self.assertNotEqual(self.cache.key(self.filename, 'Data'), key)
+
+    def test_rewrite_same_size_and_mtime(self):
+        # Copy tools and coarse file systems can leave size and mtime as they were
+        st = os.stat(self.filename)
+        os.utime(self.filename, ns=(st.st_atime_ns, st.st_mtime_ns - 10 ** 10))
+        st = os.stat(self.filename)
+        key = self.cache.key(self.filename, 'Data')
+        with open(self.filename, 'r+b') as f:
+            data = bytearray(f.read())
+            data[-1] ^= 0xFF # Same size, other content
+            f.seek(0)
+            f.write(data)
+        os.utime(self.filename, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(os.path.getsize(self.filename), st.st_size)
+        self.assertNotEqual(self.cache.key(self.filename, 'Data'), key)
+
+    def test_recent_file_not_memoized(self):
+        # Modified within the mtime resolution of some file systems: hashed every time
+        self.cache.file_digest(self.filename)
+        self.assertFalse(os.path.isdir(os.path.join(self.folder, 'digests')))
+
+    def test_lru_eviction(self):
+        self.cache.put('old', b'x' * 1000)
+        self.cache.put('recent', b'x' * 1000)
+        os.utime(self.cache._path('sheets', 'old'), ns=(1, 1))
+        self.cache.get('old') # Use refreshes it
+        os.utime(self.cache._path('sheets', 'recent'), ns=(2, 2))
+        self.cache.max_bytes = 1500
+        self.cache.evict()
+        self.assertEqual(os.listdir(os.path.join(self.folder, 'sheets')), ['old'])
+
+    def test_digests_evicted(self):
+        # Digest memos count against the same budget
+        for f in (self.filename, self.other):
+            os.utime(f, ns=(1, 1))
+        self.cache.file_digest(self.filename)
+        self.cache.file_digest(self.other)
+        memos = os.path.join(self.folder, 'digests')
+        self.assertEqual(len(os.listdir(memos)), 2)
+        self.cache.put('entry', b'x' * 1000)
+        self.cache.max_bytes = os.path.getsize(self.cache._path('sheets', 'entry'))
+        self.cache.evict()
+        self.assertEqual(os.listdir(memos), [])
+        self.assertEqual(os.listdir(os.path.join(self.folder, 'sheets')), ['entry'])
+
+    def test_comparator_uses_cache(self):
+        for _ in range(2):
+            diff = ExcelComparator(self.filename, self.other, 'Data', 'Data', cache=self.cache).compare()
+            changed = [(i.old_value, i.new_value) for i in diff.items if i.item_type == "Cell"]
+            self.assertEqual(changed, [('Row2', 'Row2 Changed')])
+        self.assertEqual(len(os.listdir(os.path.join(self.folder, 'sheets'))), 2)
+
+if __name__ == '__main__':
+    unittest.main()
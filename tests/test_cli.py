@@ -0,0 +1,63 @@
+import unittest
+import xlsxwriter
+import json
+import os
+import shutil
+import cli
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.root = 'test_cli_trees'
+        for side, value in (('old', 'x'), ('new', 'y')):
+            os.makedirs(os.path.join(self.root, side, 'sub'))
+            self.write(os.path.join(self.root, side, 'a.xlsx'), ['Title', value])
+            self.write(os.path.join(self.root, side, 'sub', 'b.xlsx'), ['Title', 'same'])
+        self.write(os.path.join(self.root, 'old', 'only.xlsx'), ['Gone'])
+        self.output = os.path.join(self.root, 'out.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, filename, column):
+        wb = xlsxwriter.Workbook(filename)
+        wb.add_worksheet('Data').write_column('A1', column)
+        wb.close()
+
+    def read_output(self):
+        with open(self.output, encoding='utf-8') as f:
+            return {os.path.basename(r['old'] or r['new']): r for r in map(json.loads, f)}
+
+    def test_directory_trees(self):
+        old = os.path.join(self.root, 'old')
+        new = os.path.join(self.root, 'new')
+        for workers in ('1', '2'):
+            code = cli.main([old, new, '--workers', workers, '-o', self.output])
+            self.assertEqual(code, 1)
+            results = self.read_output()
+            self.assertEqual({k: r['status'] for k, r in results.items()},
+                             {'a.xlsx': 'different', 'b.xlsx': 'identical', 'only.xlsx': 'deleted'})
+            self.assertEqual([(i['location'], i['old'], i['new']) for i in results['a.xlsx']['items']],
+                             [('A2 -> A2', 'x', 'y')])
+
+    def test_manifest(self):
+        manifest = os.path.join(self.root, 'pairs.json')
+        with open(manifest, 'w', encoding='utf-8') as f:
+            json.dump([{"old": "old/sub/b.xlsx", "new": "new/sub/b.xlsx"},
+                       {"old": "old/a.xlsx", "new": "new/a.xlsx", "sheet_old": "Missing"}], f)
+        code = cli.main(['--manifest', manifest, '--summary', '--workers', '1', '-o', self.output])
+        self.assertEqual(code, 2) # Unknown sheet
+        results = self.read_output()
+        self.assertEqual(results['b.xlsx']['status'], 'identical')
+        self.assertNotIn('items', results['b.xlsx'])
+        self.assertEqual(results['a.xlsx']['status'], 'error')
+
+    def test_report_dir(self):
+        reports = os.path.join(self.root, 'reports')
+        cli.main([os.path.join(self.root, 'old', 'a.xlsx'), os.path.join(self.root, 'new', 'a.xlsx'),
+                  '--report-dir', reports, '-o', self.output])
+        report = self.read_output()['a.xlsx']['report']
+        self.assertEqual(os.path.dirname(report), reports)
+        self.assertTrue(os.path.exists(report))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,10 @@
 import unittest
 import xlsxwriter
 import os
-from core.comparator import ExcelComparator
-from core.data_types import DiffType
+from unittest.mock import patch
+from core.comparator import ExcelComparator, ShapeGrid
+from core.xlsx_package import XlsxPackage
+from core.data_types import DiffType, ShapeData, AnchorPoint
 
 class TestExcelComparator(unittest.TestCase):
     def setUp(self):
@@ -88,5 +90,180 @@ class TestExcelComparator(unittest.TestCase):
         shape_match = [i for i in items if i.item_type == "Shape" and i.diff_type == DiffType.MATCH]
         self.assertTrue(len(shape_match) > 0, "Shape should match despite shift")
 
+    def test_compare_streaming(self):
+        # Streaming mode must find the same cell differences as the full load
+        full = ExcelComparator(self.file_a, self.file_b).compare()
+        streamed = ExcelComparator(self.file_a, self.file_b, streaming=True).compare()
+
+        def cell_diffs(result):
+            return sorted((i.diff_type.value, i.location, str(i.old_value), str(i.new_value))
+                          for i in result.items if i.item_type == "Cell")
+
+        self.assertEqual(cell_diffs(full), cell_diffs(streamed))
+
+    def test_compare_parallel(self):
+        # Both files loaded in worker processes: same result as the serial load
+        serial = ExcelComparator(self.file_a, self.file_b).compare()
+        with patch('os.cpu_count', return_value=2):
+            parallel = ExcelComparator(self.file_a, self.file_b, parallel=True).compare()
+        self.assertEqual(parallel.items, serial.items)
+
+    def test_compare_sheets_of_one_file(self):
+        # Both sides come from one shared (memory-mapped) archive handle
+        filename = 'test_two_sheets.xlsx'
+        wb = xlsxwriter.Workbook(filename)
+        wb.add_worksheet('Old').write_column('A1', ['Title', 'Row1', 'Row2'])
+        wb.add_worksheet('New').write_column('A1', ['Title', 'Row1', 'Row2 Changed'])
+        wb.close()
+        try:
+            for backend in ("openpyxl", "xml"):
+                diff = ExcelComparator(filename, filename, 'Old', 'New', streaming=True,
+                                       backend=backend, use_mmap=True).compare()
+                changed = [i for i in diff.items if i.diff_type == DiffType.CHANGED]
+                self.assertEqual([(i.old_value, i.new_value) for i in changed], [('Row2', 'Row2 Changed')])
+        finally:
+            os.remove(filename)
+
+    def test_compare_column_inserted(self):
+        # One column inserted before C: cells right of it must not be reported as changed
+        filename = 'test_columns.xlsx'
+        wb = xlsxwriter.Workbook(filename)
+        old = wb.add_worksheet('Old')
+        new = wb.add_worksheet('New')
+        for r in range(5):
+            old.write_row(r, 0, [f"a{r}", f"b{r}", f"c{r}", f"d{r}"])
+            new.write_row(r, 0, [f"a{r}", f"b{r}", f"new{r}", f"c{r}", f"d{r}"])
+        new.write_row(5, 0, ["added", "row"])
+        wb.close()
+        try:
+            diff = ExcelComparator(filename, filename, 'Old', 'New').compare()
+            cells = [i for i in diff.items if i.item_type == "Cell"]
+            self.assertFalse([i for i in cells if i.diff_type == DiffType.CHANGED])
+            inserted_col = [i.location for i in cells if i.details == "Column inserted"]
+            self.assertEqual(inserted_col, [f"C{r}" for r in range(1, 6)])
+            inserted_row = [i.location for i in cells if i.details == "Row inserted"]
+            self.assertEqual(inserted_row, ["A6", "B6"])
+        finally:
+            os.remove(filename)
+
+    def test_compare_column_and_row_inserted(self):
+        # A column inserted at C and a row at 4 in the same sheet: every column key changes,
+        # columns are then paired by their values and only the new cells are reported
+        filename = 'test_columns_rows.xlsx'
+        rows = [[f"{c}{r}" for c in "abcdef"] for r in range(10)]
+        wb = xlsxwriter.Workbook(filename)
+        old = wb.add_worksheet('Old')
+        new = wb.add_worksheet('New')
+        new_rows = [r[:2] + [f"new{i}"] + r[2:] for i, r in enumerate(rows)]
+        new_rows.insert(3, [f"ins{c}" for c in range(7)])
+        for r, values in enumerate(rows):
+            old.write_row(r, 0, values)
+        for r, values in enumerate(new_rows):
+            new.write_row(r, 0, values)
+        wb.close()
+        try:
+            diff = ExcelComparator(filename, filename, 'Old', 'New').compare()
+            cells = [i for i in diff.items if i.item_type == "Cell"]
+            self.assertFalse([i for i in cells if i.diff_type in (DiffType.CHANGED, DiffType.DELETED)])
+            inserted_col = [i.location for i in cells if i.details == "Column inserted"]
+            self.assertEqual(inserted_col, [f"C{r}" for r in (1, 2, 3, 5, 6, 7, 8, 9, 10, 11)])
+            inserted_row = [i.location for i in cells if i.details == "Row inserted"]
+            self.assertEqual(inserted_row, [f"{c}4" for c in "ABCDEFG"])
+        finally:
+            os.remove(filename)
+
+    def test_compare_block_move(self):
+        # 20 rows cut and pasted below: one MOVED item, no per-cell deletions/insertions
+        filename = 'test_move.xlsx'
+        rows = [[f"r{r}", r] for r in range(60)]
+        moved = rows[:10] + rows[30:50] + rows[10:30] + rows[50:]
+        wb = xlsxwriter.Workbook(filename)
+        old = wb.add_worksheet('Old')
+        new = wb.add_worksheet('New')
+        for r in range(60):
+            old.write_row(r, 0, rows[r])
+            new.write_row(r, 0, moved[r])
+        wb.close()
+        try:
+            diff = ExcelComparator(filename, filename, 'Old', 'New').compare()
+            self.assertEqual([i for i in diff.items if i.item_type == "Cell"], [])
+            moves = [i for i in diff.items if i.diff_type == DiffType.MOVED and i.item_type == "Row"]
+            self.assertEqual(len(moves), 1)
+            self.assertIn(moves[0].location, ("11:30 -> 31:50", "31:50 -> 11:30"))
+        finally:
+            os.remove(filename)
+
+    def test_shape_position_index(self):
+        # Ids and names all differ: shapes are matched by position, each in its mapped anchor cell
+        def shapes(prefix, row_shift, row_off):
+            return [ShapeData(id=f"{prefix}{i}", name=f"{prefix}{i}", type_name="sp",
+                              from_anchor=AnchorPoint(i // 100 + row_shift, i % 100, row_off))
+                    for i in range(10000)]
+        shapes_a, shapes_b = shapes("A", 0, 0), shapes("B", 1, 5000)
+        row_mapping = {r: r + 1 for r in range(100)}
+        items = ExcelComparator(self.file_a, self.file_b)._compare_shapes(shapes_a, shapes_b, row_mapping)
+        self.assertEqual(len(items), 10000)
+        self.assertTrue(all(i.diff_type == DiffType.MATCH for i in items))
+
+        # Several shapes in one cell: nearest offsets first, matched ones are skipped
+        near, far = (ShapeData(id=n, name=n, type_name="sp", from_anchor=AnchorPoint(2, 3, off, 0))
+                     for n, off in (("near", 100), ("far", 90000)))
+        grid = ShapeGrid([far, near])
+        self.assertIs(grid.nearest(2, 3, 0, 0), near)
+        self.assertIs(grid.nearest(2, 3, 0, 0, taken={near}), far)
+        # Neighbouring cells within the tolerance are searched too
+        self.assertIs(grid.nearest(2, 4), near)
+        self.assertIsNone(grid.nearest(2, 5))
+        self.assertIsNone(ShapeGrid([near], 0, 0).nearest(2, 4))
+
+    def test_shape_moved_one_cell(self):
+        # Renamed and nudged one column right: one changed shape, not a deletion plus an insertion
+        shape_a = ShapeData(id="1", name="Old", type_name="sp", from_anchor=AnchorPoint(4, 2, 1000, 2000))
+        shape_b = ShapeData(id="2", name="New", type_name="sp", from_anchor=AnchorPoint(4, 3, 1000, 2000))
+        comparator = ExcelComparator(self.file_a, self.file_b)
+        items = comparator._compare_shapes([shape_a], [shape_b], {4: 4})
+        self.assertEqual([(i.diff_type, i.details) for i in items], [(DiffType.CHANGED, "position_changed")])
+        comparator.shape_tolerance = (0, 0)
+        items = comparator._compare_shapes([shape_a], [shape_b], {4: 4})
+        self.assertEqual(sorted(i.diff_type.value for i in items), sorted([DiffType.DELETED.value, DiffType.INSERTED.value]))
+
+    def test_packages_opened_once(self):
+        # unchanged_parts, the shapes and the cells all read through one handle per file
+        with patch('core.comparator.XlsxPackage', wraps=XlsxPackage) as opened, \
+                patch('core.excel_loader.XlsxPackage', wraps=XlsxPackage) as opened_by_loader:
+            ExcelComparator(self.file_a, self.file_b, use_cache=False).compare()
+            self.assertEqual(opened.call_count, 2)
+            ExcelComparator(self.file_a, self.file_a, use_cache=False).compare()
+            self.assertEqual(opened.call_count, 3)
+            opened_by_loader.assert_not_called()
+
+    def test_unchanged_parts_skip_parsing(self):
+        # Same cells, shape moved: only the drawings are parsed
+        filename = 'test_parts.xlsx'
+        wb = xlsxwriter.Workbook(filename)
+        wb.add_worksheet('Cover') # The selected tab's XML differs (tabSelected)
+        for name, offset in (('Old', 0), ('New', 30), ('Copy', 0)):
+            ws = wb.add_worksheet(name)
+            ws.write_column('A1', ['Title', 'Row1', 'Row2'])
+            ws.insert_textbox('B2', 'Box1', {'x_offset': offset})
+        wb.close()
+        try:
+            moved = ExcelComparator(filename, filename, 'Old', 'New', use_cache=False)
+            self.assertEqual(moved.unchanged_parts(), {"cells"})
+            with patch('core.excel_loader.ExcelLoader.iter_rows') as iter_rows:
+                items = moved.compare().items
+                iter_rows.assert_not_called()
+            self.assertEqual([(i.item_type, i.diff_type) for i in items], [("Shape", DiffType.CHANGED)])
+
+            # Identical sheets: shapes are a MATCH without comparing them
+            same = ExcelComparator(filename, filename, 'Old', 'Copy', use_cache=False)
+            self.assertEqual(same.unchanged_parts(), {"cells", "drawing"})
+            with patch.object(ExcelComparator, '_compare_loaded') as compare_loaded:
+                items = same.compare().items
+                compare_loaded.assert_not_called()
+            self.assertEqual([(i.location, i.diff_type) for i in items], [("TextBox 1", DiffType.MATCH)])
+        finally:
+            os.remove(filename)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from core.data_types import CellData, SheetCells
+
+class TestSheetCells(unittest.TestCase):
+    def setUp(self):
+        self.cells = SheetCells([
+            CellData(row=1, col=1, value="Head", coordinate="A1"),
+            CellData(row=1, col=3, value=1, coordinate="C1"),
+            CellData(row=4, col=2, value=1.0, coordinate="B4"),
+            CellData(row=4, col=28, value=True, coordinate="AB4"),
+            CellData(row=5, col=1, value=None, coordinate="A5"), # Empty, not stored
+        ])
+
+    def test_lookup(self):
+        self.assertEqual(len(self.cells), 4)
+        self.assertEqual(self.cells.get(1, 3), 1)
+        self.assertEqual(self.cells.get(4, 28), True)
+        self.assertIsNone(self.cells.get(1, 2))
+        self.assertIsNone(self.cells.get(2, 1)) # Row without cells
+        self.assertIsNone(self.cells.get(9, 1)) # Past the last row
+        self.assertEqual(self.cells.index(4, 2), 2)
+        self.assertEqual(list(self.cells.row_range(4)), [2, 3])
+        self.assertEqual(self.cells.max_row, 4)
+
+    def test_interning_keeps_types(self):
+        # 1, 1.0 and True compare equal but are different cell values
+        values = [self.cells.get(1, 3), self.cells.get(4, 2), self.cells.get(4, 28)]
+        self.assertEqual([type(v) for v in values], [int, float, bool])
+
+    def test_iter_gives_cell_data(self):
+        self.assertEqual([c.coordinate for c in self.cells], ["A1", "C1", "B4", "AB4"])
+        self.assertEqual(self.cells.cell(3), CellData(row=4, col=28, value=True, coordinate="AB4"))
+
+    def test_out_of_order(self):
+        with self.assertRaises(ValueError):
+            self.cells.add(2, 1, "Back up")
+
+if __name__ == '__main__':
+    unittest.main()
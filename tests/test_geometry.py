@@ -0,0 +1,74 @@
+import unittest
+import xlsxwriter
+import os
+import zipfile
+from core.xlsx_package import XlsxPackage
+from core.geometry import read_sheet_geometry, read_shape_boxes, diff_sizes, width_to_chars
+
+class TestSheetGeometry(unittest.TestCase):
+    def setUp(self):
+        self.filename = 'test_geometry.xlsx'
+        wb = xlsxwriter.Workbook(self.filename)
+        old = wb.add_worksheet('Old')
+        old.write('A1', 'x')
+        new = wb.add_worksheet('New')
+        new.write('A1', 'x')
+        new.set_row(2, 30) # Row 3
+        new.set_row(4, None, None, {'hidden': True}) # Row 5
+        new.set_column('B:B', 20)
+        new.set_column('D:D', None, None, {'hidden': True})
+        # Textbox at C4 + (10px, 5px): 8.43 + 20 chars = 64 + 145 px, rows 1-3 = 60pt
+        new.insert_textbox('C4', 'box', {'x_offset': 10, 'y_offset': 5, 'width': 200, 'height': 60})
+        wb.close()
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_read_geometry(self):
+        with XlsxPackage(self.filename) as package:
+            geo = read_sheet_geometry(package, 'New')
+        self.assertEqual([geo.row_height(r) for r in range(1, 7)], [15.0, 15.0, 30.0, 15.0, 0.0, 15.0])
+        self.assertEqual([geo.col_width(c) for c in range(1, 6)], [8.43, 20.0, 8.43, 0.0, 8.43])
+        # Excel's default width: 9.140625 in the XML, 8.43 characters
+        self.assertEqual(width_to_chars(9.140625), 8.43)
+
+    def test_diff_sizes(self):
+        with XlsxPackage(self.filename) as package:
+            old = read_sheet_geometry(package, 'Old')
+            new = read_sheet_geometry(package, 'New')
+        self.assertEqual(diff_sizes(10, old.row_height, new.row_height), [(3, 15.0, 30.0), (5, 15.0, 0.0)])
+        self.assertEqual(diff_sizes(10, old.col_width, new.col_width), [(2, 8.43, 20.0), (4, 8.43, 0.0)])
+
+    def test_col_without_width(self):
+        # A <col> that only sets a style has the default width, not 0 (hidden)
+        styled = 'test_geometry_cols.xlsx'
+        with zipfile.ZipFile(self.filename) as src, zipfile.ZipFile(styled, 'w') as dst:
+            for item in src.infolist():
+                data = src.read(item.filename)
+                if item.filename == 'xl/worksheets/sheet1.xml':
+                    data = data.replace(b'<sheetData', b'<cols><col min="3" max="3" style="0"/></cols><sheetData', 1)
+                dst.writestr(item, data)
+        try:
+            with XlsxPackage(styled) as package:
+                old = read_sheet_geometry(package, 'Old')
+                new = read_sheet_geometry(package, 'New')
+            self.assertEqual([old.col_width(c) for c in range(1, 5)], [8.43, 8.43, 8.43, 8.43])
+            self.assertEqual(diff_sizes(10, old.col_width, new.col_width), [(2, 8.43, 20.0), (4, 8.43, 0.0)])
+        finally:
+            os.remove(styled)
+
+    def test_read_shape_boxes(self):
+        with XlsxPackage(self.filename) as package:
+            self.assertEqual(read_shape_boxes(package, 'Old'), [])
+            boxes = read_shape_boxes(package, 'New')
+        self.assertEqual(len(boxes), 1)
+        box = boxes[0]
+        self.assertEqual((box.id, box.name), (2, 'TextBox 1'))
+        self.assertEqual((box.anchor_row, box.anchor_col), (4, 3))
+        self.assertEqual((box.left, box.top), ((64 + 145 + 10) * 0.75, 60 + 5 * 0.75))
+        self.assertEqual((box.rel_left, box.rel_top), (7.5, 3.75))
+        self.assertEqual((box.width, box.height), (150.0, 45.0))
+
+if __name__ == '__main__':
+    unittest.main()
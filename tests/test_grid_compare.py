@@ -0,0 +1,52 @@
+import unittest
+import datetime
+import numpy as np
+from core.grid_compare import diff_mask, compare_aligned_rows, a1_address
+
+class TestGridCompare(unittest.TestCase):
+    def test_diff_mask_rules(self):
+        pairs = [
+            (1, 1.0000000001, False), # Numbers within epsilon, mixed types
+            (1, 1.1, True),
+            (True, 1, False), # bool counts as a number
+            ("a ", "a", False), # Strings compare stripped
+            (None, "", False), # None is ""
+            (None, 0, True),
+            ("1", 1, False), # Text vs number falls back to text
+            (datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 2), True),
+            (float('nan'), 1.0, False), # As abs(nan - x) > eps before
+        ]
+        old = np.empty(len(pairs), dtype=object)
+        new = np.empty(len(pairs), dtype=object)
+        for i, (a, b, _) in enumerate(pairs):
+            old[i] = a
+            new[i] = b
+        self.assertEqual(diff_mask(old, new).tolist(), [expected for _, _, expected in pairs])
+
+    def test_compare_aligned_rows(self):
+        raw_old = [["Head", "X", 1], ["a", "b", 2], ["c", "d", 3]]
+        # Row inserted at 2, column inserted at 2, C3 changed
+        raw_new = [["Head", "new", "X", 1], ["ins", "", "", None], ["a", "", "b", 2], ["c", "", "d", 4]]
+        row_map = {3: 4, 1: 1, 2: 3}
+        col_pairs = [(1, 1), (2, 3), (3, 4)]
+        self.assertEqual(compare_aligned_rows(raw_old, raw_new, row_map, col_pairs), [(3, 3, 3, 4)])
+        # Rows mapped past the end of the data are ignored
+        self.assertEqual(compare_aligned_rows(raw_old, raw_new, {1: 9}, col_pairs), [])
+
+    def test_used_range_origin(self):
+        # Old UsedRange starts at C5, new at A1: results are in sheet coordinates
+        raw_old = [["a", "b"], ["c", "d"]]
+        raw_new = [["a", "b"], ["c", "X"]]
+        diffs = compare_aligned_rows(raw_old, raw_new, {5: 1, 6: 2}, [(3, 1), (4, 2)],
+                                     origin_old=(5, 3), origin_new=(1, 1))
+        self.assertEqual(diffs, [(6, 4, "d", "X")])
+        self.assertEqual(a1_address(*diffs[0][:2]), "D6")
+        # Rows/columns outside the value lists are skipped
+        self.assertEqual(compare_aligned_rows(raw_old, raw_new, {1: 1}, [(3, 1)], origin_old=(5, 3)), [])
+
+    def test_a1_address(self):
+        self.assertEqual(a1_address(12, 2), "B12")
+        self.assertEqual(a1_address(1, 28), "AB1")
+
+if __name__ == '__main__':
+    unittest.main()
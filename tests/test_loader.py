@@ -1,13 +1,31 @@
 import unittest
 import os
+import shutil
+import tempfile
+import re
+import datetime
+import zipfile
+import xml.etree.ElementTree as ET
+import xlsxwriter
+from unittest.mock import patch
 from core.excel_loader import ExcelLoader
+from core.xlsx_package import XlsxPackage, TAG_SHEET_DATA
 
 class TestExcelLoader(unittest.TestCase):
     def setUp(self):
-        self.filename = 'test_shapes.xlsx'
-        # Ensure the file exists (created by PoC)
-        if not os.path.exists(self.filename):
-            raise FileNotFoundError("Run poc_shapes.py first or ensure test_shapes.xlsx exists")
+        # Same workbook as research/poc_shapes.py
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test_shapes.xlsx')
+        wb = xlsxwriter.Workbook(self.filename)
+        ws = wb.add_worksheet()
+        ws.insert_textbox('B2', 'This is a textbox', {'width': 200, 'height': 100})
+        ws.insert_textbox('E5', 'Another shape', {'width': 100, 'height': 50})
+        ws.write('A1', 'Hello')
+        ws.write('C3', 'World')
+        wb.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
 
     def test_load_cells(self):
         loader = ExcelLoader(self.filename)
@@ -20,6 +38,15 @@ class TestExcelLoader(unittest.TestCase):
         self.assertEqual(val_map.get('A1'), 'Hello')
         self.assertEqual(val_map.get('C3'), 'World')
 
+    def test_load_cells_streaming(self):
+        loader = ExcelLoader(self.filename, streaming=True)
+        rows = list(loader.iter_rows())
+
+        # Only the two non-empty rows come out, and only their non-empty cells
+        self.assertEqual([[c.coordinate for c in row] for row in rows], [['A1'], ['C3']])
+        self.assertEqual(rows[0][0].value, 'Hello')
+        self.assertEqual(rows[1][0].value, 'World')
+
     def test_load_shapes(self):
         loader = ExcelLoader(self.filename)
         _, shapes = loader.load()
@@ -47,5 +74,91 @@ class TestExcelLoader(unittest.TestCase):
         self.assertIsNotNone(shape_e5, "Could not find E5 shape (col=4, row=4)")
         self.assertTrue("Another shape" in shape_e5.text)
 
+class TestXmlBackend(unittest.TestCase):
+    def setUp(self):
+        self.filename = 'test_backend.xlsx'
+        wb = xlsxwriter.Workbook(self.filename)
+        wb.add_worksheet('Other').write('A1', 'Not this sheet')
+        ws = wb.add_worksheet('Data')
+        date_fmt = wb.add_format({'num_format': 'yyyy-mm-dd'})
+        ws.write('A1', 'Text')
+        ws.write('B1', 42)
+        ws.write('C1', 3.5)
+        ws.write('D1', True)
+        ws.write_datetime('E1', datetime.datetime(2024, 5, 17), date_fmt)
+        ws.write_formula('F1', '=B1*2', None, 84)
+        ws.write_rich_string('A3', 'Rich ', wb.add_format({'bold': True}), 'text')
+        ws.write_blank('B3', None, date_fmt) # Styled but empty
+        ws.write('H5', 'Far away')
+        wb.close()
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_same_cells_as_openpyxl(self):
+        def cells(backend):
+            loader = ExcelLoader(self.filename, sheet_name='Data', streaming=True, backend=backend)
+            return [(c.row, c.col, c.value, c.coordinate) for row in loader.iter_rows() for c in row]
+
+        expected = cells("openpyxl")
+        self.assertEqual(cells("xml"), expected)
+        self.assertIn((1, 6, '=B1*2', 'F1'), expected)
+        self.assertIn((3, 1, 'Rich text', 'A3'), expected)
+
+    def test_rows_released(self):
+        # Each parsed row leaves the tree: nothing accumulates under <sheetData>
+        parsers = []
+        iterparse = ET.iterparse
+
+        def spy(*args, **kwargs):
+            parsers.append(iterparse(*args, **kwargs))
+            return parsers[-1]
+
+        with patch('core.xlsx_package.ET.iterparse', spy), XlsxPackage(self.filename) as package:
+            self.assertEqual(len(list(package.iter_cells('Data'))), 8)
+        sheet_data = [p.root.find(TAG_SHEET_DATA) for p in parsers]
+        self.assertEqual([len(e) for e in sheet_data if e is not None], [0])
+
+    def test_shared_formula_without_refs(self):
+        # Cells without an r attribute (allowed, and written by some generators)
+        edited = 'test_backend_norefs.xlsx'
+        rows = ('<sheetData><row><c><v>1</v></c><c><f t="shared" ref="B1:C1" si="0">A1*2</f><v>2</v></c>'
+                '<c><f t="shared" si="0"/><v>4</v></c></row></sheetData>')
+        with zipfile.ZipFile(self.filename) as src, zipfile.ZipFile(edited, 'w') as dst:
+            for item in src.infolist():
+                data = src.read(item.filename)
+                if item.filename == 'xl/worksheets/sheet2.xml':
+                    data = re.sub(rb'<sheetData>.*</sheetData>', rows.encode(), data, flags=re.S)
+                dst.writestr(item, data)
+        try:
+            with XlsxPackage(edited) as package:
+                self.assertEqual(list(package.iter_cells('Data')),
+                                 [(1, 1, 1, None), (1, 2, 2, '=A1*2'), (1, 3, 4, '=B1*2')])
+        finally:
+            os.remove(edited)
+
+    def test_shapes_scoped_to_sheet(self):
+        filename = 'test_two_drawings.xlsx'
+        wb = xlsxwriter.Workbook(filename)
+        wb.add_worksheet('First').insert_textbox('B2', 'On first', {'width': 100, 'height': 50})
+        ws = wb.add_worksheet('Second')
+        ws.insert_textbox('D4', 'On second', {'width': 100, 'height': 50})
+        wb.close()
+        try:
+            shapes = ExcelLoader(filename, sheet_name='Second', backend="xml").load_shapes()
+            self.assertEqual([s.text for s in shapes], ['On second'])
+            shapes = ExcelLoader(filename, sheet_name='First').load_shapes()
+            self.assertEqual([s.text for s in shapes], ['On first'])
+            # Sheet without a drawing part
+            self.assertEqual(ExcelLoader(self.filename, sheet_name='Data').load_shapes(), [])
+        finally:
+            os.remove(filename)
+
+    def test_missing_sheet(self):
+        loader = ExcelLoader(self.filename, sheet_name='Nope', backend="xml")
+        with self.assertRaises(ValueError):
+            loader.load()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,247 @@
+import unittest
+import xlsxwriter
+import os
+import openpyxl
+import zipfile
+import xml.etree.ElementTree as ET
+from core.comparator import ExcelComparator
+from core.data_types import DiffResult, DiffItem, DiffType
+from reporting.excel_writer import ExcelReportGenerator
+from reporting.native_report import NativeReportGenerator, diff_result_tables
+from reporting.visual_reporter import VisualReporter, collect_highlights
+from reporting.ranges import coalesce, range_address, row_runs, row_move, rows_address, address_batches, hyperlink_formula
+
+class TestRanges(unittest.TestCase):
+    def test_coalesce(self):
+        cells = [(2, 2), (2, 3), (3, 2), (3, 3), # B2:C3
+                 (3, 5), # E3
+                 (5, 1), (5, 2), (6, 1)] # A5:B5 and A6 (not a rectangle)
+        rects = coalesce(cells)
+        self.assertEqual([range_address(r) for r in rects], ["B2:C3", "E3", "A5:B5", "A6"])
+        # Exactly the input cells
+        covered = {(r, c) for r1, c1, r2, c2 in rects for r in range(r1, r2 + 1) for c in range(c1, c2 + 1)}
+        self.assertEqual(covered, set(cells))
+
+    def test_coalesce_row_gap(self):
+        self.assertEqual(coalesce([(1, 1), (3, 1), (4, 1)]), [(1, 1, 1, 1), (3, 1, 4, 1)])
+
+    def test_row_runs(self):
+        self.assertEqual([rows_address(run) for run in row_runs([9, 5, 6, 7, 6])], ["5:7", "9:9"])
+        self.assertEqual(row_runs([]), [])
+
+    def test_address_batches(self):
+        # Every other cell of a column: nothing to merge
+        addresses = [range_address(rect) for rect in coalesce((r, 2) for r in range(1, 400, 2))]
+        batches = address_batches(addresses)
+        self.assertTrue(all(len(b) <= 255 for b in batches))
+        self.assertEqual(",".join(batches).split(","), addresses)
+        self.assertEqual(address_batches(["A1", "B2:C3"]), ["A1,B2:C3"])
+
+    def test_row_move(self):
+        self.assertEqual(row_move("11:30 -> 31:50"), ((11, 30), (31, 50)))
+        self.assertIsNone(row_move("A3 -> A4"))
+        self.assertIsNone(row_move("A3"))
+
+    def test_hyperlink_formula(self):
+        self.assertEqual(hyperlink_formula("Source_New", "A5"), '=HYPERLINK("#\'Source_New\'!A5","A5")')
+        # Quotes in the sheet name and the text are escaped
+        self.assertEqual(hyperlink_formula("It's", "B3", 'Row "3"'), '=HYPERLINK("#\'It\'\'s\'!B3","Row ""3""")')
+
+class TestExcelReportGenerator(unittest.TestCase):
+    def setUp(self):
+        self.file_a = 'test_report_a.xlsx'
+        self.file_b = 'test_report_b.xlsx'
+        self.output = 'test_report_out.xlsx'
+        wb = xlsxwriter.Workbook(self.file_a)
+        ws = wb.add_worksheet('Data')
+        ws.write_column('A1', ['Title', 'Row1', 'Row2'])
+        ws.write_string('C1', '=Text')
+        wb.close()
+        wb = xlsxwriter.Workbook(self.file_b)
+        ws = wb.add_worksheet('Data')
+        ws.write_column('A1', ['Title', 'Inserted', 'Row1', 'Row2 Changed'])
+        ws.write_string('C1', '=Text') # Text, not a formula
+        ws.write_formula('B4', '=LEN(A4)')
+        wb.close()
+
+    def tearDown(self):
+        for f in (self.file_a, self.file_b, self.output):
+            if os.path.exists(f):
+                os.remove(f)
+
+    def test_streaming_report(self):
+        result = ExcelComparator(self.file_a, self.file_b, use_cache=False).compare()
+        ExcelReportGenerator(self.file_b, self.output, streaming=True).generate(result)
+
+        wb = openpyxl.load_workbook(self.output)
+        self.assertEqual(wb.sheetnames, ["Diff Summary", "Data"])
+        self.assertEqual(wb["Diff Summary"].max_row, len(result.items) + 1)
+        ws = wb["Data"]
+        self.assertEqual([ws.cell(r, 1).value for r in range(1, 5)], ['Title', 'Inserted', 'Row1', 'Row2 Changed'])
+        self.assertEqual((ws['B4'].value, ws['B4'].data_type), ('=LEN(A4)', 'f'))
+        self.assertEqual((ws['C1'].value, ws['C1'].data_type), ('=Text', 's'))
+        fills = {str(cf.sqref): cf.rules[0].dxf.fill.fgColor.rgb[-6:] for cf in ws.conditional_formatting}
+        # B4 is a cell added to an existing row
+        self.assertEqual(fills, {"A4": "FFFF00", "A2:S2 B4": "00FF00"})
+
+    def test_moved_rows_highlighted(self):
+        result = DiffResult(items=[DiffItem(location="2:2 -> 3:4", item_type="Row", diff_type=DiffType.MOVED)])
+        ExcelReportGenerator(self.file_b, self.output, streaming=True).generate(result)
+        ws = openpyxl.load_workbook(self.output)["Data"]
+        fills = {str(cf.sqref): cf.rules[0].dxf.fill.fgColor.rgb[-6:] for cf in ws.conditional_formatting}
+        self.assertEqual(fills, {"A3:S4": "FFA500"})
+
+        ExcelReportGenerator(self.file_b, self.output).generate(result)
+        ws = openpyxl.load_workbook(self.output)["Data"]
+        self.assertEqual([ws.cell(r, 1).fill.fgColor.rgb for r in range(2, 5)], ["00000000", "00FFA500", "00FFA500"])
+
+class TestNativeReportGenerator(unittest.TestCase):
+    def setUp(self):
+        self.file_a = 'test_native_a.xlsx'
+        self.file_b = 'test_native_b.xlsx'
+        self.output = 'test_native_out.xlsx'
+        for name, value in ((self.file_a, 'Row2'), (self.file_b, 'Row2 Changed')):
+            wb = xlsxwriter.Workbook(name)
+            wb.add_worksheet('Other').write('A1', 'x')
+            ws = wb.add_worksheet('Data')
+            # Different formats per file: the second file's styles are renumbered in the output
+            fmt = wb.add_format({'num_format': '0.000' if name == self.file_a else '0.0', 'bold': True})
+            ws.write_column('A1', ['Title', value])
+            ws.write('B2', 1.5, fmt)
+            ws.write_formula('C2', '=Other!A1', None, 'x')
+            ws.write_comment('A1', 'Note')
+            ws.insert_textbox('E2', 'Box1')
+            wb.close()
+
+    def tearDown(self):
+        for f in (self.file_a, self.file_b, self.output):
+            if os.path.exists(f):
+                os.remove(f)
+
+    def test_native_report(self):
+        result = ExcelComparator(self.file_a, self.file_b, 'Data', 'Data', use_cache=False).compare()
+        tables, fills_old, fills_new = diff_result_tables(result)
+        fills_new[(5, 2)] = "FF0000" # A cell of a row that does not exist
+        NativeReportGenerator(self.output, self.file_a, self.file_b, 'Data', 'Data').generate(
+            tables, fills_old=fills_old, fills_new=fills_new)
+
+        with zipfile.ZipFile(self.output) as z:
+            for part in z.namelist():
+                ET.fromstring(z.read(part)) # Well-formed
+            self.assertEqual(len([p for p in z.namelist() if p.startswith('xl/drawings/drawing')]), 2)
+
+        wb = openpyxl.load_workbook(self.output)
+        self.assertEqual(wb.sheetnames, ["Cell_Report", "Shape_Report", "Source_Old", "Source_New"])
+        report = wb["Cell_Report"]
+        self.assertEqual(list(report.tables), ["Table1"])
+        self.assertEqual(report['B2'].value, '=HYPERLINK("#\'Source_New\'!A2","A2 -> A2")')
+        self.assertEqual(wb["Shape_Report"]['A1'].value, "No Shape Differences Found.")
+
+        for title, value, fmt in (("Source_Old", 'Row2', '0.000'), ("Source_New", 'Row2 Changed', '0.0')):
+            ws = wb[title]
+            self.assertEqual(ws['A2'].value, value)
+            self.assertEqual(ws['A2'].fill.fgColor.rgb, "FFFFFF00")
+            self.assertEqual((ws['B2'].value, ws['B2'].number_format, ws['B2'].font.b), (1.5, fmt, True))
+            # Formulas referring to other sheets are kept as their cached values
+            self.assertEqual(ws['C2'].value, 'x')
+            self.assertEqual(ws['A1'].comment.text, 'Note')
+        self.assertEqual(wb["Source_New"]['B5'].fill.fgColor.rgb, "FFFF0000")
+
+class TestVisualReporterNative(unittest.TestCase):
+    def setUp(self):
+        self.file_a = 'test_visual_a.xlsx'
+        self.file_b = 'test_visual_b.xlsx'
+        self.output = 'test_visual_out.xlsx'
+        for name, value, boxes in ((self.file_a, 'Row2', ['E2', 'K2']), (self.file_b, 'Row2 Changed', ['E2'])):
+            wb = xlsxwriter.Workbook(name)
+            ws = wb.add_worksheet('Data')
+            ws.write_column('A1', ['Title', value, 'Same'])
+            if name == self.file_b:
+                ws.write('B3', 'New')
+            ws.write_comment('A1', 'Note')
+            for cell in boxes:
+                ws.insert_textbox(cell, 'Box')
+            wb.close()
+
+    def tearDown(self):
+        for f in (self.file_a, self.file_b, self.output):
+            if os.path.exists(f):
+                os.remove(f)
+
+    def test_native_report(self):
+        result = ExcelComparator(self.file_a, self.file_b, 'Data', 'Data', use_cache=False).compare()
+        VisualReporter(self.file_a, self.file_b, self.output, 'Data', 'Data', native=True).generate(result)
+
+        wb = openpyxl.load_workbook(self.output)
+        self.assertEqual(wb.sheetnames, ["Original", "Modified", "Modified Diff", "Base Diff", "Unchanged"])
+        mod_diff, base_diff = wb["Modified Diff"], wb["Base Diff"]
+        self.assertEqual(mod_diff['A2'].fill.fgColor.rgb, "FFFFFFE0")
+        self.assertEqual(mod_diff['B3'].fill.fgColor.rgb, "FF90EE90")
+        self.assertEqual(base_diff['A2'].fill.fgColor.rgb, "FFFFFFE0")
+        self.assertEqual(wb["Original"]['A2'].fill.fgColor.rgb, "00000000")
+        # Notes join the comments the sheet already had
+        self.assertEqual((mod_diff['A1'].comment.text, mod_diff['A2'].comment.text), ('Note', 'Was: Row2'))
+        self.assertEqual(base_diff['A2'].comment.text, 'Now: Row2 Changed')
+
+        with zipfile.ZipFile(self.output) as z:
+            drawings = {}
+            for part in z.namelist():
+                ET.fromstring(z.read(part)) # Well-formed, VML included
+                if part.startswith('xl/drawings/drawing'):
+                    drawings[part] = z.read(part).decode('utf-8')
+        # Matched box left out of both diff sheets, deleted box outlined in green in Base Diff
+        self.assertEqual(sorted(d.count('<xdr:cNvPr ') for d in drawings.values()), [0, 1, 1, 2, 2])
+        self.assertEqual(sum('<a:srgbClr val="00FF00"/></a:solidFill></a:ln>' in d for d in drawings.values()), 1)
+
+    def test_notes_added_to_saved_report(self):
+        # COM mode: Excel saves the painted sheets, the notes are then added at the zip level
+        result = ExcelComparator(self.file_a, self.file_b, 'Data', 'Data', use_cache=False).compare()
+        reporter = VisualReporter(self.file_a, self.file_b, self.output, 'Data', 'Data', native=True)
+        reporter.generate(DiffResult(items=[])) # Stands in for the workbook Excel saved
+        reporter._add_notes(collect_highlights(result))
+
+        with zipfile.ZipFile(self.output) as z:
+            for part in z.namelist():
+                ET.fromstring(z.read(part))
+        wb = openpyxl.load_workbook(self.output)
+        self.assertEqual(wb.sheetnames, ["Original", "Modified", "Modified Diff", "Base Diff", "Unchanged"])
+        mod_diff, base_diff = wb["Modified Diff"], wb["Base Diff"]
+        self.assertEqual((mod_diff['A1'].comment.text, mod_diff['A2'].comment.text), ('Note', 'Was: Row2'))
+        self.assertEqual(base_diff['A2'].comment.text, 'Now: Row2 Changed')
+        self.assertIsNone(wb["Modified"]['A2'].comment)
+
+    def test_native_report_moved_rows(self):
+        # Source rows of a moved block in Base Diff, target rows in Modified Diff
+        result = DiffResult(items=[DiffItem(location="2:2 -> 3:3", item_type="Row", diff_type=DiffType.MOVED)])
+        VisualReporter(self.file_a, self.file_b, self.output, 'Data', 'Data', native=True).generate(result)
+        wb = openpyxl.load_workbook(self.output)
+        self.assertEqual(wb["Base Diff"]['A2'].fill.fgColor.rgb, "FFADD8E6")
+        self.assertEqual(wb["Modified Diff"]['A3'].fill.fgColor.rgb, "FFADD8E6")
+        self.assertEqual(wb["Modified Diff"]['A2'].fill.fgColor.rgb, "00000000")
+
+    def test_native_report_openpyxl_comments(self):
+        # openpyxl writes the VML of comments with ns0/ns1/ns2 prefixes: notes must use them
+        for f in (self.file_a, self.file_b):
+            wb = openpyxl.load_workbook(f)
+            wb.create_sheet('Other')['A1'] = 'o'
+            # openpyxl writes formulas without cached values
+            wb['Data']['F1'] = '=A1&"y"'
+            wb['Data']['G1'] = '=Other!A1'
+            wb.save(f)
+        result = ExcelComparator(self.file_a, self.file_b, 'Data', 'Data', use_cache=False).compare()
+        VisualReporter(self.file_a, self.file_b, self.output, 'Data', 'Data', native=True).generate(result)
+
+        with zipfile.ZipFile(self.output) as z:
+            vml = [p for p in z.namelist() if p.endswith('.vml')]
+            self.assertEqual(len(vml), 5)
+            for part in z.namelist():
+                ET.fromstring(z.read(part))
+        mod_diff = openpyxl.load_workbook(self.output)["Modified Diff"]
+        self.assertEqual((mod_diff['A1'].comment.text, mod_diff['A2'].comment.text), ('Note', 'Was: Row2'))
+        # A formula on its own sheet is kept; one referring to a sheet that is not copied
+        # has no value to fall back on and shows its text
+        self.assertEqual((mod_diff['F1'].value, mod_diff['F1'].data_type), ('=A1&"y"', 'f'))
+        self.assertEqual((mod_diff['G1'].value, mod_diff['G1'].data_type), ('=Other!A1', 's'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
-from core.shift_detector import ShiftDetector
-from core.data_types import CellData
+from collections import Counter
+from core.shift_detector import ShiftDetector, value_overlap
+from core.data_types import CellData, AnchorPoint, ShapeData
+from core.fingerprint import RowFingerprints, EMPTY_ROW, row_fingerprint, column_fingerprint
 
 class TestShiftDetector(unittest.TestCase):
     def test_simple_insertion(self):
@@ -39,11 +41,97 @@ class TestShiftDetector(unittest.TestCase):
             CellData(row=2, col=2, value="Val2", coordinate="B2"),
         ]
         # Max row 3 (implies row 3 is empty)
-        sigs = detector.get_row_signatures(cells, 3)
+        sigs = detector.get_row_signatures(cells, [], 3)
         self.assertEqual(len(sigs), 3)
         self.assertEqual(sigs[0], "Head")
         self.assertEqual(sigs[1], "Val1|Val2")
         self.assertEqual(sigs[2], "")
 
+    def test_row_fingerprints(self):
+        detector = ShiftDetector()
+        rows = [
+            [CellData(row=1, col=1, value="Head", coordinate="A1")],
+            [CellData(row=3, col=1, value="Val1", coordinate="A3"),
+             CellData(row=3, col=2, value="Val2", coordinate="B3")],
+        ]
+        shapes = [ShapeData(id="2", name="Box", type_name="Shape", from_anchor=AnchorPoint(row=3, col=1))]
+        fps = detector.get_row_fingerprints(iter(rows), shapes)
+
+        # Rows 1..4: row 2 is empty, row 4 only holds the shape
+        self.assertEqual(len(fps), 4)
+        self.assertEqual(fps[0], row_fingerprint(["Head"]))
+        self.assertEqual(fps[1], EMPTY_ROW)
+        self.assertEqual(fps[2], row_fingerprint(["Val1", "Val2"]))
+        self.assertEqual(fps[3], row_fingerprint([], ["Box"]))
+        # Separators keep the values apart
+        self.assertNotEqual(row_fingerprint(["ab", "c"]), row_fingerprint(["a", "bc"]))
+
+    def test_column_fingerprints(self):
+        detector = ShiftDetector()
+        rows = [
+            [CellData(row=1, col=1, value="Head", coordinate="A1"),
+             CellData(row=1, col=3, value="C", coordinate="C1")],
+            [CellData(row=2, col=1, value="Val1", coordinate="A2"),
+             CellData(row=2, col=2, value=None, coordinate="B2")],
+        ]
+        fps, col_fps = detector.get_fingerprints(iter(rows), [])
+
+        self.assertEqual(len(fps), 2)
+        self.assertEqual(fps[0], row_fingerprint(["Head", "C"]))
+        # Columns 1..3, values as a multiset, empty cells skipped
+        self.assertEqual(len(col_fps), 3)
+        self.assertEqual(col_fps[0], column_fingerprint(["Head", "Val1"]))
+        self.assertEqual(col_fps[1], EMPTY_ROW)
+        self.assertEqual(col_fps[2], column_fingerprint(["C"]))
+        # Row order does not matter, multiplicity does
+        self.assertEqual(column_fingerprint(["a", None, "b"]), column_fingerprint(["b", "a"]))
+        self.assertNotEqual(column_fingerprint(["a", "b"]), column_fingerprint(["a", "b", "b"]))
+        self.assertNotEqual(column_fingerprint(["a"]), row_fingerprint(["a"]))
+
+    def test_pair_similar(self):
+        detector = ShiftDetector()
+        # Column inserted at B, and one value added to every other column
+        cols_a = [Counter(["a1", "a2"]), Counter(["c1", "c2"]), Counter(["d1", "d2"])]
+        cols_b = [Counter(["a1", "a2", "a3"]), Counter(["new"]), Counter(["c1", "c2", "c3"]), Counter(["d1", "d2", "d3"])]
+        pairs = detector.pair_similar([0, 1, 2], [0, 1, 2, 3], lambda i, j: value_overlap(cols_a[i], cols_b[j]))
+        self.assertEqual(pairs, [(0, 0), (1, 2), (2, 3)])
+        # Equally long leftovers between matches are paired by position
+        cols_b[1:3] = [Counter(["x1", "x2"])]
+        pairs = detector.pair_similar([0, 1, 2], [0, 1, 2], lambda i, j: value_overlap(cols_a[i], cols_b[j]))
+        self.assertEqual(pairs, [(0, 0), (1, 1), (2, 2)])
+
+    def test_block_move(self):
+        detector = ShiftDetector()
+        # Rows 2..4 cut and pasted at the end, blank rows around them are not a move
+        list_a = ['H', 'm1', 'm2', '', 'm3', 'x', 'y', '', 'z']
+        list_b = ['H', 'x', 'y', '', 'z', 'm1', 'm2', '', 'm3']
+
+        mapping, moves = detector.align(list_a, list_b, ignore={''})
+        self.assertEqual(len(moves), 1)
+        a_start, b_start, length = moves[0]
+        self.assertEqual([list_a[a_start + k] for k in range(length)],
+                         [list_b[b_start + k] for k in range(length)])
+        # Every row is mapped to an identical row
+        for i, j in mapping.items():
+            self.assertIsNotNone(j)
+            self.assertEqual(list_a[i], list_b[j])
+        # Without move detection the same input maps nothing for the moved rows
+        self.assertIn(None, detector.compute_mapping(list_a, list_b).values())
+        # A single row (a repeated total) is not a move unless asked for
+        list_a, list_b = ['H', 'Total', 'a', 'b'], ['H', 'a', 'b', 'Total']
+        self.assertEqual(detector.align(list_a, list_b)[1], [])
+        self.assertEqual(detector.align(list_a, list_b, min_length=1)[1], [(1, 3, 1)])
+
+    def test_alignment_keys_collision(self):
+        detector = ShiftDetector()
+        # Same 64-bit digest, different check half: a collision
+        fps_a = RowFingerprints([(7 << 64) | 1, (8 << 64) | 1])
+        fps_b = RowFingerprints([(7 << 64) | 2, (8 << 64) | 1])
+
+        keys_a, keys_b = detector.alignment_keys(fps_a, fps_b)
+        self.assertNotEqual(keys_a[0], keys_b[0])
+        self.assertEqual(keys_a[1], keys_b[1])
+        self.assertEqual(keys_a[1], 8)
+
 if __name__ == '__main__':
     unittest.main()
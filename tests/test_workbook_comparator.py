@@ -0,0 +1,48 @@
+import unittest
+import xlsxwriter
+import os
+from core.workbook_comparator import WorkbookComparator
+from core.data_types import DiffType
+
+class TestWorkbookComparator(unittest.TestCase):
+    def setUp(self):
+        self.file_a = 'test_wb_a.xlsx'
+        self.file_b = 'test_wb_b.xlsx'
+        rows = [f'Row{i}' for i in range(1, 11)]
+
+        wb = xlsxwriter.Workbook(self.file_a)
+        wb.add_worksheet('Summary').write_column('A1', ['Title', 'Total'])
+        wb.add_worksheet('Data').write_column('A1', rows)
+        wb.add_worksheet('Gone').write('A1', 'Only in A')
+        wb.close()
+
+        # Summary changed, Data renamed to Data 2024 (one row changed), Gone deleted, Notes added
+        wb = xlsxwriter.Workbook(self.file_b)
+        wb.add_worksheet('Summary').write_column('A1', ['Title', 'Grand Total'])
+        wb.add_worksheet('Data 2024').write_column('A1', rows[:9] + ['Row10 Changed'])
+        wb.add_worksheet('Notes').write('A1', 'Only in B')
+        wb.close()
+
+    def tearDown(self):
+        for f in (self.file_a, self.file_b):
+            if os.path.exists(f):
+                os.remove(f)
+
+    def test_match_sheets(self):
+        pairs, only_a, only_b = WorkbookComparator(self.file_a, self.file_b, max_workers=1).match_sheets()
+        self.assertEqual(pairs, [('Summary', 'Summary'), ('Data', 'Data 2024')])
+        self.assertEqual(only_a, ['Gone'])
+        self.assertEqual(only_b, ['Notes'])
+
+    def test_compare_workbooks(self):
+        for workers in (1, 2):
+            items = WorkbookComparator(self.file_a, self.file_b, max_workers=workers).compare().items
+            sheets = [(i.diff_type, i.location) for i in items if i.item_type == "Sheet"]
+            self.assertEqual(sheets, [(DiffType.CHANGED, 'Data -> Data 2024'),
+                                      (DiffType.DELETED, 'Gone'), (DiffType.INSERTED, 'Notes')])
+            changed = [(i.sheet, i.old_value, i.new_value) for i in items if i.diff_type == DiffType.CHANGED
+                       and i.item_type == "Cell"]
+            self.assertEqual(changed, [('Summary', 'Total', 'Grand Total'), ('Data', 'Row10', 'Row10 Changed')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,10 @@ import threading
 from core.comparator import ExcelComparator
 from core.data_types import DiffResult
 
+# True: the visual report is written at the zip level (no Excel needed; formulas that refer
+# to other sheets or names are replaced by their values)
+NATIVE_REPORT = False
+
 # Modern theme
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -193,7 +197,7 @@ class MainWindow(ctk.CTk):
             output_path = os.path.join(output_dir, f"ExcelDiff_Report_{timestamp}.xlsx")
             
             from reporting.visual_reporter import VisualReporter
-            reporter = VisualReporter(file_a, file_b, output_path, sheet_a, sheet_b)
+            reporter = VisualReporter(file_a, file_b, output_path, sheet_a, sheet_b, native=NATIVE_REPORT)
             reporter.generate(result)
             
             self.after(0, lambda: self._on_complete(output_path, len(result.items)))